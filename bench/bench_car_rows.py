@@ -0,0 +1,107 @@
+# bench/bench_car_rows.py - Row mapping and serialization: dataclass + dicts vs tuple-backed Car
+#
+# python bench/bench_car_rows.py --cars 100000
+import os
+import gc
+import sys
+import json
+import time
+import shutil
+import sqlite3
+import argparse
+import tempfile
+import tracemalloc
+from dataclasses import dataclass
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench.synthetic_inventory import build_database
+from database.models import car_row_factory
+from services.json_utils import dumps
+
+FIELDS = ("id", "make", "model", "year", "price", "body_type", "fuel_type",
+          "transmission", "mileage", "description")
+
+@dataclass
+class LegacyCar:
+    """The previous Car: a regular dataclass built from sqlite3.Row"""
+    id: int
+    make: str
+    model: str
+    year: int
+    price: float
+    body_type: str
+    fuel_type: str
+    transmission: str
+    mileage: int
+    description: str
+    available: bool = True
+
+def legacy_fetch(conn: sqlite3.Connection):
+    cursor = conn.cursor()
+    cursor.row_factory = sqlite3.Row
+    cursor.execute("SELECT * FROM cars WHERE available = 1")
+    return [LegacyCar(id=row[0], make=row[1], model=row[2], year=row[3], price=row[4],
+                      body_type=row[5], fuel_type=row[6], transmission=row[7], mileage=row[8],
+                      description=row[9], available=bool(row[10])) for row in cursor.fetchall()]
+
+def legacy_serialize(cars) -> bytes:
+    payload = [{
+        "id": car.id, "make": car.make, "model": car.model, "year": car.year, "price": car.price,
+        "body_type": car.body_type, "fuel_type": car.fuel_type, "transmission": car.transmission,
+        "mileage": car.mileage, "description": car.description
+    } for car in cars]
+    return json.dumps({"cars": payload}, ensure_ascii=False).encode("utf-8")
+
+def compact_fetch(conn: sqlite3.Connection):
+    cursor = conn.cursor()
+    cursor.row_factory = car_row_factory
+    cursor.execute("SELECT * FROM cars WHERE available = 1")
+    return cursor.fetchall()
+
+def compact_serialize(cars) -> bytes:
+    return dumps({"cars": [car.to_dict(FIELDS) for car in cars]})
+
+def measure(fetch, serialize, conn, rounds: int):
+    """(fetch seconds, serialize seconds, bytes held by the fetched rows)"""
+    gc.collect()
+    tracemalloc.start()
+    cars = fetch(conn)
+    held, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    fetch_times, serialize_times = [], []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        cars = fetch(conn)
+        fetch_times.append(time.perf_counter() - start)
+        start = time.perf_counter()
+        serialize(cars)
+        serialize_times.append(time.perf_counter() - start)
+    return min(fetch_times), min(serialize_times), held
+
+def main():
+    parser = argparse.ArgumentParser(description="Car row mapping benchmark")
+    parser.add_argument("--cars", type=int, default=100000)
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="bench_rows_")
+    db_path = os.path.join(workdir, "cars.db")
+    print(f"🏗️  Generating {args.cars:,} cars...")
+    build_database(db_path, args.cars)
+    conn = sqlite3.connect(db_path)
+
+    results = {
+        "dataclass + dicts": measure(legacy_fetch, legacy_serialize, conn, args.rounds),
+        "tuple-backed Car": measure(compact_fetch, compact_serialize, conn, args.rounds),
+    }
+    print(f"📦 {args.cars:,} rows, best of {args.rounds}")
+    for name, (fetch_s, serialize_s, held) in results.items():
+        print(f"   {name:<18} fetch={fetch_s * 1000:7.1f}ms  serialize={serialize_s * 1000:7.1f}ms  "
+              f"memory={held / 1024 / 1024:6.1f}MB  ({held / args.cars:.0f} B/car)")
+
+    conn.close()
+    shutil.rmtree(workdir, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
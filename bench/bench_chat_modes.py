@@ -0,0 +1,78 @@
+# bench/bench_chat_modes.py - End-to-end chat latency: intent + answer calls vs single tool-enabled call
+#
+# 1. FAKE_OPENAI_LATENCY=0.3 python bench/fake_openai_server.py
+# 2. AZURE_OPENAI_API_KEY=fake AZURE_OPENAI_ENDPOINT=http://127.0.0.1:9000 \
+#    python bench/bench_chat_modes.py --requests 200 --concurrency 20
+import os
+import sys
+import time
+import random
+import asyncio
+import argparse
+import statistics
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.ai_service import AIService, SEARCH_INTENTS
+from services.car_service import AsyncCarService
+
+# Vague enough that the rule-based parser is not confident, so the two-call
+# mode really makes its intent call
+MESSAGES = [
+    "یه ماشین خوب برای خانواده میخوام", "دنبال یه ماشین اقتصادی هستم",
+    "تویوتا چی دارین؟", "یه شاسی بلند ارزون میخوام", "ماشین برای سفر پیشنهاد بدین",
+    "قیمت ماشین‌های آلمانی چنده؟", "یه ماشین جمع و جور برای شهر",
+]
+
+async def two_call(ai_service: AIService, car_service: AsyncCarService, message: str):
+    """The /chat pipeline: process_query, search, generate_response"""
+    result = await ai_service.process_query(message)
+    intent, entities = result.get("intent", "general"), result.get("entities", {})
+    cars = []
+    if intent in SEARCH_INTENTS and entities:
+        cars = await car_service.search_cars(entities)
+    return await ai_service.generate_response(intent, cars, message)
+
+async def single_call(ai_service: AIService, car_service: AsyncCarService, message: str):
+    result = await ai_service.chat_single_call(message, car_service.search_cars)
+    return result["response"]
+
+async def run_mode(handler, ai_service, car_service, messages, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one(message):
+        async with semaphore:
+            start = time.perf_counter()
+            await handler(ai_service, car_service, message)
+            latencies.append(time.perf_counter() - start)
+
+    await asyncio.gather(*(one(m) for m in messages))
+    return latencies
+
+async def main():
+    parser = argparse.ArgumentParser(description="Two-call vs single-call chat benchmark")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=20)
+    args = parser.parse_args()
+
+    rnd = random.Random(7)
+    messages = [rnd.choice(MESSAGES) for _ in range(args.requests)]
+    car_service = AsyncCarService()
+
+    for name, handler in (("two calls", two_call), ("single call", single_call)):
+        ai_service = AIService()
+        ai_service.intent_cache.clear()
+        ai_service.intent_cache.max_size = 0  # measure the model, not the cache
+        latencies = await run_mode(handler, ai_service, car_service, messages, args.concurrency)
+        llm_calls = sum(stats["calls"] for stats in ai_service.token_stats.values())
+        prompt_tokens = sum(stats["prompt_tokens"] for stats in ai_service.token_stats.values())
+        q = statistics.quantiles(latencies, n=100)
+        print(f"💬 {name:<12} p50={q[49] * 1000:6.0f}ms p95={q[94] * 1000:6.0f}ms "
+              f"llm_calls/msg={llm_calls / len(messages):.2f} prompt_tokens/msg={prompt_tokens / len(messages):.0f}")
+        await ai_service.aclose()
+
+    car_service.close()
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,43 @@
+# bench/bench_costs.py - on-road costs: one call per car vs one NumPy batch
+#
+# python bench/bench_costs.py --cars 100000
+import os
+import sys
+import time
+import random
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.cost_engine import CostEngine
+
+def main():
+    parser = argparse.ArgumentParser(description="Batch cost engine benchmark")
+    parser.add_argument("--cars", type=int, default=100000)
+    parser.add_argument("--state", default="VIC")
+    args = parser.parse_args()
+
+    rnd = random.Random(42)
+    prices = [rnd.uniform(15000, 250000) for _ in range(args.cars)]
+    engine = CostEngine()
+
+    start = time.perf_counter()
+    per_car = [engine.breakdowns([price], args.state)[0] for price in prices]
+    loop_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    batch = engine.breakdowns(prices, args.state)
+    batch_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    engine.calculate(prices, args.state)
+    arrays_seconds = time.perf_counter() - start
+
+    assert per_car == batch
+    print(f"{args.cars:,} prices, state {args.state}")
+    print(f"  one call per car : {loop_seconds * 1000:9.1f} ms")
+    print(f"  batch breakdowns : {batch_seconds * 1000:9.1f} ms ({loop_seconds / batch_seconds:.0f}x)")
+    print(f"  batch arrays only: {arrays_seconds * 1000:9.1f} ms ({loop_seconds / arrays_seconds:.0f}x)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+# bench/bench_inventory_index.py - search_cars: SQL vs in-memory columnar index
+#
+# python bench/bench_inventory_index.py --cars 1000000
+import os
+import sys
+import time
+import random
+import shutil
+import argparse
+import tempfile
+import statistics
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench.synthetic_inventory import CATALOG, build_database
+from repositories.car_repository import CarRepository
+
+def random_filters(rnd: random.Random) -> dict:
+    """Filter mixes like the ones the chat pipeline produces"""
+    make = rnd.choice(list(CATALOG))
+    model, body_type, base_price = rnd.choice(CATALOG[make])
+    filters = {}
+    if rnd.random() < 0.6:
+        filters["make"] = make.lower() if rnd.random() < 0.3 else make
+    if rnd.random() < 0.3:
+        filters["model"] = model[:3]
+    if rnd.random() < 0.3:
+        filters["body_type"] = body_type
+    if rnd.random() < 0.5:
+        filters["max_price"] = base_price * rnd.uniform(0.6, 1.2)
+    if rnd.random() < 0.2:
+        filters["min_price"] = base_price * rnd.uniform(0.3, 0.6)
+    if rnd.random() < 0.2:
+        filters["year"] = rnd.randint(2015, 2025)
+    if rnd.random() < 0.1:
+        filters["fuel_type"] = rnd.choice(["Petrol", "Hybrid", "Electric"])
+    return filters
+
+def main():
+    parser = argparse.ArgumentParser(description="In-memory inventory index benchmark")
+    parser.add_argument("--cars", type=int, default=100000)
+    parser.add_argument("--queries", type=int, default=500)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="bench_index_")
+    db_path = os.path.join(workdir, "cars.db")
+    print(f"🏗️  Generating {args.cars:,} cars...")
+    build_database(db_path, args.cars)
+
+    sql_repo = CarRepository(db_path, engine="sql")
+    mem_repo = CarRepository(db_path, engine="memory")
+
+    start = time.perf_counter()
+    mem_repo.index.refresh()
+    print(f"📦 Index load: {time.perf_counter() - start:.2f}s")
+
+    rnd = random.Random(7)
+    queries = [random_filters(rnd) for _ in range(args.queries)]
+
+    sql_times, filter_times, mem_times = [], [], []
+    mismatches = 0
+    for filters in queries:
+        start = time.perf_counter()
+        expected = [car.id for car in sql_repo.search_cars(filters)]
+        sql_times.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        ids = mem_repo.index.search(filters)
+        filter_times.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        actual = [car.id for car in mem_repo.search_cars(filters)]
+        mem_times.append(time.perf_counter() - start)
+
+        if expected != actual or ids != actual:
+            mismatches += 1
+            print(f"❌ Parity mismatch for {filters}: sql={expected} memory={actual}")
+
+    def ms(values, pct):
+        return statistics.quantiles(values, n=100)[pct - 1] * 1000
+
+    print(f"🔍 {args.queries} queries on {args.cars:,} cars")
+    print(f"   SQL search_cars:        p50={ms(sql_times, 50):.3f}ms p95={ms(sql_times, 95):.3f}ms")
+    print(f"   index filter only:      p50={ms(filter_times, 50):.3f}ms p95={ms(filter_times, 95):.3f}ms")
+    print(f"   memory search_cars:     p50={ms(mem_times, 50):.3f}ms p95={ms(mem_times, 95):.3f}ms")
+    print("✅ Parity OK" if not mismatches else f"❌ {mismatches} parity mismatches")
+
+    sql_repo.close()
+    shutil.rmtree(workdir, ignore_errors=True)
+    sys.exit(1 if mismatches else 0)
+
+if __name__ == "__main__":
+    main()
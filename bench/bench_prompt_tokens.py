@@ -0,0 +1,105 @@
+# bench/bench_prompt_tokens.py - Prompt tokens per chat request: inline prompts vs prompt_builder
+#
+# python bench/bench_prompt_tokens.py
+import os
+import sys
+import random
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench.synthetic_inventory import generate_cars
+from database.models import Car
+from services.prompt_builder import (
+    INTENT_SYSTEM_PROMPT, RESPONSE_SYSTEM_PROMPT, estimate_tokens, intent_messages, response_messages
+)
+
+MESSAGES = [
+    "قیمت کمری ۲۰۲۳ چقدره؟", "یه شاسی بلند خانوادگی زیر ۵۰ هزار دلار میخوام",
+    "BMW X3 دارین؟", "برای رفت و آمد شهری چه ماشینی پیشنهاد میدین؟ مصرف سوختش کم باشه",
+    "تسلا مدل ۳ رو با هیوندای النترا مقایسه کن", "اقساطی هم میفروشین؟",
+]
+
+def legacy_intent_prompt(user_message: str) -> str:
+    """The intent prompt process_query used to build inline"""
+    return f"""
+سوال کاربر: "{user_message}"
+
+تو یک AI هستی که در نمایندگی ماشین کار می‌کنی. کاربر سوالی پرسیده.
+
+لطفاً پاسخ رو به فرمت JSON زیر بده:
+
+{{
+    "intent": "price_inquiry|search|specs|finance|general",
+    "entities": {{
+        "make": "نام برند (اگه گفته)",
+        "model": "نام مدل (اگه گفته)", 
+        "year": سال (اگه گفته),
+        "max_price": حداکثر قیمت (اگه گفته),
+        "min_price": حداقل قیمت (اگه گفته),
+        "body_type": "نوع بدنه (اگه گفته)"
+    }},
+    "confidence": عدد بین 0 تا 1
+}}
+
+مثال‌ها:
+- "قیمت کمری چقدره؟" -> intent: "price_inquiry", entities: {{"make": "Toyota", "model": "Camry"}}
+- "BMW زیر ۵۰ هزار دارین؟" -> intent: "search", entities: {{"make": "BMW", "max_price": 50000}}
+- "ماشین خانوادگی میخوام" -> intent: "search", entities: {{"body_type": "SUV"}}
+
+فقط JSON برگردون:
+"""
+
+def legacy_response_prompt(intent: str, cars, user_message: str) -> str:
+    """The answer prompt generate_response used to build inline"""
+    cars_text = ""
+    for car in cars[:3]:
+        cars_text += f"- {car.make} {car.model} {car.year}: ${car.price:,}\n"
+    return f"""
+کاربر پرسید: "{user_message}"
+Intent: {intent}
+
+ماشین‌های پیدا شده:
+{cars_text if cars_text else "هیچ ماشینی پیدا نشد"}
+
+یک پاسخ طبیعی و دوستانه به فارسی بنویس که:
+- مفید و مرتبط باشه
+- اگه ماشین پیدا شده، معرفی کن
+- اگه پیدا نشده، گزینه‌های دیگه پیشنهاد بده  
+- سوال بعدی بپرس تا بتونی بهتر کمک کنی
+- حداکثر 100 کلمه
+
+پاسخ:
+"""
+
+def message_tokens(messages) -> int:
+    # ~4 tokens of chat framing per message
+    return sum(estimate_tokens(m["content"]) + 4 for m in messages)
+
+def main():
+    parser = argparse.ArgumentParser(description="Prompt token benchmark")
+    parser.add_argument("--requests", type=int, default=500)
+    args = parser.parse_args()
+
+    rnd = random.Random(11)
+    inventory = [Car(i, *row) for i, row in enumerate(generate_cars(200), 1)]
+
+    old_total = new_total = new_static = 0
+    for _ in range(args.requests):
+        message = rnd.choice(MESSAGES)
+        cars = rnd.sample(inventory, rnd.randint(0, 8))
+        old_total += message_tokens([{"content": legacy_intent_prompt(message)}])
+        old_total += message_tokens([{"content": legacy_response_prompt("search", cars, message)}])
+        new_total += message_tokens(intent_messages(message))
+        new_total += message_tokens(response_messages("search", cars, message))
+        new_static += estimate_tokens(INTENT_SYSTEM_PROMPT) + estimate_tokens(RESPONSE_SYSTEM_PROMPT)
+
+    old_avg = old_total / args.requests
+    new_avg = new_total / args.requests
+    print(f"🧮 Prompt tokens per chat request (intent + response), {args.requests} requests")
+    print(f"   inline prompts:  {old_avg:.0f}")
+    print(f"   prompt_builder:  {new_avg:.0f}  ({1 - new_avg / old_avg:.0%} fewer)")
+    print(f"   stable system prefix: {new_static / new_total:.0%} of the new prompt tokens")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+# bench/bench_search_fallback.py - Three-stage search fallback vs single ranked query
+#
+# python bench/bench_search_fallback.py --cars 100000 --miss-ratio 0.8
+import os
+import sys
+import time
+import random
+import shutil
+import argparse
+import tempfile
+import statistics
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench.synthetic_inventory import CATALOG, build_database
+from repositories.car_repository import CarRepository
+from services.car_service import CarService
+
+def three_stage_search(service: CarService, entities: dict):
+    """The previous CarService.search_cars: exact, then flexible, then text; returns (cars, queries)"""
+    results = service.car_repo.search_cars(entities)
+    if results:
+        return results, 1
+    results = service.car_repo.search_cars(service._create_flexible_search(entities))
+    if results:
+        return results, 2
+    return service.car_repo.search_by_text(service._entities_to_text(entities)), 3
+
+def query_mix(rnd: random.Random, count: int, miss_ratio: float):
+    """Entities that hit exactly, or miss the exact stage (unknown model, tight budget, wrong year)"""
+    mix = []
+    for _ in range(count):
+        make = rnd.choice(list(CATALOG))
+        model, body_type, base_price = rnd.choice(CATALOG[make])
+        if rnd.random() >= miss_ratio:
+            mix.append({"make": make, "model": model})
+            continue
+        kind = rnd.choice(["model", "budget", "year", "unknown"])
+        if kind == "model":
+            mix.append({"make": make, "model": "Concept"})
+        elif kind == "budget":
+            mix.append({"make": make, "max_price": base_price * 0.2})
+        elif kind == "year":
+            mix.append({"make": make, "model": model, "year": 2031})
+        else:
+            mix.append({"make": "Lada", "body_type": body_type})
+    return mix
+
+def main():
+    parser = argparse.ArgumentParser(description="search_cars fallback benchmark")
+    parser.add_argument("--cars", type=int, default=100000)
+    parser.add_argument("--queries", type=int, default=300)
+    parser.add_argument("--miss-ratio", type=float, default=0.8)
+    parser.add_argument("--engine", choices=["sql", "memory"], default="sql")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="bench_fallback_")
+    db_path = os.path.join(workdir, "cars.db")
+    print(f"🏗️  Generating {args.cars:,} cars...")
+    build_database(db_path, args.cars)
+
+    service = CarService(CarRepository(db_path, engine=args.engine))
+    mix = query_mix(random.Random(3), args.queries, args.miss_ratio)
+
+    old_times, new_times, old_queries = [], [], 0
+    mismatches = 0
+    for entities in mix:
+        start = time.perf_counter()
+        old, queries = three_stage_search(service, entities)
+        old_times.append(time.perf_counter() - start)
+        old_queries += queries
+
+        start = time.perf_counter()
+        new = service.search_cars(entities)
+        new_times.append(time.perf_counter() - start)
+
+        # Same cars in the same order as the stage the old code stopped at
+        if [c.id for c in new] != [c.id for c in old]:
+            mismatches += 1
+
+    def ms(values, pct):
+        return statistics.quantiles(values, n=100)[pct - 1] * 1000
+
+    print(f"🔍 {args.queries} searches, {args.miss_ratio:.0%} miss the exact stage, {args.cars:,} cars")
+    print(f"   three-stage: {old_queries / args.queries:.2f} queries/search  "
+          f"p50={ms(old_times, 50):.2f}ms p95={ms(old_times, 95):.2f}ms total={sum(old_times):.2f}s")
+    print(f"   ranked:      1.00 queries/search  "
+          f"p50={ms(new_times, 50):.2f}ms p95={ms(new_times, 95):.2f}ms total={sum(new_times):.2f}s")
+    print("✅ Results identical to the three-stage search" if not mismatches
+          else f"❌ {mismatches} searches returned different results")
+
+    service.car_repo.close()
+    shutil.rmtree(workdir, ignore_errors=True)
+    if mismatches:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
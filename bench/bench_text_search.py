@@ -0,0 +1,72 @@
+# bench/bench_text_search.py - search_by_text: LIKE scan vs FTS5 index
+#
+# python bench/bench_text_search.py --cars 300000
+import os
+import sys
+import time
+import random
+import shutil
+import argparse
+import tempfile
+import statistics
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench.synthetic_inventory import CATALOG, DESCRIPTIONS, build_database
+from repositories.car_repository import CarRepository
+
+def text_queries(rnd: random.Random, count: int):
+    """Fallback texts like CarService._entities_to_text builds, plus Persian phrases"""
+    queries = []
+    for _ in range(count):
+        make = rnd.choice(list(CATALOG))
+        model, body_type, _ = rnd.choice(CATALOG[make])
+        kind = rnd.random()
+        if kind < 0.4:
+            queries.append(f"{make} {model}")
+        elif kind < 0.7:
+            # Arabic keyboard variants must still hit the Persian descriptions
+            queries.append(rnd.choice(DESCRIPTIONS).split("،")[0].replace("ی", "ي").replace("ک", "ك"))
+        else:
+            queries.append(f"{body_type} {rnd.choice(DESCRIPTIONS).split()[0]}")
+    return queries
+
+def main():
+    parser = argparse.ArgumentParser(description="Text search benchmark")
+    parser.add_argument("--cars", type=int, default=300000)
+    parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="bench_text_")
+    db_path = os.path.join(workdir, "cars.db")
+    print(f"🏗️  Generating {args.cars:,} cars...")
+    build_database(db_path, args.cars)
+
+    repo = CarRepository(db_path, engine="sql")
+    queries = text_queries(random.Random(5), args.queries)
+
+    def run(search):
+        times, hits = [], 0
+        for text in queries:
+            start = time.perf_counter()
+            hits += bool(search(text))
+            times.append(time.perf_counter() - start)
+        return times, hits
+
+    like_times, like_hits = run(lambda text: repo._search_by_like(text, 10))
+    fts_times, fts_hits = run(repo.search_by_text)
+
+    def ms(values, pct):
+        return statistics.quantiles(values, n=100)[pct - 1] * 1000
+
+    print(f"🔍 {args.queries} text searches over {args.cars:,} cars")
+    print(f"   LIKE scan: p50={ms(like_times, 50):.2f}ms p95={ms(like_times, 95):.2f}ms "
+          f"hits={like_hits}/{args.queries}")
+    print(f"   FTS5:      p50={ms(fts_times, 50):.2f}ms p95={ms(fts_times, 95):.2f}ms "
+          f"hits={fts_hits}/{args.queries}")
+
+    repo.close()
+    shutil.rmtree(workdir, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
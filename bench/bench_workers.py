@@ -0,0 +1,110 @@
+# bench/bench_workers.py - Throughput of /cars and fallback-mode /chat vs worker count
+#
+# python bench/bench_workers.py --workers 1 2 4 --duration 10
+#
+# Starts `python main.py --workers N` for each N (without Azure credentials, so /chat
+# answers from the rule-based fallback), waits for /health/ready and drives load from
+# several client processes so the load generator is not the bottleneck.
+import os
+import sys
+import time
+import shutil
+import signal
+import asyncio
+import argparse
+import tempfile
+import subprocess
+import multiprocessing
+import httpx
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CHAT_MESSAGES = ["تویوتا دارین؟", "BMW زیر 80 هزار دلار", "شاسی بلند خانوادگی میخوام", "Mazda CX-5 price"]
+
+async def _drive(url: str, path: str, duration: float, concurrency: int) -> int:
+    """Send requests for duration seconds; returns how many succeeded"""
+    done = 0
+    deadline = time.perf_counter() + duration
+    limits = httpx.Limits(max_connections=concurrency)
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=30) as client:
+        async def loop(worker: int):
+            nonlocal done
+            i = worker
+            while time.perf_counter() < deadline:
+                if path == "/chat":
+                    response = await client.post("/chat", json={"message": CHAT_MESSAGES[i % len(CHAT_MESSAGES)]})
+                else:
+                    response = await client.get(path)
+                i += 1
+                if response.status_code == 200:
+                    done += 1
+        await asyncio.gather(*[loop(w) for w in range(concurrency)])
+    return done
+
+def _client_process(args) -> int:
+    return asyncio.run(_drive(*args))
+
+def measure(url: str, path: str, duration: float, clients: int, concurrency: int) -> float:
+    """Requests per second from `clients` load-generating processes"""
+    with multiprocessing.Pool(clients) as pool:
+        counts = pool.map(_client_process, [(url, path, duration, concurrency)] * clients)
+    return sum(counts) / duration
+
+def start_server(workers: int, port: int, state_dir: str) -> subprocess.Popen:
+    # A throwaway database and state directory per run; the repo's cars.db is left alone
+    env = dict(os.environ, SHARED_STATE_DIR=state_dir, DB_PATH=os.path.join(state_dir, "cars.db"))
+    for name in ("AZURE_OPENAI_API_KEY", "AZURE_OPENAI_ENDPOINT"):
+        env.pop(name, None)  # fallback mode: no LLM calls
+    return subprocess.Popen(
+        [sys.executable, "main.py", "--workers", str(workers), "--port", str(port)],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        start_new_session=True
+    )
+
+def wait_ready(url: str, timeout: float = 60) -> float:
+    """Seconds until /health/ready answers 200"""
+    start = time.perf_counter()
+    while time.perf_counter() - start < timeout:
+        try:
+            if httpx.get(f"{url}/health/ready", timeout=2).status_code == 200:
+                return time.perf_counter() - start
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"{url} not ready after {timeout}s")
+
+def main():
+    parser = argparse.ArgumentParser(description="Multi-worker scaling benchmark")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--clients", type=int, default=4, help="Load-generating processes")
+    parser.add_argument("--concurrency", type=int, default=32, help="Connections per client process")
+    args = parser.parse_args()
+
+    url = f"http://127.0.0.1:{args.port}"
+    print(f"{os.cpu_count()} CPU cores; {args.clients}x{args.concurrency} connections, {args.duration:.0f}s per run")
+    baseline = {}
+    for workers in args.workers:
+        state_dir = tempfile.mkdtemp(prefix="car_state_")
+        server = start_server(workers, args.port, state_dir)
+        try:
+            ready = wait_ready(url)
+            results = {
+                "/cars": measure(url, "/cars?limit=20", args.duration, args.clients, args.concurrency),
+                "/chat": measure(url, "/chat", args.duration, args.clients, args.concurrency),
+            }
+        finally:
+            os.killpg(server.pid, signal.SIGTERM)
+            server.wait()
+            shutil.rmtree(state_dir, ignore_errors=True)
+
+        line = [f"workers={workers:<3} ready in {ready:4.1f}s"]
+        for path, rps in results.items():
+            baseline.setdefault(path, rps / workers)
+            efficiency = rps / (baseline[path] * workers)
+            line.append(f"{path} {rps:8.0f} req/s ({efficiency:4.0%} of linear)")
+        print("  ".join(line))
+
+if __name__ == "__main__":
+    main()
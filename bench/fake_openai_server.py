@@ -0,0 +1,156 @@
+# bench/fake_openai_server.py - Local OpenAI-compatible stub for load testing
+#
+# python bench/fake_openai_server.py --latency 0.5 --jitter 0.2 --error-rate 0.02
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.prompt_builder import estimate_tokens
+
+# Simulated model latency in seconds, +/- up to JITTER of it (uniform)
+LATENCY = float(os.getenv('FAKE_OPENAI_LATENCY', '0.5'))
+JITTER = float(os.getenv('FAKE_OPENAI_JITTER', '0'))
+# Share of calls answered 429 (throttled) or 500, split evenly
+ERROR_RATE = float(os.getenv('FAKE_OPENAI_ERROR_RATE', '0'))
+_random = random.Random(int(os.getenv('FAKE_OPENAI_SEED', '0')))
+
+app = FastAPI(title="Fake Azure OpenAI")
+
+INTENT_REPLY = {
+    "intent": "search",
+    "entities": {"make": "Toyota"},
+    "confidence": 0.9
+}
+
+TEXT_REPLY = "چند تویوتا عالی پیدا کردم! بودجه‌تون چقدره؟"
+
+def _usage(prompt: str, content: str) -> dict:
+    """Token counts like the real API reports them"""
+    prompt_tokens = estimate_tokens(prompt)
+    completion_tokens = estimate_tokens(content)
+    return {
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "total_tokens": prompt_tokens + completion_tokens,
+        "prompt_tokens_details": {"cached_tokens": 0}
+    }
+
+def _completion(content: str, prompt: str = "") -> dict:
+    return {
+        "id": "chatcmpl-fake",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": "fake",
+        "choices": [{
+            "index": 0,
+            "message": {"role": "assistant", "content": content},
+            "finish_reason": "stop"
+        }],
+        "usage": _usage(prompt, content)
+    }
+
+def _tool_call(arguments: dict, prompt: str = "") -> dict:
+    """Completion where the model asks for the search_cars tool"""
+    response = _completion("", prompt)
+    response["choices"][0]["message"] = {
+        "role": "assistant",
+        "content": None,
+        "tool_calls": [{
+            "id": "call_fake",
+            "type": "function",
+            "function": {"name": "search_cars", "arguments": json.dumps(arguments)}
+        }]
+    }
+    response["choices"][0]["finish_reason"] = "tool_calls"
+    return response
+
+def _chunk(token: str) -> str:
+    payload = {
+        "id": "chatcmpl-fake",
+        "object": "chat.completion.chunk",
+        "created": int(time.time()),
+        "model": "fake",
+        "choices": [{"index": 0, "delta": {"content": token}, "finish_reason": None}]
+    }
+    return f"data: {json.dumps(payload, ensure_ascii=False)}\n\n"
+
+def _latency() -> float:
+    return max(0.0, LATENCY * (1 + _random.uniform(-JITTER, JITTER)))
+
+def _error() -> JSONResponse:
+    """Throttling or a server error, shaped like Azure's error body"""
+    if _random.random() < 0.5:
+        return JSONResponse(status_code=429, headers={"retry-after": "1"},
+                            content={"error": {"code": "429", "message": "Rate limit is exceeded."}})
+    return JSONResponse(status_code=500,
+                        content={"error": {"code": "InternalServerError", "message": "The server had an error."}})
+
+async def _stream(content: str, prompt: str = "", include_usage: bool = False):
+    """Emit the reply word by word, spreading the latency over the tokens"""
+    words = content.split(" ")
+    latency = _latency()
+    for i, word in enumerate(words):
+        await asyncio.sleep(latency / len(words))
+        yield _chunk(word if i == 0 else " " + word)
+    if include_usage:
+        payload = {
+            "id": "chatcmpl-fake",
+            "object": "chat.completion.chunk",
+            "created": int(time.time()),
+            "model": "fake",
+            "choices": [],
+            "usage": _usage(prompt, content)
+        }
+        yield f"data: {json.dumps(payload, ensure_ascii=False)}\n\n"
+    yield "data: [DONE]\n\n"
+
+@app.post("/openai/deployments/{deployment}/chat/completions")
+async def chat_completions(deployment: str, request: Request):
+    """Answer like Azure OpenAI after the configured delay, failing ERROR_RATE of the calls"""
+    body = await request.json()
+    prompt = " ".join(m.get("content") or "" for m in body.get("messages", []))
+
+    if ERROR_RATE and _random.random() < ERROR_RATE:
+        await asyncio.sleep(_latency() / 2)
+        return _error()
+
+    if body.get("stream"):
+        include_usage = bool((body.get("stream_options") or {}).get("include_usage"))
+        return StreamingResponse(_stream(TEXT_REPLY, prompt, include_usage), media_type="text/event-stream")
+
+    await asyncio.sleep(_latency())
+
+    if body.get("tools") and "هیچ ماشینی پیدا نشد" in prompt:
+        # Single-call mode with an empty speculative search: ask for a real one
+        return _tool_call(INTENT_REPLY["entities"], prompt)
+    if "JSON" in prompt:
+        return _completion(json.dumps(INTENT_REPLY, ensure_ascii=False), prompt)
+    return _completion(TEXT_REPLY, prompt)
+
+def main():
+    global LATENCY, JITTER, ERROR_RATE, _random
+    parser = argparse.ArgumentParser(description="Fake Azure OpenAI server")
+    parser.add_argument("--port", type=int, default=9000)
+    parser.add_argument("--latency", type=float, default=LATENCY, help="Seconds per completion")
+    parser.add_argument("--jitter", type=float, default=JITTER, help="Relative latency spread, e.g. 0.2 = +/-20%%")
+    parser.add_argument("--error-rate", type=float, default=ERROR_RATE, help="Share of calls failing with 429/500")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    LATENCY, JITTER, ERROR_RATE = args.latency, args.jitter, args.error_rate
+    _random = random.Random(args.seed)
+
+    print(f"🧪 Fake Azure OpenAI on http://127.0.0.1:{args.port} "
+          f"(latency={LATENCY}s ±{JITTER:.0%}, errors={ERROR_RATE:.1%})")
+    uvicorn.run(app, host="127.0.0.1", port=args.port, log_level="warning")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+# bench/load_test_chat.py - Concurrent /chat load test
+#
+# 1. python bench/fake_openai_server.py
+# 2. AZURE_OPENAI_API_KEY=fake AZURE_OPENAI_ENDPOINT=http://127.0.0.1:9000 \
+#    uvicorn main:app --port 8000
+# 3. python bench/load_test_chat.py --concurrency 200
+import os
+import sys
+import time
+import asyncio
+import argparse
+import statistics
+import httpx
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench.loadgen import percentile
+
+async def send_chat(client, url, message, latencies):
+    start = time.perf_counter()
+    response = await client.post(f"{url}/chat", json={"message": message})
+    response.raise_for_status()
+    latencies.append(time.perf_counter() - start)
+
+async def probe_health(client, url, stop, probes):
+    """Ping /health while the load runs; a blocked event loop shows up here"""
+    while not stop.is_set():
+        start = time.perf_counter()
+        await client.get(f"{url}/health")
+        probes.append(time.perf_counter() - start)
+        await asyncio.sleep(0.05)
+
+async def main():
+    parser = argparse.ArgumentParser(description="Concurrent /chat load test")
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--message", default="تویوتا دارین؟")
+    args = parser.parse_args()
+
+    limits = httpx.Limits(max_connections=args.concurrency + 10)
+    async with httpx.AsyncClient(limits=limits, timeout=120) as client:
+        latencies, probes = [], []
+        stop = asyncio.Event()
+        prober = asyncio.create_task(probe_health(client, args.url, stop, probes))
+
+        start = time.perf_counter()
+        await asyncio.gather(*[
+            send_chat(client, args.url, args.message, latencies)
+            for _ in range(args.concurrency)
+        ])
+        elapsed = time.perf_counter() - start
+
+        stop.set()
+        await prober
+
+    print(f"💬 {len(latencies)} chats in {elapsed:.2f}s ({len(latencies) / elapsed:.1f} req/s)")
+    print(f"   chat p50={percentile(latencies, 50):.3f}s p95={percentile(latencies, 95):.3f}s")
+    print(f"❤️  /health p50={percentile(probes, 50) * 1000:.1f}ms "
+          f"max={max(probes) * 1000:.1f}ms mean={statistics.mean(probes) * 1000:.1f}ms")
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,76 @@
+# bench/loadgen.py - Closed-loop HTTP load generator shared by the bench scripts
+import time
+import random
+import asyncio
+from collections import Counter
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+import httpx
+
+# (method, path, JSON body or None)
+Request = Tuple[str, str, Optional[dict]]
+
+def percentile(values: Sequence[float], pct: float) -> float:
+    """Nearest-rank percentile"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+def summarize(latencies: List[float], statuses: Counter, errors: int, elapsed: float) -> Dict:
+    """Throughput and latency percentiles (ms) of one run"""
+    ordered = sorted(latencies)
+    ms = lambda seconds: round(seconds * 1000, 2)
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "seconds": round(elapsed, 2),
+        "throughput_rps": round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        "latency_ms": {
+            "p50": ms(percentile(ordered, 50)),
+            "p95": ms(percentile(ordered, 95)),
+            "p99": ms(percentile(ordered, 99)),
+            "mean": ms(sum(ordered) / len(ordered)) if ordered else 0.0,
+            "max": ms(ordered[-1]) if ordered else 0.0,
+        },
+        "status": dict(sorted(statuses.items())),
+    }
+
+async def run_load(url: str, next_request: Callable[[random.Random], Request], concurrency: int,
+                   duration: float, warmup: float = 0.0, seed: int = 0, timeout: float = 60) -> Dict:
+    """Keep `concurrency` requests in flight for warmup + duration seconds; only requests
+    started after the warm-up count. next_request(rnd) picks each request, and every
+    connection gets its own seeded Random so runs replay the same request mix."""
+    latencies: List[float] = []
+    statuses: Counter = Counter()
+    errors = 0
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=timeout) as client:
+        begin = time.perf_counter()
+        measure_from = begin + warmup
+        deadline = measure_from + duration
+
+        async def connection(worker: int):
+            nonlocal errors
+            rnd = random.Random(seed * 1000003 + worker)
+            while True:
+                start = time.perf_counter()
+                if start >= deadline:
+                    return
+                method, path, body = next_request(rnd)
+                try:
+                    response = await client.request(method, path, json=body)
+                    status = response.status_code
+                except httpx.HTTPError:
+                    status = "transport_error"
+                if start < measure_from:
+                    continue
+                latencies.append(time.perf_counter() - start)
+                statuses[str(status)] += 1
+                if status not in (200, 304):
+                    errors += 1
+
+        await asyncio.gather(*[connection(w) for w in range(concurrency)])
+        elapsed = time.perf_counter() - measure_from
+    return summarize(latencies, statuses, errors, elapsed)
@@ -0,0 +1,267 @@
+# bench/run_suite.py - Reproducible end-to-end benchmark of /chat, /cars and /cars/{id}
+#
+# python bench/run_suite.py --cars 100000 --duration 20 --concurrency 32
+# python bench/run_suite.py --cars 100000 --compare bench/results/<earlier run>.json
+#
+# Builds (or reuses) a seeded synthetic inventory, starts the fake Azure OpenAI
+# server and the app (`main.py --workers N`) against it, drives each endpoint with
+# a closed-loop load generator and writes throughput and p50/p95/p99 to JSON,
+# tagged with the git commit so runs can be compared across commits.
+import os
+import sys
+import json
+import time
+import signal
+import shutil
+import asyncio
+import argparse
+import platform
+import tempfile
+import subprocess
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+from urllib.parse import urlencode
+import httpx
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from bench.loadgen import run_load
+from bench.synthetic_inventory import CATALOG, MAKE_WEIGHTS, build_database
+from services.entity_extractor import BODY_TYPE_ALIASES, BRAND_ALIASES, MODEL_ALIASES
+
+RESULTS_DIR = os.path.join(ROOT, "bench", "results")
+SCENARIOS = ("chat", "cars", "car_detail")
+
+# Persian name of each make / model / body type (first alias listed)
+_PERSIAN: Dict[str, str] = {}
+for _alias, _value in list(BRAND_ALIASES.items()) + list(MODEL_ALIASES.items()) + list(BODY_TYPE_ALIASES.items()):
+    if not _alias.isascii():
+        _PERSIAN.setdefault(_value, _alias)
+
+# Chat messages: specific (rule-based fast path), vague (LLM intent call) and English
+CHAT_TEMPLATES = [
+    "{make_fa} دارین؟",
+    "{make_fa} {model_fa} قیمتش چنده؟",
+    "{make_fa} زیر {price_k} هزار دلار",
+    "یه {body_fa} خوب زیر {price_k} هزار میخوام",
+    "{make} {model} price",
+    "cheapest {body} under {price_k}k",
+    "یه ماشین اقتصادی برای رفت و آمد شهری پیشنهاد بدین",
+    "برای خانواده پنج نفره چی دارین؟",
+]
+
+def _pick_car(rnd):
+    makes = list(MAKE_WEIGHTS)
+    make = rnd.choices(makes, weights=[MAKE_WEIGHTS[m] for m in makes])[0]
+    model, body_type, base_price = rnd.choice(CATALOG[make])
+    return make, model, body_type, base_price
+
+def chat_request(rnd):
+    make, model, body_type, base_price = _pick_car(rnd)
+    message = rnd.choice(CHAT_TEMPLATES).format(
+        make=make, model=model, body=body_type.lower(),
+        make_fa=_PERSIAN.get(make, make), model_fa=_PERSIAN.get(model, model),
+        body_fa=_PERSIAN.get(body_type, body_type),
+        price_k=int(base_price * rnd.uniform(0.8, 1.3) / 1000),
+    )
+    return "POST", "/chat", {"message": message}
+
+def cars_request(rnd):
+    make, _, body_type, base_price = _pick_car(rnd)
+    params = {"limit": 20}
+    roll = rnd.random()
+    if roll < 0.5:
+        params["make"] = make
+    if 0.3 < roll < 0.8:
+        params["max_price"] = int(base_price * rnd.choice([0.8, 1.0, 1.2]))
+    if roll > 0.9:
+        params["body_type"] = body_type
+    return "GET", "/cars?" + urlencode(params), None
+
+def car_detail_request(cars: int):
+    return lambda rnd: ("GET", f"/cars/{rnd.randint(1, cars)}", None)
+
+def git_info() -> Dict:
+    def git(*args):
+        return subprocess.run(["git", *args], cwd=ROOT, capture_output=True, text=True).stdout.strip()
+    try:
+        return {"commit": git("rev-parse", "HEAD"), "subject": git("log", "-1", "--format=%s"),
+                "dirty": bool(git("status", "--porcelain", "--untracked-files=no"))}
+    except OSError:
+        return {"commit": None, "subject": None, "dirty": None}
+
+def inventory(cache_dir: str, cars: int, seed: int) -> Dict:
+    """Path of the seeded synthetic database, built once per (cars, seed)"""
+    os.makedirs(cache_dir, exist_ok=True)
+    path = os.path.join(cache_dir, f"cars_{cars}_{seed}.db")
+    if os.path.exists(path):
+        return {"path": path, "cars": cars, "seed": seed, "cached": True}
+    print(f"🏗️  Building {cars:,} synthetic cars (seed {seed})...")
+    seconds = build_database(path + ".tmp", cars, seed)
+    for suffix in ("-wal", "-shm", ".lock", ".ingest.lock"):
+        if os.path.exists(path + ".tmp" + suffix):
+            os.remove(path + ".tmp" + suffix)
+    os.replace(path + ".tmp", path)
+    return {"path": path, "cars": cars, "seed": seed, "cached": False, "build_seconds": round(seconds, 1)}
+
+def start(args: List[str], env: Optional[Dict] = None, log_path: Optional[str] = None) -> subprocess.Popen:
+    log = open(log_path, "w") if log_path else subprocess.DEVNULL
+    return subprocess.Popen([sys.executable, *args], cwd=ROOT, env=env, stdout=log, stderr=subprocess.STDOUT,
+                            start_new_session=True)
+
+def stop(process: subprocess.Popen):
+    if process.poll() is not None:
+        return
+    os.killpg(process.pid, signal.SIGTERM)
+    try:
+        process.wait(timeout=15)
+    except subprocess.TimeoutExpired:
+        os.killpg(process.pid, signal.SIGKILL)
+        process.wait()
+
+def wait_for(url: str, process: subprocess.Popen, timeout: float = 120) -> float:
+    """Seconds until url answers 200"""
+    started = time.perf_counter()
+    while time.perf_counter() - started < timeout:
+        if process.poll() is not None:
+            raise RuntimeError(f"Process exited with {process.returncode} before {url} was up")
+        try:
+            if httpx.get(url, timeout=2).status_code == 200:
+                return time.perf_counter() - started
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"{url} not up after {timeout}s")
+
+def stage_means(metrics_text: str) -> Dict[str, Dict[str, float]]:
+    """Mean ms per chat stage and per DB query from the app's /metrics"""
+    sums: Dict[tuple, float] = {}
+    counts: Dict[tuple, float] = {}
+    for line in metrics_text.splitlines():
+        for metric, label in (("chat_stage_seconds", "stage"), ("db_query_seconds", "query")):
+            for kind, target in (("_sum", sums), ("_count", counts)):
+                prefix = f'{metric}{kind}{{{label}="'
+                if line.startswith(prefix):
+                    name = line[len(prefix):line.index('"', len(prefix))]
+                    target[(metric, name)] = float(line.rsplit(" ", 1)[1])
+    result: Dict[str, Dict[str, float]] = {"chat_stage_seconds": {}, "db_query_seconds": {}}
+    for key, total in sorted(sums.items()):
+        if counts.get(key):
+            result[key[0]][key[1]] = round(total / counts[key] * 1000, 3)
+    return result
+
+def compare(current: Dict, baseline: Dict, tolerance: float) -> List[str]:
+    """Print per-scenario deltas against an earlier run; returns the regressions"""
+    for key in ("cars", "concurrency", "duration", "workers", "llm_latency", "llm_error_rate"):
+        if current["config"].get(key) != baseline["config"].get(key):
+            print(f"⚠️  {key} differs from the baseline ({baseline['config'].get(key)} -> "
+                  f"{current['config'].get(key)}); deltas are not like for like")
+    regressions = []
+    commit = (baseline["git"].get("commit") or "?")[:10]
+    print(f"\nvs {commit} ({baseline['git'].get('subject')})")
+    for name, now in current["scenarios"].items():
+        before = baseline["scenarios"].get(name)
+        if not before or not before["requests"]:
+            continue
+        rps = now["throughput_rps"] / before["throughput_rps"] - 1 if before["throughput_rps"] else 0.0
+        p95 = now["latency_ms"]["p95"] / before["latency_ms"]["p95"] - 1 if before["latency_ms"]["p95"] else 0.0
+        p99 = now["latency_ms"]["p99"] / before["latency_ms"]["p99"] - 1 if before["latency_ms"]["p99"] else 0.0
+        flag = ""
+        if rps < -tolerance or p95 > tolerance:
+            flag = "  ❌ regression"
+            regressions.append(name)
+        print(f"  {name:<11} throughput {rps:+7.1%}  p95 {p95:+7.1%}  p99 {p99:+7.1%}{flag}")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end benchmark suite")
+    parser.add_argument("--cars", type=int, default=10000, help="Synthetic inventory size (1k-1M)")
+    parser.add_argument("--seed", type=int, default=42, help="Inventory, request mix and LLM error seed")
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument("--concurrency", type=int, default=32, help="Requests in flight per scenario")
+    parser.add_argument("--duration", type=float, default=15, help="Measured seconds per scenario")
+    parser.add_argument("--warmup", type=float, default=3, help="Unmeasured seconds before each scenario")
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--llm-latency", type=float, default=0.3, help="Fake Azure OpenAI seconds per call")
+    parser.add_argument("--llm-jitter", type=float, default=0.2)
+    parser.add_argument("--llm-error-rate", type=float, default=0.0)
+    parser.add_argument("--port", type=int, default=8200)
+    parser.add_argument("--llm-port", type=int, default=9200)
+    parser.add_argument("--cache-dir", default=os.path.join(tempfile.gettempdir(), "car_bench"),
+                        help="Where synthetic inventories are kept between runs")
+    parser.add_argument("--out", default=None, help="Result JSON (default bench/results/<commit>-<cars>.json)")
+    parser.add_argument("--compare", default=None, help="Earlier result JSON to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.10,
+                        help="Throughput drop or p95 rise that counts as a regression (exit status 1)")
+    args = parser.parse_args()
+
+    db = inventory(args.cache_dir, args.cars, args.seed)
+    state_dir = tempfile.mkdtemp(prefix="car_bench_state_")
+    url = f"http://127.0.0.1:{args.port}"
+    llm_url = f"http://127.0.0.1:{args.llm_port}"
+
+    env = dict(os.environ,
+               DB_PATH=db["path"], SHARED_STATE_DIR=state_dir, SEED_SAMPLE_DATA="0", LOG_LEVEL="WARNING",
+               AZURE_OPENAI_API_KEY="fake", AZURE_OPENAI_ENDPOINT=llm_url, METRICS_FLUSH_SECONDS="1")
+    fake = start(["bench/fake_openai_server.py", "--port", str(args.llm_port),
+                  "--latency", str(args.llm_latency), "--jitter", str(args.llm_jitter),
+                  "--error-rate", str(args.llm_error_rate), "--seed", str(args.seed)])
+    app = start(["main.py", "--workers", str(args.workers), "--port", str(args.port)], env,
+                os.path.join(state_dir, "app.log"))
+    result: Dict = {}
+    try:
+        wait_for(f"{llm_url}/docs", fake)
+        ready_seconds = wait_for(f"{url}/health/ready", app)
+        print(f"🚦 App ready in {ready_seconds:.1f}s ({args.workers} worker(s), {args.cars:,} cars)")
+
+        factories = {"chat": chat_request, "cars": cars_request, "car_detail": car_detail_request(args.cars)}
+        scenarios = {}
+        for name in args.scenarios:
+            scenarios[name] = asyncio.run(run_load(
+                url, factories[name], args.concurrency, args.duration, args.warmup, args.seed
+            ))
+            summary = scenarios[name]
+            print(f"  {name:<11} {summary['throughput_rps']:8.1f} req/s  "
+                  f"p50 {summary['latency_ms']['p50']:8.1f}ms  p95 {summary['latency_ms']['p95']:8.1f}ms  "
+                  f"p99 {summary['latency_ms']['p99']:8.1f}ms  errors {summary['errors']}")
+
+        if args.workers > 1:
+            time.sleep(2)  # let every worker flush its last metrics snapshot
+        result = {
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "git": git_info(),
+            "machine": {"python": platform.python_version(), "platform": platform.platform(),
+                        "cpus": os.cpu_count()},
+            "config": {"cars": args.cars, "seed": args.seed, "concurrency": args.concurrency,
+                       "duration": args.duration, "warmup": args.warmup, "workers": args.workers,
+                       "llm_latency": args.llm_latency, "llm_jitter": args.llm_jitter,
+                       "llm_error_rate": args.llm_error_rate},
+            "inventory": {key: value for key, value in db.items() if key != "path"},
+            "ready_seconds": round(ready_seconds, 2),
+            "scenarios": scenarios,
+            # Server-side breakdown, merged across all workers
+            "server": stage_means(httpx.get(f"{url}/metrics", timeout=10).text),
+        }
+    finally:
+        stop(app)
+        stop(fake)
+        shutil.rmtree(state_dir, ignore_errors=True)
+
+    out = args.out
+    if out is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        commit = (result["git"].get("commit") or "nocommit")[:10]
+        out = os.path.join(RESULTS_DIR, f"{commit}{'-dirty' if result['git'].get('dirty') else ''}-{args.cars}.json")
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(result, f, indent=2, ensure_ascii=False)
+    print(f"📝 Results written to {os.path.relpath(out)}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            regressions = compare(result, json.load(f), args.tolerance)
+        if regressions:
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
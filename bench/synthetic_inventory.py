@@ -0,0 +1,128 @@
+# bench/synthetic_inventory.py - Generate large synthetic car inventories
+#
+# python bench/synthetic_inventory.py --cars 100000 --db /tmp/cars_100k.db
+# python bench/synthetic_inventory.py --cars 500000 --feed /tmp/feed_500k.jsonl
+import os
+import sys
+import csv
+import json
+import time
+import random
+import argparse
+from typing import Iterator, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+# make -> [(model, body_type, base_price)]
+CATALOG = {
+    "Toyota": [("Camry", "Sedan", 42000), ("Corolla", "Sedan", 33000), ("RAV4", "SUV", 46000),
+               ("Yaris", "Hatchback", 26000), ("LandCruiser", "SUV", 95000), ("HiLux", "Ute", 52000)],
+    "BMW": [("3 Series", "Sedan", 65000), ("5 Series", "Sedan", 85000), ("X3", "SUV", 75000),
+            ("X5", "SUV", 110000), ("1 Series", "Hatchback", 50000)],
+    "Mercedes": [("C-Class", "Sedan", 70000), ("E-Class", "Sedan", 95000), ("GLA", "SUV", 66000),
+                 ("GLC", "SUV", 82000), ("A-Class", "Hatchback", 48000)],
+    "Honda": [("Civic", "Sedan", 36000), ("CR-V", "SUV", 44000), ("HR-V", "SUV", 34000),
+              ("Accord", "Sedan", 46000)],
+    "Mazda": [("CX-5", "SUV", 40000), ("3", "Hatchback", 31000), ("CX-9", "SUV", 56000),
+              ("6", "Sedan", 39000), ("BT-50", "Ute", 48000)],
+    "Hyundai": [("Elantra", "Sedan", 32000), ("Tucson", "SUV", 42000), ("i30", "Hatchback", 28000),
+                ("Santa Fe", "SUV", 52000)],
+    "Nissan": [("Altima", "Sedan", 35000), ("X-Trail", "SUV", 44000), ("Navara", "Ute", 50000),
+               ("Patrol", "SUV", 85000)],
+    "Volkswagen": [("Golf", "Hatchback", 38000), ("Tiguan", "SUV", 50000), ("Passat", "Sedan", 48000),
+                   ("Amarok", "Ute", 60000)],
+    "Kia": [("Sportage", "SUV", 40000), ("Cerato", "Sedan", 29000), ("Sorento", "SUV", 55000),
+            ("Picanto", "Hatchback", 18000)],
+    "Tesla": [("Model 3", "Sedan", 62000), ("Model Y", "SUV", 68000)],
+}
+
+# Relative popularity of each make in a typical Australian dealer feed
+MAKE_WEIGHTS = {"Toyota": 22, "Mazda": 12, "Hyundai": 10, "Kia": 10, "Honda": 7, "Nissan": 8,
+                "Volkswagen": 8, "BMW": 6, "Mercedes": 6, "Tesla": 3}
+
+FUEL_TYPES = [("Petrol", 70), ("Diesel", 15), ("Hybrid", 10), ("Electric", 5)]
+TRANSMISSIONS = [("Automatic", 85), ("Manual", 15)]
+
+DESCRIPTIONS = [
+    "نو، با تمام امکانات", "یک ساله، خودرو ایده‌آل خانواده", "اقتصادی و قابل اعتماد",
+    "SUV خانوادگی با امکانات کامل", "لوکس و اسپرت", "کم‌کارکرد و تمیز", "بدون رنگ، سرویس کامل",
+    "مناسب سفرهای طولانی", "مصرف سوخت پایین", "گارانتی عالی و قیمت مناسب", "طراحی مدرن",
+    "تک‌مالک با سابقه سرویس", "فضای داخلی بزرگ", "مناسب شهر",
+]
+
+def _weighted(rnd: random.Random, pairs):
+    values, weights = zip(*pairs)
+    return rnd.choices(values, weights=weights)[0]
+
+def generate_cars(count: int, seed: int = 42) -> Iterator[Tuple]:
+    """Yield (make, model, year, price, body, fuel, transmission, mileage, description) rows"""
+    rnd = random.Random(seed)
+    makes = list(MAKE_WEIGHTS)
+    weights = [MAKE_WEIGHTS[m] for m in makes]
+    for _ in range(count):
+        make = rnd.choices(makes, weights=weights)[0]
+        model, body_type, base_price = rnd.choice(CATALOG[make])
+        year = rnd.choices(range(2015, 2026), weights=[1, 1, 2, 2, 3, 4, 5, 6, 8, 10, 12])[0]
+        age = 2025 - year
+        mileage = 0 if age == 0 else int(max(0, rnd.gauss(15000 * age, 5000 * age)))
+        # Log-normal noise around a depreciating base price
+        price = base_price * (0.88 ** age) * rnd.lognormvariate(0, 0.08)
+        price = round(price / 100) * 100
+        yield (
+            make, model, year, float(price), body_type,
+            _weighted(rnd, FUEL_TYPES), _weighted(rnd, TRANSMISSIONS), mileage,
+            "، ".join(rnd.sample(DESCRIPTIONS, 2))
+        )
+
+def write_feed(path: str, count: int, seed: int = 42) -> float:
+    """Write count synthetic cars as a dealer feed (CSV or JSONL by extension)"""
+    from database.ingest import FEED_COLUMNS
+    start = time.perf_counter()
+    rows = ((f"STK{i:08d}", *car, 1) for i, car in enumerate(generate_cars(count, seed)))
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        if path.endswith(".csv"):
+            writer = csv.writer(f)
+            writer.writerow(FEED_COLUMNS)
+            writer.writerows(rows)
+        else:
+            for row in rows:
+                f.write(json.dumps(dict(zip(FEED_COLUMNS, row)), ensure_ascii=False) + "\n")
+    return time.perf_counter() - start
+
+def build_database(db_path: str, count: int, seed: int = 42, batch_size: int = 20000) -> float:
+    """Create a database with count synthetic cars; returns seconds taken"""
+    from database.ingest import ingest_rows
+    start = time.perf_counter()
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(db_path + suffix):
+            os.remove(db_path + suffix)
+
+    def chunks():
+        cars = generate_cars(count, seed)
+        for offset in range(0, count, batch_size):
+            yield [(f"STK{offset + i:08d}", *car, 1)
+                   for i, car in zip(range(batch_size), cars)]
+
+    # Bulk path: indexes and triggers are rebuilt once after the load
+    ingest_rows(chunks(), db_path, rebuild_indexes=True)
+    return time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic car inventory")
+    parser.add_argument("--cars", type=int, default=10000)
+    parser.add_argument("--db", default="bench_cars.db")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--feed", default=None, help="Write a .csv/.jsonl feed for database.ingest instead")
+    args = parser.parse_args()
+
+    if args.feed:
+        elapsed = write_feed(args.feed, args.cars, args.seed)
+        print(f"✅ {args.cars:,} cars written to {args.feed} in {elapsed:.1f}s")
+        return
+
+    elapsed = build_database(args.db, args.cars, args.seed)
+    print(f"✅ {args.cars:,} cars written to {args.db} in {elapsed:.1f}s")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,251 @@
+# database/ingest.py - Bulk inventory import from a dealer feed (CSV or JSONL)
+#
+# Runs without the web app:
+#   python -m database.ingest feed.jsonl --db cars.db --full
+import os
+import csv
+import gzip
+import time
+import sqlite3
+import argparse
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from database.migrations import file_lock
+from database.models import init_database, rebuild_text_index
+from services.json_utils import loads
+
+# Car columns a feed may provide, in insert order; stock_key is the upsert key
+FEED_COLUMNS = ("stock_key", "make", "model", "year", "price", "body_type", "fuel_type",
+                "transmission", "mileage", "description", "available")
+REQUIRED = ("stock_key", "make", "model", "year", "price")
+
+INGEST_BATCH_SIZE = int(os.getenv('INGEST_BATCH_SIZE', '20000'))
+# Feeds at least this large load with secondary indexes and triggers dropped, then rebuilt
+INGEST_REBUILD_BYTES = int(os.getenv('INGEST_REBUILD_BYTES', str(16 * 1024 * 1024)))
+
+_UPSERT = f'''
+    INSERT INTO cars ({", ".join(FEED_COLUMNS)})
+    VALUES ({", ".join("?" * len(FEED_COLUMNS))})
+    ON CONFLICT(stock_key) DO UPDATE SET
+        {", ".join(f"{c} = excluded.{c}" for c in FEED_COLUMNS[1:])}
+'''
+
+def _open(path: str):
+    if path.endswith(".gz"):
+        return gzip.open(path, "rt", encoding="utf-8", newline="")
+    return open(path, "r", encoding="utf-8", newline="")
+
+def _feed_format(path: str) -> str:
+    name = path[:-3] if path.endswith(".gz") else path
+    return "csv" if name.endswith(".csv") else "jsonl"
+
+def read_feed(path: str, chunk_size: int = INGEST_BATCH_SIZE, fmt: Optional[str] = None) -> Iterator[List[Dict]]:
+    """Yield the feed's records chunk by chunk, never holding the whole file"""
+    fmt = fmt or _feed_format(path)
+    with _open(path) as f:
+        if fmt == "csv":
+            records = csv.DictReader(f)
+        else:
+            records = (loads(line) for line in f if line.strip())
+        chunk = []
+        for record in records:
+            chunk.append(record)
+            if len(chunk) >= chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+def to_row(record: Dict) -> Optional[Tuple]:
+    """Feed record -> cars row in FEED_COLUMNS order, or None if it is unusable"""
+    try:
+        available = record.get("available", 1)
+        if isinstance(available, str):
+            available = available.strip().lower() not in ("0", "false", "no", "")
+        mileage = record.get("mileage")
+        row = (
+            str(record["stock_key"] or "").strip(),
+            str(record["make"] or "").strip(),
+            str(record["model"] or "").strip(),
+            int(record["year"]),
+            float(record["price"]),
+            record.get("body_type") or None,
+            record.get("fuel_type") or None,
+            record.get("transmission") or None,
+            int(float(mileage)) if mileage not in (None, "") else None,
+            record.get("description") or None,
+            1 if available else 0,
+        )
+    except (KeyError, TypeError, ValueError):
+        return None
+    return row if row[0] and row[1] and row[2] else None
+
+def upsert_rows(conn: sqlite3.Connection, rows: List[Tuple]):
+    """Insert or update rows (FEED_COLUMNS order) by stock key"""
+    conn.executemany(_UPSERT, rows)
+
+def _drop_secondary(conn: sqlite3.Connection, indexes: bool):
+    """Drop the inventory version triggers, and with indexes=True every other cars index
+    and trigger except the upsert key. Their SQL goes to ingest_restore in the same
+    transaction, so a load that dies before restoring them is repaired at next startup."""
+    conn.execute("CREATE TABLE IF NOT EXISTS ingest_restore (name TEXT PRIMARY KEY, sql TEXT NOT NULL)")
+    objects = conn.execute('''
+        SELECT type, name, sql FROM sqlite_master
+        WHERE tbl_name = 'cars' AND type IN ('index', 'trigger')
+          AND sql IS NOT NULL AND name != 'idx_stock_key'
+          AND (? OR name LIKE 'cars_version_%')
+    ''', (indexes,)).fetchall()
+    for kind, name, sql in objects:
+        conn.execute("INSERT OR REPLACE INTO ingest_restore (name, sql) VALUES (?, ?)", (name, sql))
+        conn.execute(f"DROP {kind.upper()} {name}")
+
+def _restore_secondary(conn: sqlite3.Connection) -> List[str]:
+    """Re-create what _drop_secondary recorded (inside the caller's transaction);
+    returns the names restored"""
+    if not conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'ingest_restore'"
+    ).fetchone():
+        return []
+    existing = {row[0] for row in conn.execute("SELECT name FROM sqlite_master")}
+    pending = conn.execute("SELECT name, sql FROM ingest_restore").fetchall()
+    for name, sql in pending:
+        if name not in existing:
+            conn.execute(sql)
+    # Rows loaded while the FTS triggers were gone are missing from cars_fts
+    if any(name.startswith("cars_fts_") for name, _ in pending) and _has_text_index(conn):
+        rebuild_text_index(conn.cursor())
+    conn.execute("DELETE FROM ingest_restore")
+    return [name for name, _ in pending]
+
+def restore_interrupted_ingest(db_path: str = "cars.db") -> List[str]:
+    """Startup repair: restore indexes and triggers an interrupted import dropped.
+    Skipped while an import is still running (it restores them itself)."""
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    try:
+        if not conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'ingest_restore'"
+        ).fetchone() or not conn.execute("SELECT 1 FROM ingest_restore LIMIT 1").fetchone():
+            return []
+        with file_lock(f"{db_path}.ingest.lock", blocking=False) as acquired:
+            if not acquired:
+                return []
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                restored = _restore_secondary(conn)
+                if restored:
+                    # Version triggers were off during the load: caches must not trust it
+                    conn.execute("UPDATE inventory_meta SET value = value + 1 WHERE key = 'version'")
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        if restored:
+            print(f"🔧 Restored {len(restored)} indexes/triggers left dropped by an interrupted import")
+        return restored
+    finally:
+        conn.close()
+
+def _has_text_index(conn: sqlite3.Connection) -> bool:
+    return conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'cars_fts'"
+    ).fetchone() is not None
+
+def ingest(path: str, db_path: str = "cars.db", full: bool = False, rebuild_indexes: Optional[bool] = None,
+           batch_size: int = INGEST_BATCH_SIZE, fmt: Optional[str] = None) -> Dict:
+    """Stream a feed into cars, one transaction per batch.
+    full=True treats the feed as the whole inventory: stock missing from it becomes unavailable."""
+    if rebuild_indexes is None:
+        rebuild_indexes = os.path.getsize(path) >= INGEST_REBUILD_BYTES
+    chunks = ([to_row(record) for record in chunk] for chunk in read_feed(path, batch_size, fmt))
+    return ingest_rows(chunks, db_path, full, rebuild_indexes)
+
+def ingest_rows(chunks: Iterable[List[Optional[Tuple]]], db_path: str = "cars.db", full: bool = False,
+                rebuild_indexes: bool = True) -> Dict:
+    """Load chunks of FEED_COLUMNS rows (None for a rejected record), one transaction per chunk"""
+    start = time.perf_counter()
+    init_database(db_path)
+
+    stats = {"rows": 0, "upserted": 0, "rejected": 0, "deactivated": 0}
+    # Held for the whole load, so startup repair leaves a running import alone
+    with file_lock(f"{db_path}.ingest.lock"):
+        conn = sqlite3.connect(db_path, isolation_level=None)
+        try:
+            _load(conn, chunks, full, rebuild_indexes, stats)
+        except BaseException:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            # Never leave the table without its indexes and triggers
+            conn.execute("BEGIN")
+            if _restore_secondary(conn):
+                conn.execute("UPDATE inventory_meta SET value = value + 1 WHERE key = 'version'")
+            conn.execute("COMMIT")
+            raise
+        finally:
+            conn.close()
+
+    stats["seconds"] = round(time.perf_counter() - start, 2)
+    stats["rows_per_sec"] = int(stats["rows"] / stats["seconds"]) if stats["seconds"] else stats["rows"]
+    stats["rebuilt_indexes"] = rebuild_indexes
+    return stats
+
+def _load(conn: sqlite3.Connection, chunks: Iterable[List[Optional[Tuple]]], full: bool,
+          rebuild_indexes: bool, stats: Dict):
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA cache_size=-200000")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    if full:
+        conn.execute("CREATE TEMP TABLE feed_keys (stock_key TEXT PRIMARY KEY)")
+
+    # Per-row version bumps would cost an extra write per car; one bump at the end suffices
+    conn.execute("BEGIN")
+    _restore_secondary(conn)  # left dropped by an earlier import that crashed
+    _drop_secondary(conn, rebuild_indexes)
+    conn.execute("COMMIT")
+
+    for chunk in chunks:
+        rows = [row for row in chunk if row is not None]
+        stats["rows"] += len(chunk)
+        stats["rejected"] += len(chunk) - len(rows)
+        conn.execute("BEGIN")
+        upsert_rows(conn, rows)
+        if full:
+            conn.executemany("INSERT OR IGNORE INTO feed_keys VALUES (?)", ((row[0],) for row in rows))
+        conn.execute("COMMIT")
+        stats["upserted"] += len(rows)
+
+    conn.execute("BEGIN")
+    if full:
+        stats["deactivated"] = conn.execute('''
+            UPDATE cars SET available = 0
+            WHERE available = 1 AND stock_key IS NOT NULL
+              AND stock_key NOT IN (SELECT stock_key FROM feed_keys)
+        ''').rowcount
+    _restore_secondary(conn)
+    conn.execute("UPDATE inventory_meta SET value = value + 1 WHERE key = 'version'")
+    conn.execute("COMMIT")
+    conn.execute("ANALYZE cars")
+
+def main():
+    parser = argparse.ArgumentParser(description="Import a dealer inventory feed")
+    parser.add_argument("feed", help="CSV or JSONL file (optionally .gz)")
+    parser.add_argument("--db", default="cars.db")
+    parser.add_argument("--format", choices=("csv", "jsonl"), default=None)
+    parser.add_argument("--full", action="store_true",
+                        help="Feed is the complete inventory: mark stock missing from it unavailable")
+    parser.add_argument("--rebuild-indexes", choices=("auto", "yes", "no"), default="auto",
+                        help=f"Drop and rebuild indexes around the load (auto: feeds >= {INGEST_REBUILD_BYTES:,} bytes)")
+    parser.add_argument("--batch-size", type=int, default=INGEST_BATCH_SIZE)
+    args = parser.parse_args()
+
+    rebuild = {"auto": None, "yes": True, "no": False}[args.rebuild_indexes]
+    stats = ingest(args.feed, args.db, args.full, rebuild, args.batch_size, args.format)
+    print(f"✅ {stats['upserted']:,} cars upserted from {stats['rows']:,} rows in {stats['seconds']}s "
+          f"({stats['rows_per_sec']:,} rows/s)")
+    if stats["rejected"]:
+        print(f"⚠️  {stats['rejected']:,} rows rejected (missing or invalid {', '.join(REQUIRED)})")
+    if args.full:
+        print(f"🗑️  {stats['deactivated']:,} cars no longer in the feed marked unavailable")
+
+if __name__ == "__main__":
+    main()
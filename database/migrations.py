@@ -0,0 +1,149 @@
+# database/migrations.py - Versioned schema, applied once per database file
+import time
+import sqlite3
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows: no flock; run a single worker there
+    fcntl = None
+
+from database.models import init_text_index
+
+def _create_cars(cursor):
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS cars (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            make TEXT NOT NULL,
+            model TEXT NOT NULL,
+            year INTEGER NOT NULL,
+            price REAL NOT NULL,
+            body_type TEXT,
+            fuel_type TEXT,
+            transmission TEXT,
+            mileage INTEGER,
+            description TEXT,
+            available BOOLEAN DEFAULT 1
+        )
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_make ON cars(make)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_model ON cars(model)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_price ON cars(price)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_year ON cars(year)')
+
+def _create_search_indexes(cursor):
+    # Matches the LOWER(make) = LOWER(?) filters and keeps rows in price order
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_make_lower_price ON cars(LOWER(make), price)')
+    # Keyset pagination for the /cars listing (make, model, year DESC, id)
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_listing ON cars(make, model, -year, id)')
+
+def _create_inventory_version(cursor):
+    # Inventory version: bumped by triggers on every write to cars,
+    # so in-memory copies of the inventory know when to reload
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS inventory_meta (
+            key TEXT PRIMARY KEY,
+            value INTEGER NOT NULL
+        )
+    ''')
+    cursor.execute("INSERT OR IGNORE INTO inventory_meta (key, value) VALUES ('version', 0)")
+    for event in ('INSERT', 'UPDATE', 'DELETE'):
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS cars_version_{event.lower()}
+            AFTER {event} ON cars
+            BEGIN
+                UPDATE inventory_meta SET value = value + 1 WHERE key = 'version';
+            END
+        ''')
+
+def _add_stock_key(cursor):
+    # Feed imports upsert on the dealer's stock key
+    columns = {row[1] for row in cursor.execute("PRAGMA table_info(cars)")}
+    if "stock_key" not in columns:
+        cursor.execute("ALTER TABLE cars ADD COLUMN stock_key TEXT")
+    cursor.execute('CREATE UNIQUE INDEX IF NOT EXISTS idx_stock_key ON cars(stock_key)')
+
+# (version, description, step). Append only; never edit a released step.
+# Every step is idempotent, so databases created before versioning
+# (user_version 0) upgrade cleanly.
+MIGRATIONS: List[Tuple[int, str, Callable]] = [
+    (1, "cars table", _create_cars),
+    (2, "search indexes", _create_search_indexes),
+    (3, "inventory version", _create_inventory_version),
+    (4, "full-text index", init_text_index),
+    (5, "stock key", _add_stock_key),
+]
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+@contextmanager
+def file_lock(path: str, blocking: bool = True) -> Iterator[bool]:
+    """Exclusive lock across processes (every worker starting against the same database).
+    With blocking=False, yields False instead of waiting when another process holds it."""
+    with open(path, "a") as f:
+        acquired = True
+        if fcntl is not None:
+            try:
+                fcntl.flock(f, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                acquired = False
+        try:
+            yield acquired
+        finally:
+            if fcntl is not None and acquired:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+def schema_version(conn: sqlite3.Connection) -> int:
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+def migrate(db_path: str = 'cars.db') -> List[int]:
+    """Apply pending migrations; returns the versions applied (usually none)"""
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    try:
+        # Up to date: no lock needed, which keeps N workers booting in parallel
+        if schema_version(conn) >= SCHEMA_VERSION:
+            return []
+        with file_lock(f"{db_path}.lock"):
+            conn.execute('PRAGMA journal_mode=WAL')  # readers don't block the writer
+            applied = []
+            current = schema_version(conn)  # another worker may have migrated meanwhile
+            for version, description, step in MIGRATIONS:
+                if version <= current:
+                    continue
+                conn.execute("BEGIN IMMEDIATE")
+                try:
+                    step(conn.cursor())
+                    conn.execute(f"PRAGMA user_version = {version}")
+                    conn.execute("COMMIT")
+                except BaseException:
+                    conn.execute("ROLLBACK")
+                    raise
+                print(f"🗃️  Migration {version}: {description}")
+                applied.append(version)
+            return applied
+    finally:
+        conn.close()
+
+def prepare_database(db_path: str = 'cars.db', seed: bool = True) -> Dict:
+    """Startup path: migrate, then seed sample cars into an empty database.
+    Returns what was done and how long it took."""
+    from database.sample_data import populate_sample_data
+    from database.ingest import restore_interrupted_ingest
+
+    start = time.perf_counter()
+    applied = migrate(db_path)
+    # A bulk import that crashed may have left cars without its indexes and triggers
+    restored = restore_interrupted_ingest(db_path)
+    migrated_at = time.perf_counter()
+    if seed:
+        # Under the lock so two workers don't both see an empty table
+        with file_lock(f"{db_path}.lock"):
+            populate_sample_data(db_path)
+    done = time.perf_counter()
+    return {
+        "schema_version": SCHEMA_VERSION,
+        "migrations_applied": applied,
+        "ingest_restored": restored,
+        "migrate_ms": round((migrated_at - start) * 1000, 1),
+        "seed_ms": round((done - migrated_at) * 1000, 1),
+    }
@@ -1,10 +1,9 @@
 # database/models.py
 import sqlite3
-from dataclasses import dataclass
-from typing import Optional
+from typing import Any, Dict, NamedTuple, Optional, Sequence
 
-@dataclass
-class Car:
+class Car(NamedTuple):
+    """One inventory row; a plain tuple underneath, so no per-instance __dict__"""
     id: int
     make: str
     model: str
@@ -20,48 +19,92 @@ class Car:
     @classmethod
     def from_db_row(cls, row):
         """Create Car object from database row"""
-        return cls(
-            id=row[0],
-            make=row[1],
-            model=row[2],
-            year=row[3],
-            price=row[4],
-            body_type=row[5],
-            fuel_type=row[6],
-            transmission=row[7],
-            mileage=row[8],
-            description=row[9],
-            available=bool(row[10])
-        )
+        return _new_tuple(cls, (*row[:10], bool(row[10])))
+    
+    def to_dict(self, fields: Optional[Sequence[str]] = None) -> Dict[str, Any]:
+        """JSON-ready dict of the given fields (all of them by default)"""
+        if fields is None:
+            return dict(zip(self._fields, self))
+        return {field: self[_FIELD_INDEX[field]] for field in fields}
+
+_new_tuple = tuple.__new__
+_FIELD_INDEX = {field: i for i, field in enumerate(Car._fields)}
+
+def car_row_factory(cursor: sqlite3.Cursor, row: tuple) -> Car:
+    """Cursor row factory that builds Car straight from the raw row tuple"""
+    return _new_tuple(Car, (*row[:10], bool(row[10])))
+
+def init_database(db_path: str = 'cars.db'):
+    """Initialize SQLite database with tables (applies pending migrations)"""
+    from database.migrations import migrate
+    if migrate(db_path):
+        print("✅ Database tables created")
+
+# Letter variants folded before text reaches the FTS index; mirrors
+# services.text_utils.normalize_text so indexed text and queries agree
+_FTS_CHAR_MAP = [
+    ("ي", "ی"), ("ى", "ی"), ("ك", "ک"), ("ة", "ه"), ("ۀ", "ه"),
+    ("أ", "ا"), ("إ", "ا"), ("\u200c", " "), ("\u200f", ""), ("\u0640", ""),
+] + list(zip("۰۱۲۳۴۵۶۷۸۹", "0123456789"))
+
+def _fts_normalize(expr: str) -> str:
+    """SQL expression that normalizes a text column (plain SQL, so any connection can write)"""
+    replaced = expr
+    for old, new in _FTS_CHAR_MAP:
+        replaced = f"REPLACE({replaced}, '{old}', '{new}')"
+    # Most values contain none of the mapped characters: skip the REPLACE chain for them
+    chars = "".join(old for old, _ in _FTS_CHAR_MAP)
+    return f"LOWER(CASE WHEN {expr} GLOB '*[{chars}]*' THEN {replaced} ELSE {expr} END)"
 
-def init_database():
-    """Initialize SQLite database with tables"""
-    conn = sqlite3.connect('cars.db')
-    cursor = conn.cursor()
+def _fts_columns(prefix: str) -> str:
+    """Normalized make, model and description of the row named by prefix"""
+    return ", ".join(_fts_normalize(f"COALESCE({prefix}{c}, '')") for c in ("make", "model", "description"))
+
+def init_text_index(cursor):
+    """FTS5 index over make, model and description, kept in sync by triggers"""
+    try:
+        cursor.execute('''
+            CREATE VIRTUAL TABLE IF NOT EXISTS cars_fts USING fts5(
+                make, model, description,
+                tokenize = 'unicode61 remove_diacritics 2'
+            )
+        ''')
+    except sqlite3.OperationalError as e:
+        print(f"⚠️  FTS5 unavailable ({e}); text search will scan the table")
+        return
     
-    # Create cars table
+    columns = _fts_columns("new.")
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS cars_fts_insert AFTER INSERT ON cars
+        BEGIN
+            INSERT INTO cars_fts (rowid, make, model, description) VALUES (new.id, {columns});
+        END
+    ''')
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS cars_fts_update AFTER UPDATE OF make, model, description ON cars
+        BEGIN
+            DELETE FROM cars_fts WHERE rowid = old.id;
+            INSERT INTO cars_fts (rowid, make, model, description) VALUES (new.id, {columns});
+        END
+    ''')
     cursor.execute('''
-        CREATE TABLE IF NOT EXISTS cars (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            make TEXT NOT NULL,
-            model TEXT NOT NULL,
-            year INTEGER NOT NULL,
-            price REAL NOT NULL,
-            body_type TEXT,
-            fuel_type TEXT,
-            transmission TEXT,
-            mileage INTEGER,
-            description TEXT,
-            available BOOLEAN DEFAULT 1
-        )
+        CREATE TRIGGER IF NOT EXISTS cars_fts_delete AFTER DELETE ON cars
+        BEGIN
+            DELETE FROM cars_fts WHERE rowid = old.id;
+        END
     ''')
     
-    # Create indexes for better performance
-    cursor.execute('CREATE INDEX IF NOT EXISTS idx_make ON cars(make)')
-    cursor.execute('CREATE INDEX IF NOT EXISTS idx_model ON cars(model)')
-    cursor.execute('CREATE INDEX IF NOT EXISTS idx_price ON cars(price)')
-    cursor.execute('CREATE INDEX IF NOT EXISTS idx_year ON cars(year)')
-    
-    conn.commit()
-    conn.close()
-    print("✅ Database tables created")
\ No newline at end of file
+    # Backfill rows written before the index existed
+    cursor.execute(f'''
+        INSERT INTO cars_fts (rowid, make, model, description)
+        SELECT id, {_fts_columns("")} FROM cars
+        WHERE id NOT IN (SELECT rowid FROM cars_fts)
+    ''')
+
+def rebuild_text_index(cursor):
+    """Recreate cars_fts from scratch (after bulk loads that ran without its triggers).
+    Dropping the table is far cheaper than deleting every row from it."""
+    for name in ("cars_fts_insert", "cars_fts_update", "cars_fts_delete"):
+        cursor.execute(f"DROP TRIGGER IF EXISTS {name}")
+    cursor.execute("DROP TABLE IF EXISTS cars_fts")
+    init_text_index(cursor)
\ No newline at end of file
@@ -1,7 +1,8 @@
 # database/sample_data.py
 import sqlite3
+from database.ingest import upsert_rows
 
-def populate_sample_data():
+def populate_sample_data(db_path: str = 'cars.db'):
     """Add sample car data to database"""
     
     sample_cars = [
@@ -44,18 +45,17 @@ def populate_sample_data():
         ("Kia", "Sportage", 2024, 41000, "SUV", "Petrol", "Automatic", 0, "طراحی مدرن، قیمت مناسب"),
     ]
     
-    conn = sqlite3.connect('cars.db')
-    cursor = conn.cursor()
+    conn = sqlite3.connect(db_path)
     
-    # Clear existing data
-    cursor.execute('DELETE FROM cars')
+    # Seed only an empty inventory; a real feed (python -m database.ingest) is left alone
+    if conn.execute('SELECT 1 FROM cars LIMIT 1').fetchone():
+        conn.close()
+        print("ℹ️  Inventory already loaded; sample data skipped")
+        return
     
-    # Insert sample data
-    cursor.executemany('''
-        INSERT INTO cars (make, model, year, price, body_type, fuel_type, transmission, mileage, description)
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-    ''', sample_cars)
-    
-    conn.commit()
+    # Stable stock keys make re-seeding an upsert instead of duplicate rows
+    rows = [(f"SAMPLE-{i:03d}", *car, 1) for i, car in enumerate(sample_cars, 1)]
+    with conn:
+        upsert_rows(conn, rows)
     conn.close()
-    print(f"✅ Added {len(sample_cars)} sample cars to database")
\ No newline at end of file
+    print(f"✅ Added {len(sample_cars)} sample cars to database")
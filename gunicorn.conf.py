@@ -0,0 +1,14 @@
+# gunicorn.conf.py - Production run mode: gunicorn -c gunicorn.conf.py main:app
+import os
+import multiprocessing
+
+bind = os.getenv("BIND", "0.0.0.0:8000")
+workers = int(os.getenv("WEB_WORKERS", "0")) or multiprocessing.cpu_count()
+worker_class = "uvicorn.workers.UvicornWorker"
+# Each worker builds its own clients and pools after the fork
+preload_app = False
+graceful_timeout = 30
+accesslog = None
+
+# Workers share caches, sessions and inventory snapshots through this directory
+os.environ.setdefault("SHARED_STATE_DIR", "shared_state")
@@ -1,43 +1,197 @@
 # main.py - Fixed version
+import time
+_import_started = time.perf_counter()
+
 import uvicorn
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Query, Request
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, JSONResponse, Response, StreamingResponse
 from pydantic import BaseModel
-from typing import Dict, Any
+from typing import Awaitable, Callable, Dict, Any, List, Optional
 import os
+import asyncio
+import logging
+import argparse
 
 # Import our modules
-from database.models import init_database
-from database.sample_data import populate_sample_data
+from database.migrations import prepare_database
+from database.connection import DB_PATH, close_all_pools
 from services.ai_service import AIService
-from services.car_service import CarService
+from services.car_service import AsyncCarService
+from services.response_cache import ResponseCache
+from services.session_store import SessionStore
+from services.json_utils import dumps
+from services.app_logging import setup_logging
+from services.metrics import REGISTRY, STAGE_SECONDS, MetricsMiddleware, render_shared, write_snapshot
+from services.shared_state import shared_state_path
+
+# Log records go through a queue to a writer thread, never straight to stdout
+setup_logging()
+log = logging.getLogger("main")
 
 # Initialize FastAPI app
 app = FastAPI(title="Car Dealership MVP", version="1.0.0")
+app.add_middleware(MetricsMiddleware)
 
 # Mount static files
 app.mount("/static", StaticFiles(directory="static"), name="static")
 
-# Initialize services
-ai_service = AIService()
-car_service = CarService()
+# Built by startup_event: uvicorn's spawned workers also execute this file as
+# __mp_main__, and only the app they serve should open pools, caches and sessions
+ai_service: Optional[AIService] = None
+car_service: Optional[AsyncCarService] = None
+response_cache: Optional[ResponseCache] = None
+session_store: Optional[SessionStore] = None
+
+# Seed the sample cars into an empty database at startup (never over a loaded feed)
+SEED_SAMPLE_DATA = os.getenv('SEED_SAMPLE_DATA', '1') == '1'
+# Filled by startup_event, reported by /health
+startup_report: Dict[str, Any] = {}
+# Set once the background warm-up has loaded indexes and caches; gates /health/ready
+warm_state: Dict[str, Any] = {"warm": False, "error": None}
+# Workers publish metric snapshots here so /metrics on any of them covers all of them
+METRICS_DIR = shared_state_path("metrics")
+METRICS_FLUSH_SECONDS = float(os.getenv('METRICS_FLUSH_SECONDS', '5'))
+
+def _cache_lookups() -> Dict:
+    lookups = {}
+    for cache, stats in (("intent", ai_service.intent_cache.stats()), ("response", response_cache.stats())):
+        for result in ("hits", "backend_hits", "misses"):
+            lookups[(cache, result)] = stats[result]
+    return lookups
+
+def _coalescing() -> Dict:
+    flights = [ai_service.intent_flight, ai_service.response_flight, car_service.search_flight]
+    return {
+        (flight.name, result): getattr(flight, attr)
+        for flight in flights for result, attr in (("executed", "calls"), ("coalesced", "coalesced"))
+    }
+
+def _register_metrics():
+    """Scrape-time views of the counters the services already keep (see /health for the JSON form).
+    They look the services up when scraped, so once per process is enough."""
+    if "cache_lookups_total" in REGISTRY:
+        return
+    REGISTRY.callback("cache_lookups_total", "Intent and response cache lookups by result",
+                      "counter", ("cache", "result"), _cache_lookups)
+    REGISTRY.callback("cache_hit_ratio", "Share of cache lookups answered from memory or the shared backend",
+                      "gauge", ("cache",), lambda: {
+                          ("intent",): ai_service.intent_cache.stats()["hit_ratio"],
+                          ("response",): response_cache.stats()["hit_ratio"]})
+    REGISTRY.callback("intent_parse_total", "Chat messages by how the intent was obtained",
+                      "counter", ("path",), lambda: {
+                          (path,): value for path, value in ai_service.parse_stats.items() if path != "requests"})
+    REGISTRY.callback("singleflight_calls_total", "Calls executed vs coalesced onto an identical in-flight call",
+                      "counter", ("flight", "result"), _coalescing)
+    REGISTRY.callback("llm_breaker_open", "1 while the Azure OpenAI circuit breaker is open",
+                      "gauge", (), lambda: {(): int(ai_service.breaker.is_open())})
+    REGISTRY.callback("llm_concurrency_limit", "Current adaptive limit on in-flight LLM calls",
+                      "gauge", (), lambda: {(): ai_service.limiter.stats()["limit"]})
+    REGISTRY.callback("sessions_active", "Conversation sessions in the session store",
+                      "gauge", (), lambda: {(): session_store.stats().get("sessions", 0)})
 
 # Pydantic models for API
 class ChatMessage(BaseModel):
     message: str
+    session_id: Optional[str] = None
 
 class ChatResponse(BaseModel):
     response: str
     cars: list = []
+    session_id: Optional[str] = None
+
+# Car fields sent to the chat cards and the detail page
+CAR_FIELDS = ("id", "make", "model", "year", "price", "body_type", "fuel_type",
+              "transmission", "mileage", "description")
+
+def _chat_car_payload(cars) -> List[Dict[str, Any]]:
+    """Prepare car data for the chat frontend"""
+    return [car.to_dict(CAR_FIELDS) for car in cars[:5]]  # Limit to 5 cars for performance
+
+def _chat_json(reply: str, cars, session_id: str) -> Response:
+    """Encode a ChatResponse body ourselves, so the serialize stage times the real encoding"""
+    body = dumps({"response": reply, "cars": _chat_car_payload(cars), "session_id": session_id})
+    return Response(content=body, media_type="application/json")
+
+def _sse_event(event: str, data: Dict[str, Any]) -> str:
+    """Format one server-sent event"""
+    return f"event: {event}\ndata: {dumps(data).decode('utf-8')}\n\n"
+
+async def _cached_json(request: Request, key: str,
+                       build: Callable[[], Awaitable[Dict[str, Any]]]) -> Response:
+    """Serve a JSON payload from the response cache, rebuilt when the inventory changes"""
+    version = await car_service.get_inventory_version()
+    entry = await response_cache.get(key, version)
+    if entry is None:
+        payload = await build()
+        with STAGE_SECONDS.time(stage="serialize_json"):
+            body = dumps(payload)
+        entry = await response_cache.set(key, version, body)
+    
+    headers = {"ETag": entry.etag, "Cache-Control": "no-cache"}
+    if entry.matches(request.headers.get("if-none-match")):
+        response_cache.record_not_modified()
+        return Response(status_code=304, headers=headers)
+    return Response(content=entry.body, media_type="application/json", headers=headers)
 
 @app.on_event("startup")
 async def startup_event():
-    """Initialize database on startup"""
-    print("🚀 Starting Car Dealership MVP...")
-    init_database()
-    populate_sample_data()
-    print("✅ Database initialized")
+    """Bring the database schema up to date (cheap and safe when N workers start at once),
+    then build the services"""
+    log.info("🚀 Starting Car Dealership MVP...")
+    started = time.perf_counter()
+    # Migrations run once per database file under a lock; seeding only fills an empty table
+    startup_report.update(prepare_database(DB_PATH, seed=SEED_SAMPLE_DATA))
+    global ai_service, car_service, response_cache, session_store
+    ai_service = AIService()
+    car_service = AsyncCarService()
+    response_cache = ResponseCache.from_env()
+    session_store = SessionStore.from_env()
+    _register_metrics()
+    startup_report["import_ms"] = round((started - _import_started) * 1000, 1)
+    startup_report["startup_ms"] = round((time.perf_counter() - started) * 1000, 1)
+    log.info("✅ Database ready in %sms (schema v%s, migrations applied: %s)",
+             startup_report['startup_ms'], startup_report['schema_version'],
+             startup_report['migrations_applied'] or 'none')
+    # Serve liveness right away; readiness waits for the indexes to be warm
+    warm_state["task"] = asyncio.ensure_future(_warm_up())
+    if METRICS_DIR:
+        os.makedirs(METRICS_DIR, exist_ok=True)
+        warm_state["metrics_task"] = asyncio.ensure_future(_publish_metrics())
+
+async def _publish_metrics():
+    """Write this worker's metrics snapshot every METRICS_FLUSH_SECONDS"""
+    loop = asyncio.get_running_loop()
+    while True:
+        try:
+            await loop.run_in_executor(None, write_snapshot, METRICS_DIR, REGISTRY.snapshot())
+        except OSError as e:
+            log.warning("⚠️  Metrics snapshot write failed: %s", e)
+        await asyncio.sleep(METRICS_FLUSH_SECONDS)
+
+async def _warm_up():
+    """Load indexes and the entity catalog before taking traffic"""
+    started = time.perf_counter()
+    try:
+        await car_service.warm_up()
+        await car_service.async_repo.run(ai_service.entity_extractor.refresh, asyncio.get_running_loop())
+        warm_state["warm"] = True
+        warm_state["error"] = None
+    except Exception as e:
+        warm_state["error"] = str(e)
+        log.error("❌ Warm-up failed: %s", e)
+    startup_report["warm_ms"] = round((time.perf_counter() - started) * 1000, 1)
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Release pooled connections on shutdown"""
+    if warm_state.get("metrics_task"):
+        warm_state["metrics_task"].cancel()
+    await ai_service.aclose()
+    car_service.close()
+    session_store.close()
+    response_cache.close()
+    close_all_pools()
 
 @app.get("/")
 async def serve_index():
@@ -45,7 +199,7 @@ async def serve_index():
     return FileResponse("static/index.html")
 
 @app.post("/chat", response_model=ChatResponse)
-async def chat_endpoint(message: ChatMessage) -> ChatResponse:
+async def chat_endpoint(message: ChatMessage) -> Response:
     """Main chat endpoint that processes user messages"""
     
     try:
@@ -57,117 +211,267 @@ async def chat_endpoint(message: ChatMessage) -> ChatResponse:
                 cars=[]
             )
         
-        print(f"👤 User: {user_message}")
+        log.info("👤 User: %s", user_message)
+        with STAGE_SECONDS.time(stage="session_load"):
+            session = await session_store.load(message.session_id)
+        
+        if ai_service.single_call:
+            with STAGE_SECONDS.time(stage="single_call"):
+                result = await ai_service.chat_single_call(
+                    user_message, lambda entities: car_service.search_cars(entities, user_message), session
+                )
+            cars = result["cars"]
+            log.info("🤖 Single call: intent=%s, entities=%s, cars=%d", result['intent'], result['entities'], len(cars))
+            with STAGE_SECONDS.time(stage="session_save"):
+                session.record(user_message, result["response"], cars)
+                await session_store.save(session)
+            with STAGE_SECONDS.time(stage="serialize"):
+                return _chat_json(result["response"], cars, session.id)
         
         # Process message with AI service
-        ai_result = await ai_service.process_query(user_message)
+        with STAGE_SECONDS.time(stage="intent"):
+            ai_result = await ai_service.process_query(user_message)
         intent = ai_result.get("intent", "general")
         entities = ai_result.get("entities", {})
         confidence = ai_result.get("confidence", 0.5)
         
-        print(f"🤖 AI Analysis: intent={intent}, entities={entities}, confidence={confidence}")
+        # Follow-ups inherit the filters gathered earlier in the conversation
+        intent, entities = session.resolve(intent, entities, user_message)
+        log.info("🤖 AI Analysis: intent=%s, entities=%s, confidence=%s", intent, entities, confidence)
         
         # Search for cars based on entities
+        # With semantic search on, vague requests without entities still search
         cars = []
-        if intent in ["search", "price_inquiry", "specs"] and entities:
-            cars = car_service.search_cars(entities)
-            print(f"🔍 Found {len(cars)} matching cars")
+        if intent in ["search", "price_inquiry", "specs"] and (entities or car_service.vector_index):
+            with STAGE_SECONDS.time(stage="search"):
+                cars = await car_service.search_cars(entities, user_message)
+            log.info("🔍 Found %d matching cars", len(cars))
         
         # Generate response using AI
-        ai_response = await ai_service.generate_response(intent, cars, user_message)
-        print(f"💬 AI Response: {ai_response[:100]}...")
+        with STAGE_SECONDS.time(stage="generate"):
+            ai_response = await ai_service.generate_response(intent, cars, user_message, session.context())
+        log.info("💬 AI Response: %.100s...", ai_response)
         
-        # Prepare car data for frontend
-        car_data = []
-        for car in cars[:5]:  # Limit to 5 cars for performance
-            car_data.append({
-                "id": car.id,
-                "make": car.make,
-                "model": car.model,
-                "year": car.year,
-                "price": car.price,
-                "body_type": car.body_type,
-                "fuel_type": car.fuel_type,
-                "transmission": car.transmission,
-                "mileage": car.mileage,
-                "description": car.description
-            })
-        
-        return ChatResponse(
-            response=ai_response,
-            cars=car_data
-        )
+        with STAGE_SECONDS.time(stage="session_save"):
+            session.record(user_message, ai_response, cars)
+            await session_store.save(session)
+        with STAGE_SECONDS.time(stage="serialize"):
+            return _chat_json(ai_response, cars, session.id)
         
     except Exception as e:
-        print(f"❌ Error in chat endpoint: {e}")
+        log.error("❌ Error in chat endpoint: %s", e)
         return ChatResponse(
             response="متاسفم، خطایی رخ داده. لطفاً دوباره تلاش کنید.",
             cars=[]
         )
 
+@app.post("/chat/stream")
+async def chat_stream_endpoint(message: ChatMessage) -> StreamingResponse:
+    """Streaming chat: car cards first, then the reply token by token (SSE)"""
+    
+    async def event_stream():
+        try:
+            user_message = message.message.strip()
+            
+            if not user_message:
+                yield _sse_event("cars", {"cars": []})
+                yield _sse_event("token", {"text": "لطفاً سوال خود را بپرسید."})
+                yield _sse_event("done", {})
+                return
+            
+            log.info("👤 User (stream): %s", user_message)
+            with STAGE_SECONDS.time(stage="session_load"):
+                session = await session_store.load(message.session_id)
+            
+            with STAGE_SECONDS.time(stage="intent"):
+                ai_result = await ai_service.process_query(user_message)
+            intent = ai_result.get("intent", "general")
+            entities = ai_result.get("entities", {})
+            intent, entities = session.resolve(intent, entities, user_message)
+            
+            cars = []
+            if intent in ["search", "price_inquiry", "specs"] and (entities or car_service.vector_index):
+                with STAGE_SECONDS.time(stage="search"):
+                    cars = await car_service.search_cars(entities, user_message)
+            
+            # Cards go out as soon as the search is done
+            yield _sse_event("cars", {"cars": _chat_car_payload(cars), "session_id": session.id})
+            
+            reply = []
+            started = time.perf_counter()
+            async for token in ai_service.stream_response(intent, cars, user_message, session.context()):
+                if not reply:
+                    STAGE_SECONDS.observe(time.perf_counter() - started, stage="first_token")
+                reply.append(token)
+                yield _sse_event("token", {"text": token})
+            STAGE_SECONDS.observe(time.perf_counter() - started, stage="generate_stream")
+            
+            with STAGE_SECONDS.time(stage="session_save"):
+                session.record(user_message, "".join(reply), cars)
+                await session_store.save(session)
+            yield _sse_event("done", {})
+            
+        except Exception as e:
+            log.error("❌ Error in chat stream: %s", e)
+            yield _sse_event("error", {"text": "متاسفم، خطایی رخ داده. لطفاً دوباره تلاش کنید."})
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @app.get("/cars")
-async def get_all_cars():
-    """Get all available cars"""
+async def get_all_cars(
+    request: Request,
+    limit: int = Query(50, ge=1, le=200),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    make: Optional[str] = None,
+    model: Optional[str] = None,
+    year: Optional[int] = None,
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None,
+    body_type: Optional[str] = None,
+    fuel_type: Optional[str] = None
+):
+    """List available cars one page at a time (keyset cursor, optional field projection)"""
+    filters = {
+        "make": make, "model": model, "year": year, "min_price": min_price,
+        "max_price": max_price, "body_type": body_type, "fuel_type": fuel_type
+    }
+    field_list = [f.strip() for f in fields.split(",") if f.strip()] if fields else None
+    
+    async def build():
+        return await car_service.list_cars(filters, field_list, limit, cursor)
+    
+    # Every distinct query string is its own cache entry
+    key = "cars?" + "&".join(sorted(f"{k}={v}" for k, v in request.query_params.multi_items()))
     try:
-        cars = car_service.get_all_cars()
-        return {"cars": [
-            {
-                "id": car.id,
-                "make": car.make,
-                "model": car.model,
-                "year": car.year,
-                "price": car.price,
-                "body_type": car.body_type,
-                "description": car.description
-            }
-            for car in cars
-        ]}
+        return await _cached_json(request, key, build)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
-        print(f"❌ Error getting cars: {e}")
+        log.error("❌ Error getting cars: %s", e)
         raise HTTPException(status_code=500, detail="خطا در دریافت اطلاعات خودروها")
 
+@app.get("/cars/costs")
+async def get_cars_costs(
+    request: Request,
+    ids: str = Query(..., description="Comma-separated car ids, e.g. one /cars page"),
+    state: str = "NSW"
+):
+    """On-road costs for many cars in one request"""
+    try:
+        car_ids = list(dict.fromkeys(int(i) for i in ids.split(",") if i.strip()))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="ids must be comma-separated integers")
+    if not car_ids or len(car_ids) > 200:
+        raise HTTPException(status_code=400, detail="Between 1 and 200 ids are allowed")
+    
+    async def build():
+        return await car_service.calculate_costs(car_ids, state)
+    
+    key = f"costs:{state.upper()}:{','.join(map(str, car_ids))}"
+    try:
+        return await _cached_json(request, key, build)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        log.error("❌ Error calculating costs: %s", e)
+        raise HTTPException(status_code=500, detail="خطا در محاسبه هزینه‌ها")
+
 @app.get("/cars/{car_id}")
-async def get_car_details(car_id: int):
+async def get_car_details(request: Request, car_id: int):
     """Get detailed information about a specific car"""
-    try:
-        car = car_service.get_car_by_id(car_id)
+    async def build():
+        car = await car_service.get_car_by_id(car_id)
         if not car:
             raise HTTPException(status_code=404, detail="خودرو پیدا نشد")
         
         # Calculate on-road costs
         costs = car_service.calculate_basic_costs(car.price)
         
-        return {
-            "car": {
-                "id": car.id,
-                "make": car.make,
-                "model": car.model,
-                "year": car.year,
-                "price": car.price,
-                "body_type": car.body_type,
-                "fuel_type": car.fuel_type,
-                "transmission": car.transmission,
-                "mileage": car.mileage,
-                "description": car.description
-            },
-            "costs": costs
-        }
+        return {"car": car.to_dict(CAR_FIELDS), "costs": costs}
+    
+    try:
+        return await _cached_json(request, f"car:{car_id}", build)
     except HTTPException:
         raise
     except Exception as e:
-        print(f"❌ Error getting car details: {e}")
+        log.error("❌ Error getting car details: %s", e)
         raise HTTPException(status_code=500, detail="خطا در دریافت جزئیات خودرو")
 
+@app.get("/health/live")
+async def liveness_check():
+    """The process is up and its event loop responds"""
+    return {"status": "alive"}
+
+@app.get("/health/ready")
+async def readiness_check():
+    """Whether this worker should receive traffic: 503 until the database answers and
+    the warm-up finished. The LLM breaker is reported but does not gate readiness:
+    every worker shares the same upstream, and chat falls back to rule-based parsing."""
+    checks = {"database": "ok", "warm": "ok"}
+    try:
+        await car_service.get_inventory_version()
+    except Exception as e:
+        checks["database"] = f"error: {e}"
+    if not warm_state["warm"]:
+        checks["warm"] = f"error: {warm_state['error']}" if warm_state["error"] else "warming"
+    ready = all(value == "ok" for value in checks.values())
+    llm = "circuit open" if ai_service.breaker.is_open() else "ok"
+    return JSONResponse(
+        status_code=200 if ready else 503,
+        content={"status": "ready" if ready else "not_ready", "checks": checks, "llm": llm}
+    )
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus text format: stage, query and LLM latency histograms, token and cache counters.
+    With shared state, every live worker's metrics merged (gauges get a worker label)."""
+    if METRICS_DIR:
+        own = REGISTRY.snapshot()
+        body = await asyncio.get_running_loop().run_in_executor(None, render_shared, METRICS_DIR, own)
+    else:
+        body = REGISTRY.render()
+    return Response(content=body, media_type="text/plain; version=0.0.4; charset=utf-8")
+
 @app.get("/health")
 async def health_check():
     """Health check endpoint"""
     return {
         "status": "healthy",
-        "ai_service": "connected" if ai_service.client else "limited",
-        "database": "active"
+        "ai_service": ai_service.status(),
+        "llm_resilience": ai_service.resilience_stats(),
+        "database": "active",
+        "intent_cache": ai_service.intent_cache.stats(),
+        "response_cache": response_cache.stats(),
+        "intent_parsing": ai_service.intent_stats(),
+        "token_usage": ai_service.token_usage(),
+        "sessions": session_store.stats(),
+        "startup": startup_report,
+        "coalescing": dict(ai_service.flight_stats(), search=car_service.search_flight.stats())
     }
 
 if __name__ == "__main__":
-    print("🌐 Starting server...")
-    print("📱 Open: http://localhost:8000")
-    uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Car Dealership MVP server")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Production mode with N worker processes (0 = one per CPU core); "
+                             "without it the server runs a single auto-reloading process")
+    args = parser.parse_args()
+    
+    if args.workers is None:
+        print("🌐 Starting server...")
+        print(f"📱 Open: http://localhost:{args.port}")
+        uvicorn.run("main:app", host=args.host, port=args.port, reload=True)
+    else:
+        workers = args.workers or os.cpu_count() or 1
+        # Workers share caches, sessions and inventory snapshots through this directory
+        os.environ.setdefault("SHARED_STATE_DIR", "shared_state")
+        print(f"🌐 Starting {workers} workers on port {args.port} "
+              f"(shared state in {os.environ['SHARED_STATE_DIR']})")
+        uvicorn.run("main:app", host=args.host, port=args.port, workers=workers,
+                    access_log=False, log_level="warning")
\ No newline at end of file
@@ -0,0 +1,59 @@
+# repositories/async_car_repository.py
+import os
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple, TypeVar
+from database.models import Car
+from repositories.car_repository import CarRepository
+
+T = TypeVar("T")
+
+# One thread per pooled connection, so offloaded queries never queue on the pool
+DB_THREADS = int(os.getenv('DB_THREADS', os.getenv('DB_POOL_SIZE', '8')))
+
+class AsyncCarRepository:
+    """CarRepository API that runs queries on a bounded thread pool instead of the event loop"""
+
+    def __init__(self, car_repo: Optional[CarRepository] = None, max_workers: int = DB_THREADS):
+        self.car_repo = car_repo or CarRepository()
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="db")
+
+    async def run(self, fn: Callable[..., T], *args, **kwargs) -> T:
+        """Run any blocking database call off the event loop"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, functools.partial(fn, *args, **kwargs))
+
+    async def get_all_cars(self) -> List[Car]:
+        return await self.run(self.car_repo.get_all_cars)
+
+    async def get_car_by_id(self, car_id: int) -> Optional[Car]:
+        return await self.run(self.car_repo.get_car_by_id, car_id)
+
+    async def get_catalog_terms(self) -> List[Tuple[str, str, str]]:
+        return await self.run(self.car_repo.get_catalog_terms)
+
+    async def list_cars(self, filters: Dict, fields: List[str], limit: int,
+                        after: Optional[Tuple] = None) -> Tuple[List[Dict], Optional[Tuple]]:
+        return await self.run(self.car_repo.list_cars, filters, fields, limit, after)
+
+    async def search_cars(self, filters: Dict) -> List[Car]:
+        return await self.run(self.car_repo.search_cars, filters)
+
+    async def search_ranked(self, filters: Dict, relaxed: Dict, search_text: str = "",
+                            limit: int = 10) -> List[Car]:
+        return await self.run(self.car_repo.search_ranked, filters, relaxed, search_text, limit)
+
+    async def search_by_text(self, search_text: str) -> List[Car]:
+        return await self.run(self.car_repo.search_by_text, search_text)
+
+    async def get_cars_by_price_range(self, min_price: float, max_price: float) -> List[Car]:
+        return await self.run(self.car_repo.get_cars_by_price_range, min_price, max_price)
+
+    async def get_similar_cars(self, car: Car, limit: int = 5) -> List[Car]:
+        return await self.run(self.car_repo.get_similar_cars, car, limit)
+
+    def close(self):
+        """Stop the worker threads and close the pooled connections"""
+        self.executor.shutdown(wait=True)
+        self.car_repo.close()
@@ -1,93 +1,363 @@
 # repositories/car_repository.py
-import sqlite3
-from typing import List, Optional, Dict
-from database.models import Car
+import os
+import re
+import logging
+from typing import List, Optional, Dict, Tuple
+from database.models import Car, car_row_factory
+from database.connection import DB_PATH, get_pool
+from services.text_utils import normalize_text
+from services.metrics import DB_QUERY_SECONDS
+
+log = logging.getLogger(__name__)
+
+# "sql" (default) or "memory" for the NumPy columnar index
+INVENTORY_ENGINE = os.getenv('INVENTORY_ENGINE', 'sql')
+
+# BM25 column weights for cars_fts: make, model, description
+FTS_WEIGHTS = "10.0, 5.0, 1.0"
+_WORD = re.compile(r"\w+")
+
+# Columns the /cars listing may project; the first four are its sort key
+LISTING_FIELDS = ("id", "make", "model", "year", "price", "body_type", "fuel_type",
+                  "transmission", "mileage", "description")
+
+def fts_query(search_text: str) -> str:
+    """FTS5 MATCH expression: any normalized word, prefix-matched (Persian suffixes).
+    Hyphenated names ("x-trail", "cx-5") become one phrase; prefix matching needs two
+    characters, and single letters are dropped ("x"* would match half the catalog)."""
+    terms = []
+    for chunk in normalize_text(search_text).split():
+        parts = _WORD.findall(chunk)
+        if len(parts) > 1:
+            terms.append(f'"{" ".join(parts)}"' + ("*" if len(parts[-1]) >= 2 else ""))
+        elif parts and len(parts[0]) >= 2:
+            terms.append(f'"{parts[0]}"*')
+        elif parts and parts[0].isdigit():
+            terms.append(f'"{parts[0]}"')  # model numbers such as Mazda "3"
+    return " OR ".join(terms)
 
 class CarRepository:
-    def __init__(self, db_path: str = "cars.db"):
+    def __init__(self, db_path: str = DB_PATH, engine: str = INVENTORY_ENGINE):
         self.db_path = db_path
+        self.pool = get_pool(db_path)
+        self.index = None
+        self._has_text_index = None
+        if engine == "memory":
+            try:
+                from repositories.inventory_index import InventoryIndex
+                self.index = InventoryIndex(self)
+            except ImportError as e:
+                log.warning(f"⚠️  In-memory inventory engine unavailable ({e}); using SQL")
     
     def _get_connection(self):
-        """Get database connection"""
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row  # Enable column access by name
-        return conn
+        """Borrow a pooled database connection (returned when the block exits)"""
+        return self.pool.connection()
     
-    def get_all_cars(self) -> List[Car]:
-        """Get all available cars"""
+    @property
+    def has_text_index(self) -> bool:
+        """Whether init_database managed to create the cars_fts index"""
+        if self._has_text_index is None:
+            with self._get_connection() as conn:
+                row = conn.execute(
+                    "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'cars_fts'"
+                ).fetchone()
+            self._has_text_index = row is not None
+        return self._has_text_index
+    
+    def _car_cursor(self, conn):
+        """Cursor whose rows come back as Car objects, skipping sqlite3.Row"""
+        cursor = conn.cursor()
+        cursor.row_factory = car_row_factory
+        return cursor
+    
+    def close(self):
+        """Close the pooled connections"""
+        self.pool.close()
+    
+    @DB_QUERY_SECONDS.timed(query="get_all_cars")
+    def get_all_cars(self, limit: Optional[int] = None) -> List[Car]:
+        """Get all available cars, or the first `limit` of them (walks idx_listing)"""
+        query = '''
+            SELECT * FROM cars 
+            WHERE available = 1 
+            ORDER BY make, model, -year, id
+        '''
+        params = []
+        if limit is not None:
+            query += " LIMIT ?"
+            params.append(limit)
         with self._get_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute('''
-                SELECT * FROM cars 
-                WHERE available = 1 
-                ORDER BY make, model, year DESC
-            ''')
-            rows = cursor.fetchall()
-            return [Car.from_db_row(row) for row in rows]
+            cursor = self._car_cursor(conn)
+            cursor.execute(query, params)
+            return cursor.fetchall()
     
+    @DB_QUERY_SECONDS.timed(query="get_car_by_id")
     def get_car_by_id(self, car_id: int) -> Optional[Car]:
         """Get car by ID"""
         with self._get_connection() as conn:
-            cursor = conn.cursor()
+            cursor = self._car_cursor(conn)
             cursor.execute('''
                 SELECT * FROM cars 
                 WHERE id = ? AND available = 1
             ''', (car_id,))
-            row = cursor.fetchone()
-            if row:
-                return Car.from_db_row(row)
-            return None
+            return cursor.fetchone()
     
-    def search_cars(self, filters: Dict) -> List[Car]:
-        """Search cars with filters"""
-        
-        query = "SELECT * FROM cars WHERE available = 1"
+    @DB_QUERY_SECONDS.timed(query="get_catalog_terms")
+    def get_catalog_terms(self) -> List[Tuple[str, str, str]]:
+        """Distinct (make, model, body_type) combinations in the inventory"""
+        with self._get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT DISTINCT make, model, body_type FROM cars
+                WHERE available = 1
+            ''')
+            return [tuple(row) for row in cursor.fetchall()]
+    
+    @DB_QUERY_SECONDS.timed(query="get_cars_by_ids")
+    def get_cars_by_ids(self, car_ids: List[int], filters: Optional[Dict] = None) -> List[Car]:
+        """Fetch available cars by primary key, keeping the given order
+        (and only those matching filters, when given)"""
+        if not car_ids:
+            return []
+        placeholders = ",".join("?" * len(car_ids))
+        conditions, params = self._filter_conditions(filters or {})
+        where = "".join(f" AND {condition}" for condition in conditions)
+        with self._get_connection() as conn:
+            cursor = self._car_cursor(conn)
+            cursor.execute(f'''
+                SELECT * FROM cars
+                WHERE available = 1 AND id IN ({placeholders}){where}
+            ''', list(car_ids) + params)
+            by_id = {car.id: car for car in cursor.fetchall()}
+        return [by_id[car_id] for car_id in car_ids if car_id in by_id]
+    
+    @DB_QUERY_SECONDS.timed(query="get_inventory_version")
+    def get_inventory_version(self) -> int:
+        """Counter bumped by triggers on every write to cars"""
+        with self._get_connection() as conn:
+            row = conn.execute(
+                "SELECT value FROM inventory_meta WHERE key = 'version'"
+            ).fetchone()
+            return row[0] if row else 0
+    
+    @DB_QUERY_SECONDS.timed(query="get_embedding_rows")
+    def get_embedding_rows(self) -> List[Tuple]:
+        """(id, make, model, body_type, fuel_type, description) of every available car"""
+        with self._get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT id, make, model, body_type, fuel_type, description
+                FROM cars
+                WHERE available = 1
+                ORDER BY id ASC
+            ''')
+            return cursor.fetchall()
+    
+    @DB_QUERY_SECONDS.timed(query="get_inventory_columns")
+    def get_inventory_columns(self) -> List[Tuple]:
+        """Filterable columns of every available car, cheapest first"""
+        with self._get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT id, make, model, year, price, body_type, fuel_type, mileage
+                FROM cars
+                WHERE available = 1
+                ORDER BY price ASC, id ASC
+            ''')
+            return cursor.fetchall()
+    
+    def _filter_conditions(self, filters: Dict) -> Tuple[List[str], List]:
+        """SQL conditions and parameters for the entity filters"""
+        conditions = []
         params = []
         
-        # Build dynamic query based on filters
         if filters.get('make'):
-            query += " AND LOWER(make) = LOWER(?)"
+            conditions.append("LOWER(make) = LOWER(?)")
             params.append(filters['make'])
         
         if filters.get('model'):
-            query += " AND LOWER(model) LIKE LOWER(?)"
+            conditions.append("LOWER(model) LIKE LOWER(?)")
             params.append(f"%{filters['model']}%")
         
         if filters.get('year'):
-            query += " AND year = ?"
+            conditions.append("year = ?")
             params.append(filters['year'])
         
         if filters.get('max_price'):
-            query += " AND price <= ?"
+            conditions.append("price <= ?")
             params.append(filters['max_price'])
         
         if filters.get('min_price'):
-            query += " AND price >= ?"
+            conditions.append("price >= ?")
             params.append(filters['min_price'])
         
         if filters.get('body_type'):
-            query += " AND LOWER(body_type) = LOWER(?)"
+            conditions.append("LOWER(body_type) = LOWER(?)")
             params.append(filters['body_type'])
         
         if filters.get('fuel_type'):
-            query += " AND LOWER(fuel_type) = LOWER(?)"
+            conditions.append("LOWER(fuel_type) = LOWER(?)")
             params.append(filters['fuel_type'])
         
+        return conditions, params
+    
+    @DB_QUERY_SECONDS.timed(query="search_cars")
+    def search_cars(self, filters: Dict) -> List[Car]:
+        """Search cars with filters"""
+        
+        if self.index is not None:
+            return self.get_cars_by_ids(self.index.search(filters))
+        
+        conditions, params = self._filter_conditions(filters)
+        query = "SELECT * FROM cars WHERE available = 1"
+        for condition in conditions:
+            query += f" AND {condition}"
+        
         # Add ordering
-        query += " ORDER BY price ASC LIMIT 10"
+        query += " ORDER BY price ASC, id ASC LIMIT 10"
+        
+        with self._get_connection() as conn:
+            cursor = self._car_cursor(conn)
+            cursor.execute(query, params)
+            return cursor.fetchall()
+    
+    @DB_QUERY_SECONDS.timed(query="list_cars")
+    def list_cars(self, filters: Dict, fields: List[str], limit: int,
+                  after: Optional[Tuple] = None) -> Tuple[List[Dict], Optional[Tuple]]:
+        """One page of the listing in get_all_cars order; returns (rows, sort key of the last row)"""
+        unknown = set(fields) - set(LISTING_FIELDS)
+        if unknown:
+            raise ValueError(f"Unknown fields: {', '.join(sorted(unknown))}")
+        # The sort key is always selected so the next page can start after it
+        columns = list(dict.fromkeys(["id", "make", "model", "year"] + list(fields)))
+        
+        conditions, params = self._filter_conditions(filters)
+        if after is not None:
+            # year is descending, so compare on -year to keep a single row-value seek
+            make, model, year, car_id = after
+            conditions.append("(make, model, -year, id) > (?, ?, ?, ?)")
+            params += [make, model, -year, car_id]
+        
+        query = f"SELECT {', '.join(columns)} FROM cars WHERE available = 1"
+        for condition in conditions:
+            query += f" AND {condition}"
+        query += " ORDER BY make, model, -year, id LIMIT ?"
+        params.append(limit + 1)
         
         with self._get_connection() as conn:
             cursor = conn.cursor()
             cursor.execute(query, params)
-            rows = cursor.fetchall()
-            return [Car.from_db_row(row) for row in rows]
+            rows = [dict(zip(columns, row)) for row in cursor.fetchall()]
+        
+        if len(rows) <= limit:
+            return rows, None
+        last = rows[limit - 1]
+        return rows[:limit], (last["make"], last["model"], last["year"], last["id"])
+    
+    @DB_QUERY_SECONDS.timed(query="search_ranked")
+    def search_ranked(self, filters: Dict, relaxed: Dict, search_text: str = "",
+                      limit: int = 10) -> List[Car]:
+        """One-pass relevance search: exact matches, else relaxed matches, else text matches"""
+        
+        if self.index is not None:
+            return self._search_ranked_in_memory(filters, relaxed, search_text, limit)
+        
+        exact_sql, exact_params = self._filter_conditions(filters)
+        relaxed_sql, relaxed_params = self._filter_conditions(relaxed)
+        exact_expr = " AND ".join(exact_sql) or "1"
+        relaxed_expr = " AND ".join(relaxed_sql) or "1"
+        
+        # Text tier: BM25 over cars_fts when present, else the substring scan
+        match = fts_query(search_text) if search_text else ""
+        if match and self.has_text_index:
+            text_source = f'''cars JOIN (
+                    SELECT rowid AS fts_id, bm25(cars_fts, {FTS_WEIGHTS}) AS text_rank
+                    FROM cars_fts WHERE cars_fts MATCH ?
+                ) AS fts ON cars.id = fts.fts_id'''
+            text_rank, text_expr = "fts.text_rank", "1"
+            text_params = [match]
+        elif search_text:
+            pattern = f"%{search_text.lower()}%"
+            text_source = "cars"
+            text_rank = "CASE WHEN LOWER(make) LIKE ? THEN 1 WHEN LOWER(model) LIKE ? THEN 2 ELSE 3 END"
+            text_expr = "(LOWER(make) LIKE ? OR LOWER(model) LIKE ? OR LOWER(description) LIKE ?)"
+            text_params = [pattern] * 5
+        else:
+            text_source, text_rank, text_expr, text_params = "cars", "0", "0", []
+        
+        # One statement, three tiers (score 3 = exact, 2 = relaxed, 1 = text only),
+        # returning only the best tier that matched anything. Each tier walks cars
+        # in price order and stops after `limit` rows, and a tier only runs when
+        # every tier above it came up empty.
+        query = f'''
+            WITH exact AS (
+                SELECT cars.*, 3 AS score, 0 AS text_rank FROM cars
+                WHERE available = 1 AND {exact_expr}
+                ORDER BY price ASC, id ASC LIMIT ?
+            ),
+            relaxed AS (
+                SELECT cars.*, 2 AS score, 0 AS text_rank FROM cars
+                WHERE NOT EXISTS (SELECT 1 FROM exact)
+                  AND available = 1 AND {relaxed_expr}
+                ORDER BY price ASC, id ASC LIMIT ?
+            ),
+            text AS (
+                SELECT cars.*, 1 AS score, {text_rank} AS text_rank
+                FROM {text_source}
+                WHERE NOT EXISTS (SELECT 1 FROM exact) AND NOT EXISTS (SELECT 1 FROM relaxed)
+                  AND available = 1 AND {text_expr}
+                ORDER BY text_rank ASC, price ASC, id ASC LIMIT ?
+            )
+            SELECT * FROM exact
+            UNION ALL SELECT * FROM relaxed
+            UNION ALL SELECT * FROM text
+            ORDER BY score DESC, text_rank ASC, price ASC, id ASC
+        '''
+        params = exact_params + [limit] + relaxed_params + [limit] + text_params + [limit]
+        
+        with self._get_connection() as conn:
+            cursor = self._car_cursor(conn)
+            cursor.execute(query, params)
+            return cursor.fetchall()
+    
+    def _search_ranked_in_memory(self, filters: Dict, relaxed: Dict, search_text: str,
+                                 limit: int) -> List[Car]:
+        """Exact and relaxed tiers from the column index; SQL only for the text tier"""
+        for tier in (filters, relaxed):
+            cars = self.get_cars_by_ids(self.index.search(tier, limit))
+            if cars:
+                return cars
+        return self.search_by_text(search_text, limit) if search_text else []
+    
+    @DB_QUERY_SECONDS.timed(query="search_by_text")
+    def search_by_text(self, search_text: str, limit: int = 10) -> List[Car]:
+        """Full-text search across make, model, description ranked by BM25"""
+        
+        if not self.has_text_index:
+            return self._search_by_like(search_text, limit)
+        
+        match = fts_query(search_text)
+        if not match:
+            return []
+        
+        with self._get_connection() as conn:
+            cursor = self._car_cursor(conn)
+            cursor.execute(f'''
+                SELECT cars.* FROM cars_fts
+                JOIN cars ON cars.id = cars_fts.rowid
+                WHERE cars_fts MATCH ? AND cars.available = 1
+                ORDER BY bm25(cars_fts, {FTS_WEIGHTS}), cars.price ASC, cars.id ASC
+                LIMIT ?
+            ''', (match, limit))
+            
+            return cursor.fetchall()
     
-    def search_by_text(self, search_text: str) -> List[Car]:
-        """Simple text search across make, model, description"""
+    def _search_by_like(self, search_text: str, limit: int) -> List[Car]:
+        """Substring scan for databases without cars_fts"""
         search_text = f"%{search_text.lower()}%"
         
         with self._get_connection() as conn:
-            cursor = conn.cursor()
+            cursor = self._car_cursor(conn)
             cursor.execute('''
                 SELECT * FROM cars 
                 WHERE available = 1 
@@ -102,17 +372,17 @@ class CarRepository:
                     WHEN LOWER(model) LIKE ? THEN 2  
                     ELSE 3
                   END,
-                  price ASC
-                LIMIT 10
-            ''', (search_text, search_text, search_text, search_text, search_text))
+                  price ASC, id ASC
+                LIMIT ?
+            ''', (search_text, search_text, search_text, search_text, search_text, limit))
             
-            rows = cursor.fetchall()
-            return [Car.from_db_row(row) for row in rows]
+            return cursor.fetchall()
     
+    @DB_QUERY_SECONDS.timed(query="get_cars_by_price_range")
     def get_cars_by_price_range(self, min_price: float, max_price: float) -> List[Car]:
         """Get cars in price range"""
         with self._get_connection() as conn:
-            cursor = conn.cursor()
+            cursor = self._car_cursor(conn)
             cursor.execute('''
                 SELECT * FROM cars 
                 WHERE available = 1 
@@ -121,9 +391,9 @@ class CarRepository:
                 LIMIT 15
             ''', (min_price, max_price))
             
-            rows = cursor.fetchall()
-            return [Car.from_db_row(row) for row in rows]
+            return cursor.fetchall()
     
+    @DB_QUERY_SECONDS.timed(query="get_similar_cars")
     def get_similar_cars(self, car: Car, limit: int = 5) -> List[Car]:
         """Get similar cars based on make and price range"""
         price_range = car.price * 0.3  # 30% price tolerance
@@ -131,7 +401,7 @@ class CarRepository:
         max_price = car.price + price_range
         
         with self._get_connection() as conn:
-            cursor = conn.cursor()
+            cursor = self._car_cursor(conn)
             cursor.execute('''
                 SELECT * FROM cars 
                 WHERE available = 1 
@@ -148,5 +418,4 @@ class CarRepository:
             ''', (car.id, car.make, car.body_type, min_price, max_price, 
                   car.make, car.price, limit))
             
-            rows = cursor.fetchall()
-            return [Car.from_db_row(row) for row in rows]
\ No newline at end of file
+            return cursor.fetchall()
\ No newline at end of file
@@ -0,0 +1,198 @@
+# repositories/inventory_index.py
+import os
+import json
+import shutil
+import threading
+import logging
+from typing import Callable, Dict, List, Optional, Tuple
+import numpy as np
+from services.shared_state import shared_state_path
+
+log = logging.getLogger(__name__)
+
+# Rows evaluated per vectorized step; small enough to stop early on common filters
+CHUNK_SIZE = 65536
+
+class _Snapshot:
+    """Column arrays for one inventory version, ordered by (price, id)"""
+
+    def __init__(self, rows, version: int):
+        self.version = version
+        ids, makes, models, years, prices, bodies, fuels, mileages = (
+            zip(*rows) if rows else ([],) * 8
+        )
+        self.ids = np.fromiter(ids, dtype=np.int64, count=len(ids))
+        self.prices = np.fromiter(prices, dtype=np.float64, count=len(prices))
+        self.years = np.fromiter(years, dtype=np.int32, count=len(years))
+        self.mileages = np.fromiter((m or 0 for m in mileages), dtype=np.int64, count=len(mileages))
+
+        # Dictionary-encoded text columns (case-insensitive, like the SQL LOWER() filters)
+        self.make_codes, self.make_dict, _ = self._encode(makes)
+        self.model_codes, self.model_dict, self.model_values = self._encode(models)
+        self.body_codes, self.body_dict, _ = self._encode(bodies)
+        self.fuel_codes, self.fuel_dict, _ = self._encode(fuels)
+
+    @staticmethod
+    def _encode(values):
+        dictionary: Dict[str, int] = {}
+        codes = np.fromiter(
+            (dictionary.setdefault((v or "").lower(), len(dictionary)) for v in values),
+            dtype=np.int32, count=len(values)
+        )
+        return codes, dictionary, list(dictionary)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    _ARRAYS = ("ids", "prices", "years", "mileages", "make_codes", "model_codes", "body_codes", "fuel_codes")
+    _DICTS = ("make_dict", "model_dict", "body_dict", "fuel_dict")
+
+    def save(self, path: str):
+        """Write the columns under path (atomically: readers never see a partial snapshot)"""
+        tmp = f"{path}.tmp{os.getpid()}"
+        os.makedirs(tmp, exist_ok=True)
+        for name in self._ARRAYS:
+            np.save(os.path.join(tmp, f"{name}.npy"), getattr(self, name))
+        with open(os.path.join(tmp, "dicts.json"), "w") as f:
+            json.dump({name: getattr(self, name) for name in self._DICTS}, f, ensure_ascii=False)
+        try:
+            os.rename(tmp, path)
+        except OSError:
+            shutil.rmtree(tmp, ignore_errors=True)  # another worker saved this version first
+
+    @classmethod
+    def load(cls, path: str, version: int) -> "_Snapshot":
+        """Memory-map a saved snapshot; every worker shares the same pages"""
+        snap = cls.__new__(cls)
+        snap.version = version
+        for name in cls._ARRAYS:
+            setattr(snap, name, np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r"))
+        with open(os.path.join(path, "dicts.json")) as f:
+            dicts = json.load(f)
+        for name in cls._DICTS:
+            setattr(snap, name, dicts[name])
+        snap.model_values = list(snap.model_dict)  # JSON keeps the code order
+        return snap
+
+class InventoryIndex:
+    """In-memory columnar copy of the available inventory with vectorized filters"""
+
+    def __init__(self, car_repo, snapshot_dir: Optional[str] = None):
+        self.car_repo = car_repo
+        # With SHARED_STATE_DIR set, one worker builds each version and the rest map it
+        self.snapshot_dir = snapshot_dir or shared_state_path("inventory")
+        self._snapshot: Optional[_Snapshot] = None
+        self._lock = threading.Lock()
+
+    def refresh(self, force: bool = False) -> _Snapshot:
+        """Reload the columns if the inventory version moved"""
+        version = self.car_repo.get_inventory_version()
+        snapshot = self._snapshot
+        if snapshot is not None and snapshot.version == version and not force:
+            return snapshot
+        with self._lock:
+            # Another thread may have reloaded while we waited
+            if self._snapshot is not None and self._snapshot.version == version and not force:
+                return self._snapshot
+            snapshot = self._load_shared(version) if self.snapshot_dir else None
+            if snapshot is None:
+                snapshot = _Snapshot(self.car_repo.get_inventory_columns(), version)
+                if self.snapshot_dir:
+                    self._save_shared(snapshot)
+            self._snapshot = snapshot
+            log.info(f"📦 Inventory index loaded: {len(snapshot)} cars (version {version})")
+            return snapshot
+
+    def _load_shared(self, version: int) -> Optional[_Snapshot]:
+        path = os.path.join(self.snapshot_dir, f"v{version}")
+        if not os.path.isdir(path):
+            return None
+        try:
+            return _Snapshot.load(path, version)
+        except (OSError, ValueError, KeyError) as e:
+            log.warning(f"⚠️  Shared inventory snapshot unreadable ({e}); rebuilding")
+            return None
+
+    def _save_shared(self, snapshot: _Snapshot):
+        try:
+            os.makedirs(self.snapshot_dir, exist_ok=True)
+            snapshot.save(os.path.join(self.snapshot_dir, f"v{snapshot.version}"))
+            # Older versions are never loaded again (open maps stay valid after unlink)
+            for name in os.listdir(self.snapshot_dir):
+                if name.startswith("v") and name != f"v{snapshot.version}" and ".tmp" not in name:
+                    shutil.rmtree(os.path.join(self.snapshot_dir, name), ignore_errors=True)
+        except OSError as e:
+            log.warning(f"⚠️  Could not share inventory snapshot: {e}")
+
+    def search(self, filters: Dict, limit: int = 10) -> List[int]:
+        """Car ids matching the same filters as CarRepository.search_cars, cheapest first"""
+        snap = self.refresh()
+        start, stop = self.price_range(snap, filters)
+        conditions = self.conditions(snap, filters)
+        if conditions is None:
+            return []
+        if not conditions:
+            return snap.ids[start:min(stop, start + limit)].tolist()
+
+        # Rows are price-ordered, so scan in chunks and stop once we have enough hits
+        hits: List[np.ndarray] = []
+        found = 0
+        for chunk_start in range(start, stop, CHUNK_SIZE):
+            chunk_stop = min(chunk_start + CHUNK_SIZE, stop)
+            mask = conditions[0](chunk_start, chunk_stop)
+            for condition in conditions[1:]:
+                mask &= condition(chunk_start, chunk_stop)
+            positions = np.flatnonzero(mask)
+            if len(positions):
+                hits.append(positions[:limit - found] + chunk_start)
+                found += len(hits[-1])
+                if found >= limit:
+                    break
+        if not hits:
+            return []
+        return snap.ids[np.concatenate(hits)].tolist()
+
+    @staticmethod
+    def price_range(snap: _Snapshot, filters: Dict) -> Tuple[int, int]:
+        """Row range satisfying min_price/max_price, found by binary search"""
+        start, stop = 0, len(snap)
+        if filters.get('min_price'):
+            start = int(np.searchsorted(snap.prices, float(filters['min_price']), side='left'))
+        if filters.get('max_price'):
+            stop = int(np.searchsorted(snap.prices, float(filters['max_price']), side='right'))
+        return start, max(start, stop)
+
+    @staticmethod
+    def conditions(snap: _Snapshot, filters: Dict) -> Optional[List[Callable[[int, int], np.ndarray]]]:
+        """Vectorized per-slice conditions for the non-price filters; None when nothing can match"""
+        conditions = []
+
+        def equals(column: np.ndarray, value):
+            return lambda lo, hi: column[lo:hi] == value
+
+        for key, codes, dictionary in (
+            ('make', snap.make_codes, snap.make_dict),
+            ('body_type', snap.body_codes, snap.body_dict),
+            ('fuel_type', snap.fuel_codes, snap.fuel_dict),
+        ):
+            if filters.get(key):
+                code = dictionary.get(str(filters[key]).lower())
+                if code is None:
+                    return None
+                conditions.append(equals(codes, code))
+
+        if filters.get('model'):
+            # LIKE '%model%' on the (few) distinct models, then a code lookup
+            needle = str(filters['model']).lower()
+            model_codes = [code for code, value in enumerate(snap.model_values) if needle in value]
+            if not model_codes:
+                return None
+            if len(model_codes) == 1:
+                conditions.append(equals(snap.model_codes, model_codes[0]))
+            else:
+                conditions.append(lambda lo, hi: np.isin(snap.model_codes[lo:hi], model_codes))
+
+        if filters.get('year'):
+            conditions.append(equals(snap.years, int(filters['year'])))
+
+        return conditions
@@ -0,0 +1,305 @@
+# repositories/vector_index.py - Embedding index over the inventory for semantic search
+#
+# Build offline (no web app needed):
+#   python -m repositories.vector_index --db cars.db
+import os
+import glob
+import json
+import time
+import uuid
+import zlib
+import argparse
+import threading
+import logging
+from typing import Dict, List, Optional, Sequence, Tuple
+import numpy as np
+
+from database.migrations import file_lock
+from services.text_utils import normalize_text
+from services.entity_extractor import BODY_TYPE_ALIASES, FUEL_TYPE_ALIASES
+
+log = logging.getLogger(__name__)
+
+# "hashing" (default, no model download) or "sentence-transformers"
+EMBEDDING_ENCODER = os.getenv('EMBEDDING_ENCODER', 'hashing')
+EMBEDDING_MODEL = os.getenv('EMBEDDING_MODEL', 'paraphrase-multilingual-MiniLM-L12-v2')
+# Above this many cars, search probes IVF clusters instead of scanning every row
+IVF_MIN_ROWS = int(os.getenv('VECTOR_IVF_MIN_ROWS', '200000'))
+IVF_PROBES = int(os.getenv('VECTOR_IVF_PROBES', '8'))
+# Minimum seconds between background rebuilds after inventory changes
+REBUILD_INTERVAL = float(os.getenv('VECTOR_REBUILD_INTERVAL', '60'))
+
+class HashingEncoder:
+    """Signed feature hashing of words and character trigrams; runs offline and
+    still matches Persian words with different suffixes (خانواده / خانوادگی)"""
+
+    name = "hashing"
+
+    def __init__(self, dim: int = 512):
+        self.dim = dim
+
+    def _features(self, text: str) -> List[str]:
+        words = normalize_text(text).split()
+        features = [f"w:{w}" for w in words]
+        for word in words:
+            padded = f"<{word}>"
+            features += [f"c:{padded[i:i + 3]}" for i in range(len(padded) - 2)]
+        return features
+
+    def encode(self, texts: Sequence[str]) -> np.ndarray:
+        matrix = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for feature in self._features(text):
+                h = zlib.crc32(feature.encode("utf-8"))
+                # Whole words weigh more than single trigrams
+                weight = 2.0 if feature[0] == "w" else 1.0
+                matrix[row, h % self.dim] += weight if h & 0x80000000 else -weight
+        return _normalize(matrix)
+
+class SentenceTransformerEncoder:
+    """Local multilingual sentence-transformers model (optional dependency)"""
+
+    name = "sentence-transformers"
+
+    def __init__(self, model_name: str = EMBEDDING_MODEL):
+        from sentence_transformers import SentenceTransformer
+        self.model = SentenceTransformer(model_name)
+        self.name = f"sentence-transformers:{model_name}"
+        self.dim = self.model.get_sentence_embedding_dimension()
+
+    def encode(self, texts: Sequence[str]) -> np.ndarray:
+        vectors = self.model.encode(list(texts), batch_size=256, convert_to_numpy=True)
+        return _normalize(vectors.astype(np.float32))
+
+def get_encoder(kind: str = EMBEDDING_ENCODER):
+    """Encoder named by EMBEDDING_ENCODER, falling back to hashing"""
+    if kind == "sentence-transformers":
+        try:
+            return SentenceTransformerEncoder()
+        except Exception as e:  # not installed, or the model isn't available offline
+            log.warning(f"⚠️  sentence-transformers encoder unavailable ({e}); using hashing")
+    return HashingEncoder()
+
+def _normalize(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1
+    return matrix / norms
+
+# Persian names of each body and fuel type, embedded with the car so they match offline
+_ALIASES: Dict[str, List[str]] = {}
+for _alias, _value in list(BODY_TYPE_ALIASES.items()) + list(FUEL_TYPE_ALIASES.items()):
+    _ALIASES.setdefault(_value.lower(), []).append(_alias)
+
+def car_text(make: str, model: str, body_type: str, fuel_type: str, description: str) -> str:
+    """What gets embedded for one car"""
+    parts = [make, model, body_type, fuel_type, description]
+    for value in (body_type, fuel_type):
+        parts += _ALIASES.get((value or "").lower(), [])
+    return " ".join(part for part in parts if part)
+
+def _kmeans(vectors: np.ndarray, clusters: int, iterations: int = 10, seed: int = 0) -> np.ndarray:
+    """Spherical k-means centroids from a sample of the rows"""
+    rnd = np.random.default_rng(seed)
+    sample = vectors[rnd.choice(len(vectors), min(len(vectors), clusters * 64), replace=False)]
+    centroids = sample[rnd.choice(len(sample), clusters, replace=False)].copy()
+    for _ in range(iterations):
+        assign = np.argmax(sample @ centroids.T, axis=1)
+        for c in range(clusters):
+            members = sample[assign == c]
+            if len(members):
+                centroids[c] = members.sum(axis=0)
+        centroids = _normalize(centroids)
+    return centroids
+
+def _read_meta(path: str) -> Optional[Dict]:
+    try:
+        with open(f"{path}.json") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def _prune(path: str, keep: str):
+    """Delete earlier builds. Processes still mapping them keep reading the unlinked
+    inode; only new loads see the published build."""
+    keep_prefix = f"{path}.{keep}."
+    for name in glob.glob(f"{glob.escape(path)}.*.npy") + [f"{path}.npy"]:
+        if not name.startswith(keep_prefix) and os.path.exists(name):
+            try:
+                os.remove(name)
+            except OSError:
+                pass  # e.g. still open on Windows; removed by a later build
+
+def build_vector_index(car_repo, path: str, encoder=None, batch_size: int = 8192) -> Dict:
+    """Embed every available car and publish the matrix, ids and metadata next to path.
+    Each build writes fresh files and then atomically replaces {path}.json, which names
+    them, so no file that another search or worker has mapped is ever rewritten.
+    Callers that may run concurrently hold file_lock(f"{path}.lock")."""
+    encoder = encoder or get_encoder()
+    version = car_repo.get_inventory_version()
+    rows = car_repo.get_embedding_rows()
+    ids = np.fromiter((row[0] for row in rows), dtype=np.int64, count=len(rows))
+    token = f"{version}-{uuid.uuid4().hex[:8]}"
+    prefix = f"{path}.{token}"
+
+    matrix = np.lib.format.open_memmap(f"{prefix}.npy", mode="w+", dtype=np.float32,
+                                       shape=(len(rows), encoder.dim))
+    for start in range(0, len(rows), batch_size):
+        batch = rows[start:start + batch_size]
+        matrix[start:start + len(batch)] = encoder.encode([car_text(*row[1:]) for row in batch])
+
+    meta = {"encoder": encoder.name, "dim": encoder.dim, "version": version, "rows": len(rows),
+            "files": token}
+    if len(rows) >= IVF_MIN_ROWS:
+        # IVF: rows sorted by nearest centroid, so each cluster is one contiguous slice
+        clusters = int(np.sqrt(len(rows)))
+        centroids = _kmeans(np.asarray(matrix), clusters)
+        assign = np.concatenate([
+            np.argmax(matrix[s:s + batch_size] @ centroids.T, axis=1)
+            for s in range(0, len(rows), batch_size)
+        ])
+        order = np.argsort(assign, kind="stable")
+        matrix[:] = matrix[order]
+        ids = ids[order]
+        np.save(f"{prefix}.centroids.npy", centroids)
+        np.save(f"{prefix}.offsets.npy", np.searchsorted(assign[order], np.arange(clusters + 1)))
+        meta["clusters"] = clusters
+    matrix.flush()
+    del matrix
+    np.save(f"{prefix}.ids.npy", ids)
+    with open(f"{prefix}.json.tmp", "w") as f:
+        json.dump(meta, f)
+    os.replace(f"{prefix}.json.tmp", f"{path}.json")
+    _prune(path, keep=token)
+    return meta
+
+class VectorIndex:
+    """Memory-mapped float32 embedding matrix with top-k cosine search.
+    When the inventory changes, searches keep using the loaded index while a
+    background thread rebuilds it (at most every VECTOR_REBUILD_INTERVAL seconds)."""
+
+    def __init__(self, car_repo, path: Optional[str] = None, encoder=None):
+        self.car_repo = car_repo
+        self.path = path or os.getenv('VECTOR_INDEX_PATH', f"{car_repo.db_path}.vectors")
+        self.encoder = encoder or get_encoder()
+        self._lock = threading.Lock()
+        self._loaded: Optional[Tuple] = None
+        self._refreshing = False
+        self._refreshed_at = 0.0
+
+    def _usable(self, meta: Optional[Dict], version: Optional[int] = None) -> bool:
+        return bool(meta) and "files" in meta and meta["encoder"] == self.encoder.name and (
+            version is None or meta["version"] == version)
+
+    def _open(self, meta: Dict) -> Tuple:
+        """(matrix, ids, centroids, offsets, version) of a published build"""
+        prefix = f"{self.path}.{meta['files']}"
+        matrix = np.load(f"{prefix}.npy", mmap_mode="r")
+        ids = np.load(f"{prefix}.ids.npy")
+        centroids = offsets = None
+        if meta.get("clusters"):
+            centroids = np.load(f"{prefix}.centroids.npy")
+            offsets = np.load(f"{prefix}.offsets.npy")
+        return (matrix, ids, centroids, offsets, meta["version"])
+
+    def _load_version(self, version: int) -> Tuple:
+        """The published index for version, built first if no worker has built it yet"""
+        meta = _read_meta(self.path)
+        if self._usable(meta, version):
+            try:
+                return self._open(meta)
+            except FileNotFoundError:
+                pass  # superseded and pruned by a newer build meanwhile
+        # One builder across worker processes; the others wait and load its result
+        with file_lock(f"{self.path}.lock"):
+            meta = _read_meta(self.path)
+            if not self._usable(meta, version):
+                meta = build_vector_index(self.car_repo, self.path, self.encoder)
+                log.info(f"🧭 Vector index built: {meta['rows']} cars ({meta['encoder']})")
+            return self._open(meta)
+
+    def warm_up(self):
+        """Load (or build) the index for the current inventory now"""
+        loaded = self._load_version(self.car_repo.get_inventory_version())
+        with self._lock:
+            self._loaded = loaded
+            self._refreshed_at = time.monotonic()
+
+    def _refresh(self, version: int):
+        try:
+            loaded = self._load_version(version)
+            with self._lock:
+                self._loaded = loaded
+        except Exception as e:
+            log.warning(f"⚠️  Vector index rebuild failed: {e}")
+        finally:
+            with self._lock:
+                self._refreshing = False
+                self._refreshed_at = time.monotonic()
+
+    def _current(self) -> Optional[Tuple]:
+        """The loaded index, scheduling a background rebuild when the inventory moved on"""
+        loaded = self._loaded
+        version = self.car_repo.get_inventory_version()
+        if loaded is not None and loaded[4] == version:
+            return loaded
+        with self._lock:
+            start = not self._refreshing and (
+                self._loaded is None or time.monotonic() - self._refreshed_at >= REBUILD_INTERVAL)
+            if start:
+                self._refreshing = True
+        if start:
+            threading.Thread(target=self._refresh, args=(version,), name="vector-index", daemon=True).start()
+        if loaded is None:
+            # Until the rebuild lands, any published build beats no semantic results
+            meta = _read_meta(self.path)
+            if self._usable(meta):
+                try:
+                    loaded = self._open(meta)
+                except FileNotFoundError:
+                    return None
+                with self._lock:
+                    if self._loaded is None:
+                        self._loaded = loaded
+        return loaded
+
+    def search(self, text: str, k: int = 20) -> List[Tuple[int, float]]:
+        """(car id, cosine similarity) of the k cars closest to text, best first"""
+        loaded = self._current()
+        if loaded is None or not text.strip():
+            return []
+        matrix, ids, centroids, offsets, _ = loaded
+        if not len(ids):
+            return []
+        query = self.encoder.encode([text])[0]
+
+        if centroids is None:
+            rows = np.arange(len(ids))
+            scores = matrix @ query
+        else:
+            probes = np.argsort(centroids @ query)[::-1][:IVF_PROBES]
+            rows = np.concatenate([np.arange(offsets[c], offsets[c + 1]) for c in probes])
+            scores = matrix[rows] @ query
+
+        k = min(k, len(rows))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(int(ids[rows[i]]), float(scores[i])) for i in top if scores[i] > 0]
+
+def main():
+    from repositories.car_repository import CarRepository
+
+    parser = argparse.ArgumentParser(description="Build the semantic search index")
+    parser.add_argument("--db", default="cars.db")
+    parser.add_argument("--out", default=None, help="Index path prefix (default: <db>.vectors)")
+    parser.add_argument("--encoder", default=EMBEDDING_ENCODER)
+    args = parser.parse_args()
+
+    car_repo = CarRepository(args.db)
+    path = args.out or f"{args.db}.vectors"
+    with file_lock(f"{path}.lock"):
+        meta = build_vector_index(car_repo, path, get_encoder(args.encoder))
+    print(f"✅ Indexed {meta['rows']:,} cars with {meta['encoder']} ({meta['dim']} dims)")
+    car_repo.close()
+
+if __name__ == "__main__":
+    main()
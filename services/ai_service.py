@@ -1,9 +1,40 @@
 # services/ai_service.py - Azure OpenAI Version
 import os
 import json
-import re
-from typing import Dict, List
-from openai import AzureOpenAI
+import time
+import asyncio
+import logging
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional
+import httpx
+from openai import AsyncAzureOpenAI, APIConnectionError, APIStatusError, APITimeoutError
+from services.query_cache import QueryCache
+from services.entity_extractor import EntityExtractor, SEARCH_INTENTS
+from services.text_utils import normalize_message
+from services.single_flight import SingleFlight
+from services.metrics import LLM_CALL_SECONDS, LLM_TOKENS
+from services.resilience import (AdaptiveLimiter, CircuitBreaker, CircuitOpenError, SlotTimeoutError,
+                                 retry_within_deadline)
+from services.prompt_builder import (
+    SEARCH_CARS_TOOL, intent_messages, response_messages, tool_messages, tool_result
+)
+
+log = logging.getLogger(__name__)
+
+def _context_key(context: Optional[Dict]) -> str:
+    """Conversation context as part of a coalescing key"""
+    return json.dumps(context, sort_keys=True, ensure_ascii=False) if context else ""
+
+def _field(value, name: str):
+    """Attribute or key: openai 1.3 leaves the usage of a stream's final chunk a plain dict"""
+    if isinstance(value, dict):
+        return value.get(name)
+    return getattr(value, name, None)
+
+def _is_overload(e: Exception) -> bool:
+    """Throttling, timeouts and server errors: worth a retry, and count against the breaker"""
+    if isinstance(e, (APITimeoutError, APIConnectionError, asyncio.TimeoutError, httpx.TransportError)):
+        return True
+    return isinstance(e, APIStatusError) and (e.status_code == 429 or e.status_code >= 500)
 
 class AIService:
     def __init__(self):
@@ -13,60 +44,207 @@ class AIService:
         self.api_version = os.getenv('AZURE_OPENAI_API_VERSION', '2024-12-01-preview')
         self.deployment_name = os.getenv('AZURE_DEPLOYMENT_NAME', 'gpt-4.1')
         
+        # Connection pool / concurrency settings
+        self.request_timeout = float(os.getenv('AZURE_OPENAI_TIMEOUT', '30'))
+        self.max_connections = int(os.getenv('AZURE_OPENAI_MAX_CONNECTIONS', '100'))
+        self.max_keepalive = int(os.getenv('AZURE_OPENAI_MAX_KEEPALIVE', '20'))
+        self.max_concurrency = int(os.getenv('AZURE_OPENAI_MAX_CONCURRENCY', '64'))
+        
+        # Resilience: total time budget per call (retries included), breaker and AIMD limiter
+        self.call_deadline = float(os.getenv('AZURE_OPENAI_DEADLINE', '10'))
+        self.max_attempts = int(os.getenv('AZURE_OPENAI_MAX_ATTEMPTS', '2'))
+        self.breaker = CircuitBreaker(
+            failure_threshold=int(os.getenv('AZURE_OPENAI_BREAKER_FAILURES', '5')),
+            reset_timeout=float(os.getenv('AZURE_OPENAI_BREAKER_RESET', '15'))
+        )
+        self.limiter = AdaptiveLimiter(
+            max_limit=self.max_concurrency,
+            target_latency=float(os.getenv('AZURE_OPENAI_TARGET_LATENCY', '5'))
+        )
+        self._http_client: Optional[httpx.AsyncClient] = None
+        
+        # Cache of intent/entity extraction keyed by the normalized message
+        self.intent_cache = QueryCache.from_env()
+        
+        # Rule-based fast path: skip the LLM when the extractor is confident enough
+        self.entity_extractor = EntityExtractor()
+        self.fast_path_threshold = float(os.getenv('AI_FAST_PATH_THRESHOLD', '0.85'))
+        self.parse_stats = {"requests": 0, "fast_path": 0, "cache_hits": 0, "llm_calls": 0}
+        
+        # Token usage per call kind ("intent", "response", "stream"), from the API's usage field
+        self.token_stats: Dict[str, Dict[str, int]] = {}
+        self.stream_usage = os.getenv('AZURE_OPENAI_STREAM_USAGE', '1') == '1'
+        
+        # Identical messages in flight at the same time share one LLM call
+        self.intent_flight = SingleFlight("intent")
+        self.response_flight = SingleFlight("response")
+        
+        # Single-call mode: one tool-enabled completion per message instead of intent + answer
+        self.single_call = os.getenv('AI_SINGLE_CALL', '0') == '1'
+        
+        # Built on first use: importing main.py stays cheap, and the HTTP pool
+        # belongs to the worker (and event loop) that actually serves requests
+        self._client: Optional[AsyncAzureOpenAI] = None
+        self._client_failed = False
         if not self.api_key or not self.endpoint:
-            print("⚠️  Warning: Azure OpenAI credentials not set. AI features will be limited.")
-            self.client = None
-        else:
+            log.warning("⚠️  Warning: Azure OpenAI credentials not set. AI features will be limited.")
+    
+    @property
+    def client(self) -> Optional[AsyncAzureOpenAI]:
+        """Azure OpenAI client, or None without credentials or after a failed setup"""
+        if self._client is None and self.api_key and self.endpoint and not self._client_failed:
             try:
-                self.client = AzureOpenAI(
+                # One shared, bounded connection pool for every LLM call
+                self._http_client = httpx.AsyncClient(
+                    limits=httpx.Limits(
+                        max_connections=self.max_connections,
+                        max_keepalive_connections=self.max_keepalive
+                    ),
+                    timeout=httpx.Timeout(self.request_timeout, connect=5.0)
+                )
+                self._client = AsyncAzureOpenAI(
                     api_key=self.api_key,
                     api_version=self.api_version,
-                    azure_endpoint=self.endpoint
+                    azure_endpoint=self.endpoint,
+                    http_client=self._http_client,
+                    max_retries=0  # retries happen in _chat_completion, within the deadline
                 )
-                print("✅ Azure OpenAI client initialized successfully")
+                log.info("✅ Azure OpenAI client initialized successfully")
             except Exception as e:
-                print(f"❌ Error initializing Azure OpenAI client: {e}")
-                self.client = None
+                log.error("❌ Error initializing Azure OpenAI client: %s", e)
+                self._client_failed = True
+        return self._client
+    
+    async def _chat_completion(self, purpose: str, admitted: bool = False, **kwargs):
+        """Run a chat completion within the call deadline; fails fast when the breaker is open.
+        admitted: the caller already got breaker.allow() for this call"""
+        if not admitted and not self.breaker.allow():
+            raise CircuitOpenError("Azure OpenAI circuit breaker is open")
+        
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.call_deadline
+        started = time.perf_counter()
+        
+        async def attempt(remaining: float):
+            async with self.limiter.slot(timeout=remaining):
+                start = loop.time()
+                try:
+                    response = await self.client.chat.completions.create(
+                        model=self.deployment_name,  # Use Azure deployment name
+                        timeout=min(self.request_timeout, deadline - loop.time()),
+                        **kwargs
+                    )
+                except Exception as e:
+                    self.limiter.record(loop.time() - start, overloaded=_is_overload(e))
+                    raise
+                self.limiter.record(loop.time() - start)
+                return response
+        
+        try:
+            response = await retry_within_deadline(attempt, deadline, _is_overload, self.max_attempts)
+        except Exception as e:
+            LLM_CALL_SECONDS.observe(time.perf_counter() - started, purpose=purpose, outcome="error")
+            if isinstance(e, SlotTimeoutError):
+                pass  # our own queue was full; says nothing about Azure
+            elif _is_overload(e):
+                self.breaker.record_failure()
+            else:
+                self.breaker.record_success()  # the service answered; the request was at fault
+            raise
+        self.breaker.record_success()
+        LLM_CALL_SECONDS.observe(time.perf_counter() - started, purpose=purpose, outcome="ok")
+        self._record_usage(purpose, getattr(response, "usage", None))
+        return response
+    
+    def status(self) -> str:
+        """connected, degraded (probing after an outage), fallback (breaker open) or limited (no client)"""
+        if not self.client:
+            return "limited"
+        if self.breaker.is_open():
+            return "fallback"
+        return "connected" if self.breaker.state == "closed" else "degraded"
+    
+    def resilience_stats(self) -> Dict:
+        """Breaker state and current concurrency limit"""
+        return {"breaker": self.breaker.stats(), "limiter": self.limiter.stats()}
+    
+    def _record_usage(self, purpose: str, usage):
+        """Add one call's prompt/completion token counts to token_stats"""
+        if usage is None:
+            return
+        details = _field(usage, "prompt_tokens_details")
+        cached = _field(details, "cached_tokens") or 0
+        prompt_tokens = _field(usage, "prompt_tokens") or 0
+        completion_tokens = _field(usage, "completion_tokens") or 0
+        
+        stats = self.token_stats.setdefault(purpose, {
+            "calls": 0, "prompt_tokens": 0, "cached_prompt_tokens": 0, "completion_tokens": 0
+        })
+        stats["calls"] += 1
+        stats["prompt_tokens"] += prompt_tokens
+        stats["cached_prompt_tokens"] += cached
+        stats["completion_tokens"] += completion_tokens
+        LLM_TOKENS.inc(prompt_tokens, purpose=purpose, kind="prompt")
+        LLM_TOKENS.inc(cached, purpose=purpose, kind="cached_prompt")
+        LLM_TOKENS.inc(completion_tokens, purpose=purpose, kind="completion")
+        log.info("🧮 Tokens (%s): prompt=%s cached=%s completion=%s", purpose, prompt_tokens, cached, completion_tokens)
+    
+    def token_usage(self) -> Dict:
+        """Token counts per call kind, with per-call averages"""
+        usage = {}
+        for purpose, stats in self.token_stats.items():
+            calls = stats["calls"]
+            usage[purpose] = dict(
+                stats,
+                avg_prompt_tokens=round(stats["prompt_tokens"] / calls, 1),
+                avg_completion_tokens=round(stats["completion_tokens"] / calls, 1)
+            )
+        return usage
+    
+    async def aclose(self):
+        """Close the pooled HTTP connections"""
+        if self._http_client is not None:
+            await self._http_client.aclose()
+        self.intent_cache.close()
     
     async def process_query(self, user_message: str) -> Dict:
         """Process user query and extract intent + entities using Azure OpenAI"""
         
+        self.parse_stats["requests"] += 1
+        await self.entity_extractor.ensure_current()
+        basic_result = self._basic_parsing(user_message)
+        
+        if basic_result["confidence"] >= self.fast_path_threshold:
+            self.parse_stats["fast_path"] += 1
+            return basic_result
+        
         if not self.client:
             # Fallback to basic parsing if no Azure OpenAI
-            return self._basic_parsing(user_message)
+            return basic_result
         
+        cache_key = normalize_message(user_message)
+        cached = await self.intent_cache.get(cache_key)
+        if cached is not None:
+            self.parse_stats["cache_hits"] += 1
+            log.info("⚡ Intent cache hit: %s", cache_key)
+            return cached
+        
+        return await self.intent_flight.do(
+            cache_key, lambda: self._llm_parse(user_message, cache_key, basic_result)
+        )
+    
+    async def _llm_parse(self, user_message: str, cache_key: str, basic_result: Dict) -> Dict:
+        """Intent/entity extraction with Azure OpenAI, cached on success"""
+        if not self.breaker.allow():
+            # The breaker logged when it opened; rejections are not errors
+            log.debug("Intent parse skipped: circuit breaker open")
+            return basic_result
+        self.parse_stats["llm_calls"] += 1
         try:
-            prompt = f"""
-سوال کاربر: "{user_message}"
-
-تو یک AI هستی که در نمایندگی ماشین کار می‌کنی. کاربر سوالی پرسیده.
-
-لطفاً پاسخ رو به فرمت JSON زیر بده:
-
-{{
-    "intent": "price_inquiry|search|specs|finance|general",
-    "entities": {{
-        "make": "نام برند (اگه گفته)",
-        "model": "نام مدل (اگه گفته)", 
-        "year": سال (اگه گفته),
-        "max_price": حداکثر قیمت (اگه گفته),
-        "min_price": حداقل قیمت (اگه گفته),
-        "body_type": "نوع بدنه (اگه گفته)"
-    }},
-    "confidence": عدد بین 0 تا 1
-}}
-
-مثال‌ها:
-- "قیمت کمری چقدره؟" -> intent: "price_inquiry", entities: {{"make": "Toyota", "model": "Camry"}}
-- "BMW زیر ۵۰ هزار دارین؟" -> intent: "search", entities: {{"make": "BMW", "max_price": 50000}}
-- "ماشین خانوادگی میخوام" -> intent: "search", entities: {{"body_type": "SUV"}}
-
-فقط JSON برگردون:
-"""
-
-            response = self.client.chat.completions.create(
-                model=self.deployment_name,  # Use Azure deployment name
-                messages=[{"role": "user", "content": prompt}],
+            response = await self._chat_completion(
+                "intent",
+                admitted=True,
+                messages=intent_messages(user_message),
                 temperature=0.1,
                 max_tokens=300
             )
@@ -76,116 +254,232 @@ class AIService:
             # Parse JSON response
             try:
                 result = json.loads(ai_response)
-                print(f"✅ AI Response parsed successfully: {result}")
+                log.info("✅ AI Response parsed successfully: %s", result)
+                await self.intent_cache.set(cache_key, result)
                 return result
             except json.JSONDecodeError:
-                print(f"❌ Failed to parse AI response: {ai_response}")
-                return self._basic_parsing(user_message)
+                log.warning("❌ Failed to parse AI response: %s", ai_response)
+                return basic_result
                 
         except Exception as e:
-            print(f"❌ Azure OpenAI service error: {e}")
-            return self._basic_parsing(user_message)
+            log.error("❌ Azure OpenAI service error: %s", e)
+            return basic_result
     
     def _basic_parsing(self, user_message: str) -> Dict:
-        """Fallback parsing without AI"""
-        message_lower = user_message.lower()
-        
-        # Detect intent
-        intent = "general"
-        if any(word in message_lower for word in ["قیمت", "چقدر", "تومان", "price"]):
-            intent = "price_inquiry"
-        elif any(word in message_lower for word in ["جستجو", "دارین", "میخوام", "search"]):
-            intent = "search"
-        elif any(word in message_lower for word in ["مشخصات", "specs", "ویژگی"]):
-            intent = "specs"
-        
-        # Extract entities with regex
-        entities = {}
-        
-        # Car brands (simple detection)
-        brands = {
-            "تویوتا": "Toyota", "toyota": "Toyota",
-            "بی‌ام‌و": "BMW", "bmw": "BMW", "بی ام و": "BMW",
-            "مرسدس": "Mercedes", "mercedes": "Mercedes",
-            "هوندا": "Honda", "honda": "Honda",
-            "مزدا": "Mazda", "mazda": "Mazda",
-            "هیوندای": "Hyundai", "hyundai": "Hyundai"
-        }
-        
-        for persian, english in brands.items():
-            if persian in message_lower:
-                entities["make"] = english
-                break
-        
-        # Car models (simple detection)
-        models = {
-            "کمری": "Camry", "camry": "Camry",
-            "کرولا": "Corolla", "corolla": "Corolla",
-            "rav4": "RAV4", "راو": "RAV4"
-        }
-        
-        for persian, english in models.items():
-            if persian in message_lower:
-                entities["model"] = english
-                break
-        
-        # Price extraction
-        price_match = re.search(r'(\d+)\s*(?:هزار|k|thousand)', message_lower)
-        if price_match:
-            entities["max_price"] = int(price_match.group(1)) * 1000
-        
-        print(f"📝 Basic parsing result: intent={intent}, entities={entities}")
+        """Rule-based parsing without AI (fast path and fallback)"""
+        result = self.entity_extractor.extract(user_message)
+        log.info("📝 Basic parsing result: intent=%s, entities=%s, confidence=%s",
+                 result['intent'], result['entities'], result['confidence'])
+        return result
+    
+    def flight_stats(self) -> Dict:
+        """How many concurrent identical LLM calls were coalesced"""
         return {
-            "intent": intent,
-            "entities": entities,
-            "confidence": 0.7
+            "intent": self.intent_flight.stats(),
+            "response": self.response_flight.stats()
         }
     
-    async def generate_response(self, intent: str, cars: List, user_message: str) -> str:
+    def intent_stats(self) -> Dict:
+        """How many requests were answered without an LLM round-trip"""
+        stats = dict(self.parse_stats)
+        requests = stats["requests"]
+        stats["without_llm_ratio"] = round(1 - stats["llm_calls"] / requests, 3) if requests else 0.0
+        return stats
+    
+    async def generate_response(self, intent: str, cars: List, user_message: str,
+                                context: Optional[Dict] = None) -> str:
         """Generate natural response based on results using Azure OpenAI"""
         
         if not self.client:
             return self._basic_response(intent, cars)
         
+        key = (intent, tuple(car.id for car in cars), normalize_message(user_message), _context_key(context))
+        return await self.response_flight.do(
+            key, lambda: self._llm_response(intent, cars, user_message, context)
+        )
+    
+    async def _llm_response(self, intent: str, cars: List, user_message: str,
+                            context: Optional[Dict] = None) -> str:
+        """Answer text from Azure OpenAI, or the rule-based answer on error"""
         try:
-            # Prepare context
-            cars_text = ""
-            if cars:
-                for car in cars[:3]:
-                    cars_text += f"- {car.make} {car.model} {car.year}: ${car.price:,}\n"
-            
-            prompt = f"""
-کاربر پرسید: "{user_message}"
-Intent: {intent}
-
-ماشین‌های پیدا شده:
-{cars_text if cars_text else "هیچ ماشینی پیدا نشد"}
-
-یک پاسخ طبیعی و دوستانه به فارسی بنویس که:
-- مفید و مرتبط باشه
-- اگه ماشین پیدا شده، معرفی کن
-- اگه پیدا نشده، گزینه‌های دیگه پیشنهاد بده  
-- سوال بعدی بپرس تا بتونی بهتر کمک کنی
-- حداکثر 100 کلمه
-
-پاسخ:
-"""
-            
-            response = self.client.chat.completions.create(
-                model=self.deployment_name,
-                messages=[{"role": "user", "content": prompt}],
+            response = await self._chat_completion(
+                "response",
+                messages=response_messages(intent, cars, user_message, context),
                 temperature=0.7,
                 max_tokens=200
             )
             
             ai_response = response.choices[0].message.content.strip()
-            print(f"✅ AI Response generated: {ai_response[:100]}...")
+            log.info("✅ AI Response generated: %.100s...", ai_response)
             return ai_response
             
+        except CircuitOpenError as e:
+            log.debug("Response generation skipped: %s", e)
+            return self._basic_response(intent, cars)
         except Exception as e:
-            print(f"❌ Response generation error: {e}")
+            log.error("❌ Response generation error: %s", e)
             return self._basic_response(intent, cars)
     
+    async def chat_single_call(self, user_message: str, search: Callable[[Dict], Awaitable[List]],
+                               session=None) -> Dict:
+        """Answer in one LLM round-trip: search with the rule-based parse up front, and let
+        the model call the search_cars tool only when those cars don't fit the question"""
+        
+        # Keyed on what the answer depends on, not the session id, so identical
+        # first messages from new visitors share one call
+        context_key = ""
+        if session is not None:
+            context_key = _context_key({**session.context(), "last_prices": session.last_prices})
+        result = await self.response_flight.do(
+            ("single_call", normalize_message(user_message), context_key),
+            lambda: self._single_call(user_message, search, session)
+        )
+        if session is not None and result["intent"] in SEARCH_INTENTS:
+            # Only the leader's session went through resolve(); coalesced callers adopt its filters
+            session.entities = dict(result["entities"])
+        return result
+    
+    async def _single_call(self, user_message: str, search: Callable[[Dict], Awaitable[List]],
+                           session=None) -> Dict:
+        self.parse_stats["requests"] += 1
+        await self.entity_extractor.ensure_current()
+        parsed = self._basic_parsing(user_message)
+        intent, entities = parsed["intent"], parsed["entities"]
+        context = None
+        if session is not None:
+            intent, entities = session.resolve(intent, entities, user_message)
+            context = session.context()
+        
+        cars = []
+        if intent in SEARCH_INTENTS and entities:
+            cars = await search(entities)
+        
+        if not self.client:
+            self.parse_stats["fast_path"] += 1
+            return {"intent": intent, "entities": entities, "cars": cars,
+                    "response": self._basic_response(intent, cars)}
+        
+        if not self.breaker.allow():
+            log.debug("Single-call chat skipped: circuit breaker open")
+            return {"intent": intent, "entities": entities, "cars": cars,
+                    "response": self._basic_response(intent, cars)}
+        
+        self.parse_stats["llm_calls"] += 1
+        try:
+            messages = tool_messages(intent, cars, user_message, context)
+            response = await self._chat_completion(
+                "single_call",
+                admitted=True,
+                messages=messages,
+                tools=[SEARCH_CARS_TOOL],
+                tool_choice="auto",
+                temperature=0.7,
+                max_tokens=200
+            )
+            message = response.choices[0].message
+            
+            if message.tool_calls:
+                # The model asked for a different search: run it and finish the same conversation
+                call = message.tool_calls[0]
+                try:
+                    arguments = json.loads(call.function.arguments or "{}")
+                except json.JSONDecodeError:
+                    arguments = {}
+                entities = {k: v for k, v in arguments.items() if v not in (None, "")} or entities
+                intent = "search" if intent not in SEARCH_INTENTS else intent
+                cars = await search(entities)
+                if session is not None:
+                    session.entities = entities
+                log.info("🛠️  Tool search_cars(%s) -> %d cars", entities, len(cars))
+                
+                messages += [
+                    {"role": "assistant", "content": message.content, "tool_calls": [{
+                        "id": call.id, "type": "function",
+                        "function": {"name": call.function.name, "arguments": call.function.arguments}
+                    }]},
+                    {"role": "tool", "tool_call_id": call.id, "content": tool_result(cars)}
+                ]
+                response = await self._chat_completion(
+                    "single_call",
+                    messages=messages,
+                    temperature=0.7,
+                    max_tokens=200
+                )
+                message = response.choices[0].message
+            
+            ai_response = (message.content or "").strip() or self._basic_response(intent, cars)
+            return {"intent": intent, "entities": entities, "cars": cars, "response": ai_response}
+            
+        except CircuitOpenError as e:
+            log.debug("Single-call chat fell back: %s", e)
+            return {"intent": intent, "entities": entities, "cars": cars,
+                    "response": self._basic_response(intent, cars)}
+        except Exception as e:
+            log.error("❌ Single-call chat error: %s", e)
+            return {"intent": intent, "entities": entities, "cars": cars,
+                    "response": self._basic_response(intent, cars)}
+    
+    async def stream_response(self, intent: str, cars: List, user_message: str,
+                              context: Optional[Dict] = None) -> AsyncIterator[str]:
+        """Stream the generated response token by token"""
+        
+        if not self.client:
+            yield self._basic_response(intent, cars)
+            return
+        
+        sent_any = False
+        try:
+            # Usage arrives in a final chunk with no choices when the API supports it
+            extra_body = {"stream_options": {"include_usage": True}} if self.stream_usage else None
+            
+            if not self.breaker.allow():
+                raise CircuitOpenError("Azure OpenAI circuit breaker is open")
+            
+            # Hold the concurrency slot for the whole stream, not just the request
+            loop = asyncio.get_running_loop()
+            async with self.limiter.slot(timeout=self.call_deadline):
+                start = loop.time()
+                try:
+                    stream = await self.client.chat.completions.create(
+                        model=self.deployment_name,
+                        timeout=min(self.request_timeout, self.call_deadline),
+                        messages=response_messages(intent, cars, user_message, context),
+                        temperature=0.7,
+                        max_tokens=200,
+                        stream=True,
+                        extra_body=extra_body
+                    )
+                    
+                    async for chunk in stream:
+                        if not chunk.choices:
+                            self._record_usage("stream", getattr(chunk, "usage", None))
+                            continue
+                        token = chunk.choices[0].delta.content
+                        if token:
+                            if not sent_any:
+                                # Time to first token is what the limiter tracks for streams
+                                self.limiter.record(loop.time() - start)
+                            sent_any = True
+                            yield token
+                except Exception as e:
+                    LLM_CALL_SECONDS.observe(loop.time() - start, purpose="stream", outcome="error")
+                    if _is_overload(e):
+                        self.limiter.record(loop.time() - start, overloaded=True)
+                        self.breaker.record_failure()
+                    else:
+                        self.breaker.record_success()
+                    raise
+                LLM_CALL_SECONDS.observe(loop.time() - start, purpose="stream", outcome="ok")
+                self.breaker.record_success()
+                    
+        except CircuitOpenError as e:
+            log.debug("Response streaming skipped: %s", e)
+            yield self._basic_response(intent, cars)
+        except Exception as e:
+            log.error("❌ Response streaming error: %s", e)
+            if not sent_any:
+                yield self._basic_response(intent, cars)
+    
     def _basic_response(self, intent: str, cars: List) -> str:
         """Fallback response generation"""
         if not cars:
@@ -0,0 +1,39 @@
+# services/app_logging.py - Non-blocking logging for the request path
+#
+# Request handlers only put records on an in-memory queue; a background thread
+# formats them and writes to stdout, so a slow terminal or pipe never stalls
+# the event loop.
+import os
+import sys
+import queue
+import atexit
+import logging
+from logging.handlers import QueueHandler, QueueListener
+from typing import Optional
+
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO').upper()
+
+_listener: Optional[QueueListener] = None
+
+def setup_logging(level: str = LOG_LEVEL) -> QueueListener:
+    """Route the root logger through a queue to a stdout writer thread (idempotent)"""
+    global _listener
+    if _listener is not None:
+        return _listener
+    records = queue.SimpleQueue()
+    output = logging.StreamHandler(sys.stdout)
+    output.setFormatter(logging.Formatter("%(message)s"))
+    root = logging.getLogger()
+    root.handlers = [QueueHandler(records)]
+    root.setLevel(level)
+    _listener = QueueListener(records, output, respect_handler_level=True)
+    _listener.start()
+    # Flush what is still queued when the process exits
+    atexit.register(stop_logging)
+    return _listener
+
+def stop_logging():
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
@@ -1,11 +1,55 @@
 # services/car_service.py
+import os
+import json
+import base64
+import binascii
+import logging
 from repositories.car_repository import CarRepository
+from repositories.async_car_repository import AsyncCarRepository
+from services.single_flight import SingleFlight
+from services.cost_engine import CostEngine
+from services.metrics import STAGE_SECONDS
 from database.models import Car
-from typing import List, Dict, Optional
+from typing import Any, List, Dict, Optional, Tuple
+
+log = logging.getLogger(__name__)
+
+# Blend embedding similarity into search_cars (builds a vector index next to the database)
+SEMANTIC_SEARCH = os.getenv('SEMANTIC_SEARCH', '0') == '1'
+SEMANTIC_CANDIDATES = int(os.getenv('SEMANTIC_CANDIDATES', '50'))
+# Reciprocal rank fusion constant: larger values flatten the gap between ranks
+RRF_K = 60
+
+# Fields of the /cars listing when the client asks for none
+DEFAULT_LISTING_FIELDS = ["id", "make", "model", "year", "price", "body_type", "description"]
+
+def encode_cursor(key: Tuple) -> str:
+    """Opaque cursor for the sort key of the last row on a page"""
+    return base64.urlsafe_b64encode(json.dumps(list(key)).encode("utf-8")).decode("ascii")
+
+def decode_cursor(cursor: str) -> Tuple:
+    """Sort key from a cursor made by encode_cursor; ValueError if it is not one"""
+    try:
+        key = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+    except (binascii.Error, UnicodeError, json.JSONDecodeError):
+        raise ValueError("Invalid cursor")
+    if (not isinstance(key, list) or len(key) != 4
+            or not all(isinstance(v, str) for v in key[:2])
+            or not all(isinstance(v, int) for v in key[2:])):
+        raise ValueError("Invalid cursor")
+    return tuple(key)
 
 class CarService:
-    def __init__(self):
-        self.car_repo = CarRepository()
+    def __init__(self, car_repo: Optional[CarRepository] = None, semantic: bool = SEMANTIC_SEARCH):
+        self.car_repo = car_repo or CarRepository()
+        self.cost_engine = CostEngine()
+        self.vector_index = None
+        if semantic:
+            try:
+                from repositories.vector_index import VectorIndex
+                self.vector_index = VectorIndex(self.car_repo)
+            except ImportError as e:
+                log.warning(f"⚠️  Semantic search unavailable ({e})")
     
     def get_all_cars(self) -> List[Car]:
         """Get all available cars"""
@@ -15,28 +59,80 @@ class CarService:
         """Get car by ID"""
         return self.car_repo.get_car_by_id(car_id)
     
-    def search_cars(self, entities: Dict) -> List[Car]:
-        """Search cars based on AI extracted entities"""
-        
-        # If no entities, return popular cars
+    def warm_up(self):
+        """Load what the first searches would otherwise pay for: connections,
+        the text index check, the in-memory inventory and the vector index"""
+        self.car_repo.get_inventory_version()
+        self.car_repo.has_text_index
+        if self.car_repo.index is not None:
+            self.car_repo.index.refresh()
+        if self.vector_index is not None:
+            self.vector_index.warm_up()
+    
+    def list_cars(self, filters: Dict, fields: Optional[List[str]] = None, limit: int = 50,
+                  cursor: Optional[str] = None) -> Dict[str, Any]:
+        """One page of the /cars listing with the cursor for the next page"""
+        fields = fields or DEFAULT_LISTING_FIELDS
+        after = decode_cursor(cursor) if cursor else None
+        rows, last_key = self.car_repo.list_cars(filters, fields, limit, after)
+        return self._listing_page(rows, fields, last_key)
+    
+    def _listing_page(self, rows: List[Dict], fields: List[str], last_key: Optional[Tuple]) -> Dict[str, Any]:
+        # Drop sort-key columns that were selected only to build the cursor
+        if rows and len(rows[0]) > len(set(fields)):
+            rows = [{field: row[field] for field in fields} for row in rows]
+        return {
+            "cars": rows,
+            "next_cursor": encode_cursor(last_key) if last_key else None
+        }
+    
+    def search_cars(self, entities: Dict, query_text: str = "", limit: int = 10) -> List[Car]:
+        """Search cars based on AI extracted entities, blended with semantic
+        matches for query_text when the vector index is enabled"""
+        semantic = []
+        if query_text and self.vector_index is not None:
+            with STAGE_SECONDS.time(stage="search_semantic"):
+                semantic = self._semantic_search(entities, query_text)
+        
+        # If no entities, return semantic matches or popular cars
         if not entities:
-            return self.car_repo.get_all_cars()[:5]
-        
-        # First try exact search
-        results = self.car_repo.search_cars(entities)
-        
-        # If no results, try flexible search
-        if not results and entities:
-            flexible_search = self._create_flexible_search(entities)
-            results = self.car_repo.search_cars(flexible_search)
-        
-        # If still no results, try text search
-        if not results:
-            search_text = self._entities_to_text(entities)
-            if search_text:
-                results = self.car_repo.search_by_text(search_text)
-        
-        return results
+            if semantic:
+                return semantic[:limit]
+            with STAGE_SECONDS.time(stage="search_popular"):
+                return self.car_repo.get_all_cars(limit=5)
+        
+        # Exact, else flexible, else text matches, resolved in a single ranked query
+        with STAGE_SECONDS.time(stage="search_ranked"):
+            relaxed = self._create_flexible_search(entities)
+            ranked = self.car_repo.search_ranked(
+                entities,
+                relaxed,
+                self._entities_to_text(entities),
+                limit
+            )
+        if not semantic:
+            return ranked
+        with STAGE_SECONDS.time(stage="search_fuse"):
+            return self._fuse(ranked, semantic)[:limit]
+    
+    def _semantic_search(self, entities: Dict, query_text: str) -> List[Car]:
+        """Nearest cars to query_text that still satisfy the relaxed entity filters"""
+        if self.vector_index is None:
+            return []
+        hits = self.vector_index.search(query_text, SEMANTIC_CANDIDATES)
+        relaxed = self._create_flexible_search(entities) if entities else None
+        return self.car_repo.get_cars_by_ids([car_id for car_id, _ in hits], relaxed)
+    
+    @staticmethod
+    def _fuse(*rankings: List[Car]) -> List[Car]:
+        """Reciprocal rank fusion: cars ranked high in either list, or present in both, come first"""
+        scores: Dict[int, float] = {}
+        cars: Dict[int, Car] = {}
+        for ranking in rankings:
+            for rank, car in enumerate(ranking):
+                scores[car.id] = scores.get(car.id, 0.0) + 1.0 / (RRF_K + rank)
+                cars.setdefault(car.id, car)
+        return [cars[car_id] for car_id in sorted(scores, key=lambda car_id: -scores[car_id])]
     
     def _create_flexible_search(self, entities: Dict) -> Dict:
         """Create more flexible search criteria"""
@@ -77,49 +173,70 @@ class CarService:
     
     def calculate_basic_costs(self, car_price: float, state: str = "NSW") -> Dict:
         """Calculate basic on-road costs"""
-        
-        # Australian state-specific costs (simplified)
-        state_costs = {
-            "NSW": {
-                "registration": 800,
-                "stamp_duty_rate": 0.032,
-                "ctp_insurance": 600
-            },
-            "VIC": {
-                "registration": 750,
-                "stamp_duty_rate": 0.035,
-                "ctp_insurance": 550
-            },
-            "QLD": {
-                "registration": 680,
-                "stamp_duty_rate": 0.030,
-                "ctp_insurance": 400
-            }
-        }
-        
-        costs = state_costs.get(state, state_costs["NSW"])
-        
-        # Calculate costs
-        registration = costs["registration"]
-        stamp_duty = car_price * costs["stamp_duty_rate"]
-        ctp_insurance = costs["ctp_insurance"]
-        transfer_fee = 150
-        dealer_delivery = 500
-        
-        # Optional comprehensive insurance estimate
-        comprehensive_insurance = car_price * 0.04  # 4% annually
-        
-        total_additional = registration + stamp_duty + ctp_insurance + transfer_fee + dealer_delivery
-        total_on_road = car_price + total_additional
-        
+        if state.upper() not in self.cost_engine.tables:
+            state = self.cost_engine.default_state
+        return self.cost_engine.breakdowns([car_price], state)[0]
+    
+    def calculate_costs(self, car_ids: List[int], state: str = "NSW") -> Dict[str, Any]:
+        """On-road costs for a page of cars in one batch; ValueError for an unknown state"""
+        self.cost_engine.table(state)
+        return self._costs_page(self.car_repo.get_cars_by_ids(car_ids), state)
+    
+    def _costs_page(self, cars: List[Car], state: str) -> Dict[str, Any]:
+        breakdowns = self.cost_engine.breakdowns([car.price for car in cars], state)
         return {
-            "base_price": car_price,
-            "registration": registration,
-            "stamp_duty": round(stamp_duty, 2),
-            "ctp_insurance": ctp_insurance,
-            "transfer_fee": transfer_fee,
-            "dealer_delivery": dealer_delivery,
-            "comprehensive_insurance_estimate": round(comprehensive_insurance, 2),
-            "total_additional_costs": round(total_additional, 2),
-            "total_on_road_price": round(total_on_road, 2)
-        }
\ No newline at end of file
+            "state": state.upper(),
+            "costs": [dict(costs, car_id=car.id) for car, costs in zip(cars, breakdowns)]
+        }
+
+class AsyncCarService(CarService):
+    """CarService for async callers: database work runs off the event loop"""
+    
+    def __init__(self, car_repo: Optional[CarRepository] = None, semantic: bool = SEMANTIC_SEARCH):
+        super().__init__(car_repo, semantic)
+        self.async_repo = AsyncCarRepository(self.car_repo)
+        self.search_flight = SingleFlight("search")
+    
+    async def get_all_cars(self) -> List[Car]:
+        """Get all available cars"""
+        return await self.async_repo.get_all_cars()
+    
+    async def get_car_by_id(self, car_id: int) -> Optional[Car]:
+        """Get car by ID"""
+        return await self.async_repo.get_car_by_id(car_id)
+    
+    async def list_cars(self, filters: Dict, fields: Optional[List[str]] = None, limit: int = 50,
+                        cursor: Optional[str] = None) -> Dict[str, Any]:
+        """One page of the /cars listing with the cursor for the next page"""
+        fields = fields or DEFAULT_LISTING_FIELDS
+        after = decode_cursor(cursor) if cursor else None
+        rows, last_key = await self.async_repo.list_cars(filters, fields, limit, after)
+        return self._listing_page(rows, fields, last_key)
+    
+    async def calculate_costs(self, car_ids: List[int], state: str = "NSW") -> Dict[str, Any]:
+        """On-road costs for a page of cars in one batch; ValueError for an unknown state"""
+        self.cost_engine.table(state)
+        cars = await self.async_repo.run(self.car_repo.get_cars_by_ids, car_ids)
+        return self._costs_page(cars, state)
+    
+    async def warm_up(self):
+        """Load indexes off the event loop"""
+        await self.async_repo.run(super().warm_up)
+    
+    async def get_inventory_version(self) -> int:
+        """Counter bumped on every write to the cars table"""
+        return await self.async_repo.run(self.car_repo.get_inventory_version)
+    
+    async def search_cars(self, entities: Dict, query_text: str = "") -> List[Car]:
+        """Search cars based on AI extracted entities"""
+        # The query text only changes results when semantic search is on
+        query_text = query_text if self.vector_index is not None else ""
+        # Identical searches in flight at the same time share one query
+        key = json.dumps([entities, query_text], sort_keys=True, ensure_ascii=False, default=str)
+        return await self.search_flight.do(
+            key, lambda: self.async_repo.run(super(AsyncCarService, self).search_cars, entities, query_text)
+        )
+    
+    def close(self):
+        """Release the worker threads and pooled connections"""
+        self.async_repo.close()
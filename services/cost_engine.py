@@ -0,0 +1,105 @@
+# services/cost_engine.py
+from typing import Dict, List, Sequence, Union
+import numpy as np
+
+# Luxury car tax (ATO): 33% of the GST-exclusive amount above the threshold
+LCT_THRESHOLD = 76950
+LCT_RATE = 0.33
+GST = 0.10
+
+TRANSFER_FEE = 150
+DEALER_DELIVERY = 500
+COMPREHENSIVE_INSURANCE_RATE = 0.04  # annual estimate
+
+# Per-state on-road rules (simplified). Stamp duty brackets are (upper bound, rate):
+# "marginal" taxes each slice of the price at its bracket's rate,
+# "flat" taxes the whole price at the rate of the bracket it falls in.
+STATE_RULES: Dict[str, Dict] = {
+    "NSW": {"registration": 800, "ctp_insurance": 600, "duty": "marginal",
+            "brackets": [(45000, 0.03), (None, 0.05)]},
+    "VIC": {"registration": 750, "ctp_insurance": 550, "duty": "flat",
+            "brackets": [(76950, 0.042), (100000, 0.052), (150000, 0.07), (None, 0.09)]},
+    "QLD": {"registration": 680, "ctp_insurance": 400, "duty": "flat",
+            "brackets": [(100000, 0.03), (None, 0.05)]},
+    "SA": {"registration": 420, "ctp_insurance": 450, "duty": "marginal",
+           "brackets": [(1000, 0.01), (2000, 0.02), (3000, 0.03), (None, 0.04)]},
+    "WA": {"registration": 500, "ctp_insurance": 450, "duty": "flat",
+           "brackets": [(25000, 0.0275), (50000, 0.046), (None, 0.065)]},
+    "TAS": {"registration": 550, "ctp_insurance": 350, "duty": "flat",
+            "brackets": [(35000, 0.03), (40000, 0.035), (None, 0.04)]},
+    "ACT": {"registration": 700, "ctp_insurance": 550, "duty": "marginal",
+            "brackets": [(45000, 0.03), (None, 0.05)]},
+    "NT": {"registration": 450, "ctp_insurance": 500, "duty": "flat",
+           "brackets": [(None, 0.03)]},
+}
+
+class _StateTable:
+    """One state's rules as arrays, ready for vectorized stamp duty"""
+
+    def __init__(self, rules: Dict):
+        self.registration = rules["registration"]
+        self.ctp_insurance = rules["ctp_insurance"]
+        self.marginal = rules["duty"] == "marginal"
+        uppers = np.array([np.inf if upper is None else upper for upper, _ in rules["brackets"]])
+        self.uppers = uppers
+        self.lowers = np.concatenate(([0.0], uppers[:-1]))
+        self.rates = np.array([rate for _, rate in rules["brackets"]])
+
+    def stamp_duty(self, prices: np.ndarray) -> np.ndarray:
+        if self.marginal:
+            # Part of each price inside each bracket, times that bracket's rate
+            slices = np.clip(prices[:, None] - self.lowers, 0, self.uppers - self.lowers)
+            return slices @ self.rates
+        return prices * self.rates[np.searchsorted(self.uppers, prices, side="left")]
+
+class CostEngine:
+    """On-road costs for many prices at once; rule tables are compiled once"""
+
+    def __init__(self, rules: Dict[str, Dict] = STATE_RULES, default_state: str = "NSW"):
+        self.tables = {state: _StateTable(state_rules) for state, state_rules in rules.items()}
+        self.default_state = default_state
+
+    @property
+    def states(self) -> List[str]:
+        return list(self.tables)
+
+    def table(self, state: str) -> _StateTable:
+        """Rules of a state; ValueError if there are none"""
+        table = self.tables.get((state or "").upper())
+        if table is None:
+            raise ValueError(f"Unknown state '{state}' (expected one of {', '.join(self.tables)})")
+        return table
+
+    def calculate(self, prices: Union[Sequence[float], np.ndarray], state: str) -> Dict[str, np.ndarray]:
+        """Each cost component as an array aligned with prices"""
+        table = self.table(state)
+        prices = np.asarray(prices, dtype=np.float64)
+        stamp_duty = table.stamp_duty(prices)
+        luxury_car_tax = np.maximum(prices - LCT_THRESHOLD, 0) / (1 + GST) * LCT_RATE
+        fixed = table.registration + table.ctp_insurance + TRANSFER_FEE + DEALER_DELIVERY
+        total_additional = fixed + stamp_duty + luxury_car_tax
+        return {
+            "base_price": prices,
+            "stamp_duty": stamp_duty,
+            "luxury_car_tax": luxury_car_tax,
+            "comprehensive_insurance_estimate": prices * COMPREHENSIVE_INSURANCE_RATE,
+            "total_additional_costs": total_additional,
+            "total_on_road_price": prices + total_additional,
+        }
+
+    def breakdowns(self, prices: Union[Sequence[float], np.ndarray], state: str) -> List[Dict]:
+        """Per-price cost dicts (the calculate_basic_costs shape) for JSON responses"""
+        table = self.table(state)
+        costs = self.calculate(prices, state)
+        columns = {name: np.round(values, 2).tolist() for name, values in costs.items()}
+        fixed = {
+            "registration": table.registration,
+            "ctp_insurance": table.ctp_insurance,
+            "transfer_fee": TRANSFER_FEE,
+            "dealer_delivery": DEALER_DELIVERY,
+        }
+        base_prices = columns.pop("base_price")
+        return [
+            dict({"base_price": price}, **fixed, **{name: values[i] for name, values in columns.items()})
+            for i, price in enumerate(base_prices)
+        ]
@@ -0,0 +1,300 @@
+# services/entity_extractor.py
+import os
+import re
+import time
+import asyncio
+import sqlite3
+import logging
+import threading
+from typing import Dict, List, Optional, Set, Tuple
+from repositories.car_repository import CarRepository
+from services.entity_matcher import EntityMatcher
+from services.text_utils import normalize_text
+
+log = logging.getLogger(__name__)
+
+# Persian/colloquial names -> canonical values used in the cars table
+BRAND_ALIASES = {
+    "تویوتا": "Toyota",
+    "بی ام و": "BMW", "بی ام": "BMW", "ب ام و": "BMW",
+    "مرسدس": "Mercedes", "بنز": "Mercedes", "مرسدس بنز": "Mercedes", "benz": "Mercedes",
+    "هوندا": "Honda",
+    "مزدا": "Mazda",
+    "هیوندای": "Hyundai", "هیوندا": "Hyundai", "هیوندایی": "Hyundai",
+    "نیسان": "Nissan",
+    "فولکس": "Volkswagen", "فولکس واگن": "Volkswagen", "vw": "Volkswagen",
+    "کیا": "Kia",
+}
+
+MODEL_ALIASES = {
+    "کمری": "Camry",
+    "کرولا": "Corolla",
+    "راو4": "RAV4", "راو فور": "RAV4", "راوفور": "RAV4",
+    "سری 3": "3 Series", "سری 5": "5 Series",
+    "ایکس 3": "X3",
+    "کلاس سی": "C-Class", "سی کلاس": "C-Class", "c class": "C-Class",
+    "جی ال ای": "GLA",
+    "سیویک": "Civic", "سیوییک": "Civic",
+    "سی آر وی": "CR-V", "crv": "CR-V",
+    "سی ایکس 5": "CX-5", "cx5": "CX-5",
+    "الانترا": "Elantra", "النترا": "Elantra",
+    "توسان": "Tucson",
+    "آلتیما": "Altima", "التیما": "Altima",
+    "ایکس تریل": "X-Trail", "xtrail": "X-Trail",
+    "گلف": "Golf",
+    "تیگوان": "Tiguan",
+    "اسپورتیج": "Sportage",
+}
+
+BODY_TYPE_ALIASES = {
+    "شاسی بلند": "SUV", "شاسی": "SUV", "خانوادگی": "SUV",
+    "سدان": "Sedan",
+    "هاچبک": "Hatchback", "هاچ بک": "Hatchback",
+}
+
+FUEL_TYPE_ALIASES = {
+    "بنزینی": "Petrol", "petrol": "Petrol", "gasoline": "Petrol",
+    "دیزل": "Diesel", "گازوئیلی": "Diesel", "diesel": "Diesel",
+    "هیبرید": "Hybrid", "hybrid": "Hybrid",
+    "برقی": "Electric", "electric": "Electric",
+}
+
+INTENT_KEYWORDS = [
+    ("price_inquiry", ["قیمت", "چقدر", "چند", "تومان", "price", "cost", "how much"]),
+    ("finance", ["قسط", "اقساط", "وام", "لیزینگ", "finance", "loan"]),
+    ("specs", ["مشخصات", "ویژگی", "مصرف", "specs", "features"]),
+    ("search", ["جستجو", "دارین", "دارید", "داری", "میخوام", "می خوام", "موجود", "پیشنهاد",
+                "search", "looking for", "want", "show"]),
+]
+
+# Intents that trigger an inventory search
+SEARCH_INTENTS = ("search", "price_inquiry", "specs")
+
+GREETINGS = ["سلام", "درود", "ممنون", "مرسی", "خداحافظ", "hello", "hi", "thanks"]
+
+# Price expressions; numbers are already ASCII after normalize_text
+_NUMBER = r"(\d[\d,]*(?:\.\d+)?)"
+# Units end at a word boundary: "40000 made" is not 40000 million
+_UNIT_WORDS = r"(?:هزار|thousand|k|میلیون|million|m)(?![A-Za-z])"
+_UNIT = r"\s*(" + _UNIT_WORDS + r")?"
+_RANGE = re.compile(r"(?:بین|between|از)\s*\$?" + _NUMBER + _UNIT + r"\s*(?:تا|و|and|to|-)\s*\$?" + _NUMBER + _UNIT)
+_MAX = re.compile(r"(?:زیر|کمتر از|حداکثر|تا سقف|under|below|less than|max|up to)\s*\$?" + _NUMBER + _UNIT)
+_MIN = re.compile(r"(?:بالای|بیشتر از|حداقل|over|above|more than|min|at least)\s*\$?" + _NUMBER + _UNIT)
+_BARE = re.compile(r"\$?" + _NUMBER + r"\s*(" + _UNIT_WORDS + r"|دلار|\$)")
+_UNIT_AHEAD = re.compile(_UNIT_WORDS + r"|دلار")
+_YEAR = re.compile(r"(?<!\d)(19[89]\d|20[0-4]\d)(?!\d)")
+
+_UNIT_MULTIPLIERS = {
+    "هزار": 1000, "k": 1000, "thousand": 1000,
+    "میلیون": 1000000, "m": 1000000, "million": 1000000,
+}
+
+def _to_price(number: str, unit: Optional[str]) -> float:
+    value = float(number.replace(",", ""))
+    return value * _UNIT_MULTIPLIERS.get(unit or "", 1)
+
+def _has_keyword(text: str, keywords: List[str], whole_word: bool = False) -> bool:
+    """Keyword at the start of a word ("قیمتش" counts, "میخوام" is not "وام")"""
+    suffix = r"(?!\w)" if whole_word else ""
+    return any(re.search(r"(?<!\w)" + re.escape(word) + suffix, text) for word in keywords)
+
+class EntityExtractor:
+    """Rule-based intent/entity extraction driven by the inventory catalog.
+    Two matchers are kept: refresh() applies the catalog diff to the standby one
+    and swaps it in whole, so extract() never sees a half-updated matcher and
+    never touches the database."""
+
+    def __init__(self, car_repo: Optional[CarRepository] = None):
+        self.car_repo = car_repo or CarRepository()
+        # (matcher, model -> implied make, inventory version), replaced as one value
+        self._catalog: Tuple[EntityMatcher, Dict[str, Optional[str]], Optional[int]] = (EntityMatcher(), {}, None)
+        # Not read by extract(); the next refresh() syncs it and swaps it in
+        self._standby = EntityMatcher()
+        self._build_lock = threading.Lock()
+        self.refresh_interval = float(os.getenv('CATALOG_REFRESH_SECONDS', '30'))
+        self._checked_at: Optional[float] = None
+        self._pending: Optional[asyncio.Future] = None
+
+    @property
+    def matcher(self) -> EntityMatcher:
+        return self._catalog[0]
+
+    def refresh(self, loop: Optional[asyncio.AbstractEventLoop] = None):
+        """Sync the matcher with the current make/model/body_type values in the cars table
+        (blocking: run it off the event loop). Pass the loop extract() runs on so the
+        swap happens between two extract() calls; the matcher swapped out is only
+        mutated again by the next refresh, once nothing can still be reading it."""
+        with self._build_lock:
+            self._refresh(loop)
+
+    def _refresh(self, loop: Optional[asyncio.AbstractEventLoop]):
+        terms: Dict[Tuple[str, str], str] = {}
+        for kind, aliases in (("make", BRAND_ALIASES), ("model", MODEL_ALIASES),
+                              ("body_type", BODY_TYPE_ALIASES), ("fuel_type", FUEL_TYPE_ALIASES)):
+            for alias, value in aliases.items():
+                terms[(normalize_text(alias), kind)] = value
+        model_makes: Dict[str, Optional[str]] = {}
+
+        try:
+            version = self.car_repo.get_inventory_version()
+            catalog = self.car_repo.get_catalog_terms()
+        except sqlite3.Error as e:
+            log.warning(f"⚠️  Could not load catalog for entity extraction: {e}")
+            version, catalog = None, []
+
+        for make, model, body_type in catalog:
+            terms[(normalize_text(make), "make")] = make
+            terms[(normalize_text(model), "model")] = model
+            # Models sold by more than one make don't imply a make
+            if model in model_makes and model_makes[model] != make:
+                model_makes[model] = None
+            else:
+                model_makes[model] = make
+            if body_type:
+                terms[(normalize_text(body_type), "body_type")] = body_type
+
+        # Only the terms that changed since the standby was last synced are applied
+        matcher = self._standby
+        added, removed = matcher.sync(terms)
+        catalog = (matcher, model_makes, version)
+        if loop is None:
+            self._publish(catalog)
+        else:
+            published = threading.Event()
+            loop.call_soon_threadsafe(self._publish, catalog, published)
+            published.wait()
+        if added or removed:
+            log.info(f"🔤 Entity matcher updated: +{added} -{removed} ({len(matcher)} terms)")
+
+    def _publish(self, catalog, published: Optional[threading.Event] = None):
+        self._standby = self._catalog[0]
+        self._catalog = catalog
+        self._checked_at = time.monotonic()
+        if published is not None:
+            published.set()
+
+    def _refresh_if_changed(self, loop: asyncio.AbstractEventLoop):
+        try:
+            version = self.car_repo.get_inventory_version()
+        except sqlite3.Error as e:
+            log.warning(f"⚠️  Could not read inventory version: {e}")
+            version = None
+        if version is None or version != self._catalog[2]:
+            self.refresh(loop)
+        else:
+            self._checked_at = time.monotonic()
+
+    async def ensure_current(self):
+        """Every refresh_interval seconds, reload the catalog on a worker thread if the
+        inventory version moved. Only the very first load is waited for."""
+        if self._checked_at is not None and time.monotonic() - self._checked_at <= self.refresh_interval:
+            return
+        if self._pending is None or self._pending.done():
+            loop = asyncio.get_running_loop()
+            self._pending = loop.run_in_executor(None, self._refresh_if_changed, loop)
+        if self._checked_at is None:
+            await asyncio.shield(self._pending)
+
+    def extract(self, user_message: str) -> Dict:
+        """Extract intent, entities and a confidence score without an LLM"""
+        matcher, model_makes, _ = self._catalog
+        text = normalize_text(user_message)
+        entities: Dict = {}
+
+        # One pass over the message finds every make/model/body/fuel term
+        found: Dict[str, List[str]] = {"make": [], "model": [], "body_type": [], "fuel_type": []}
+        for _, _, kind, value in matcher.find(text):
+            found[kind].append(value)
+
+        makes_found = set(found["make"])
+        models_found = self._filter_models(found["model"], makes_found, model_makes)
+
+        if found["make"]:
+            entities["make"] = found["make"][0]
+        if models_found:
+            entities["model"] = models_found[0]
+            implied_make = model_makes.get(entities["model"])
+            if implied_make and "make" not in entities:
+                entities["make"] = implied_make
+        if found["body_type"]:
+            entities["body_type"] = found["body_type"][0]
+        if found["fuel_type"]:
+            entities["fuel_type"] = found["fuel_type"][0]
+
+        price_text = self._extract_year(text, entities)
+        self._extract_prices(price_text, entities)
+
+        intent, keyword_hit = self._detect_intent(text, entities)
+
+        # Confidence: how much of the request we could account for
+        if not entities:
+            is_greeting = _has_keyword(text, GREETINGS, whole_word=True) and len(text.split()) <= 4
+            confidence = 0.9 if is_greeting else 0.3
+        else:
+            confidence = 0.6 + 0.1 * min(len(entities), 3)
+            if keyword_hit:
+                confidence += 0.15
+            if len(makes_found) > 1 or len(set(models_found)) > 1:
+                confidence -= 0.3  # comparisons need the LLM
+            if len(text.split()) > 12:
+                confidence -= 0.2  # long free-form requests likely carry more than we parsed
+        confidence = round(max(0.0, min(confidence, 0.95)), 2)
+
+        return {
+            "intent": intent,
+            "entities": entities,
+            "confidence": confidence
+        }
+
+    def _filter_models(self, models: List[str], makes_found: Set[str],
+                       model_makes: Dict[str, Optional[str]]) -> List[str]:
+        """Short numeric model names (e.g. Mazda "3") only count next to their make"""
+        return [
+            model for model in models
+            if not (len(model) <= 2 or model.isdigit()) or model_makes.get(model) in makes_found
+        ]
+
+    def _extract_year(self, text: str, entities: Dict) -> str:
+        """Pull a model year out of the text and return the rest for price parsing"""
+        match = _YEAR.search(text)
+        if not match:
+            return text
+        # "2024 هزار" is a price, not a year
+        following = text[match.end():match.end() + 8].strip()
+        if _UNIT_AHEAD.match(following):
+            return text
+        entities["year"] = int(match.group(1))
+        return text[:match.start()] + " " + text[match.end():]
+
+    def _extract_prices(self, text: str, entities: Dict):
+        """Price ranges, upper and lower bounds"""
+        match = _RANGE.search(text)
+        if match:
+            low_unit = match.group(2) or match.group(4)
+            high_unit = match.group(4) or match.group(2)
+            low = _to_price(match.group(1), low_unit)
+            high = _to_price(match.group(3), high_unit)
+            entities["min_price"], entities["max_price"] = min(low, high), max(low, high)
+            return
+
+        match = _MAX.search(text)
+        if match:
+            entities["max_price"] = _to_price(match.group(1), match.group(2))
+        match = _MIN.search(text)
+        if match:
+            entities["min_price"] = _to_price(match.group(1), match.group(2))
+        if "max_price" in entities or "min_price" in entities:
+            return
+
+        # A bare amount ("۴۰ هزار") is treated as a budget ceiling
+        match = _BARE.search(text)
+        if match:
+            unit = match.group(2)
+            entities["max_price"] = _to_price(match.group(1), unit if unit in _UNIT_MULTIPLIERS else None)
+
+    def _detect_intent(self, text: str, entities: Dict) -> Tuple[str, bool]:
+        for intent, keywords in INTENT_KEYWORDS:
+            if _has_keyword(text, keywords):
+                return intent, True
+        # Naming a car without a question word is still a search
+        return ("search" if entities else "general"), False
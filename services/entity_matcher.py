@@ -0,0 +1,134 @@
+# services/entity_matcher.py
+from collections import deque
+from typing import Dict, List, Optional, Tuple
+
+Match = Tuple[int, int, str, str]  # (start, end, kind, value)
+
+class _Node:
+    __slots__ = ("children", "fail", "output_link", "outputs", "depth")
+
+    def __init__(self, depth: int = 0):
+        self.depth = depth  # length of the pattern prefix ending here
+        self.children: Dict[str, "_Node"] = {}
+        self.fail: Optional["_Node"] = None
+        self.output_link: Optional["_Node"] = None  # nearest suffix node with outputs
+        self.outputs: Dict[str, str] = {}  # kind -> canonical value
+
+def _is_word_char(ch: str) -> bool:
+    return ch.isalnum() or ch == "_"
+
+class EntityMatcher:
+    """Aho–Corasick automaton matching every catalog term in one pass over the text"""
+
+    def __init__(self):
+        self.root = _Node()
+        self._terms: Dict[Tuple[str, str], str] = {}
+        self._dirty = False
+
+    def __len__(self) -> int:
+        return len(self._terms)
+
+    def add(self, pattern: str, kind: str, value: str):
+        """Insert a (normalized) pattern; links are rebuilt lazily on next search"""
+        if not pattern:
+            return
+        node = self.root
+        for depth, ch in enumerate(pattern, 1):
+            child = node.children.get(ch)
+            if child is None:
+                child = _Node(depth)
+                node.children[ch] = child
+                self._dirty = True
+            node = child
+        node.outputs[kind] = value
+        self._terms[(pattern, kind)] = value
+        self._dirty = True
+
+    def remove(self, pattern: str, kind: str):
+        """Drop a pattern's output; trie nodes are kept for reuse"""
+        node = self.root
+        for ch in pattern:
+            node = node.children.get(ch)
+            if node is None:
+                return
+        node.outputs.pop(kind, None)
+        self._terms.pop((pattern, kind), None)
+        self._dirty = True
+
+    def sync(self, terms: Dict[Tuple[str, str], str]) -> Tuple[int, int]:
+        """Apply only the difference to a desired {(pattern, kind): value} set.
+        Links are built before returning, so searches never mutate the automaton."""
+        removed = [key for key in self._terms if key not in terms]
+        for pattern, kind in removed:
+            self.remove(pattern, kind)
+        added = 0
+        for (pattern, kind), value in terms.items():
+            if self._terms.get((pattern, kind)) != value:
+                self.add(pattern, kind, value)
+                added += 1
+        if self._dirty:
+            self._build_links()
+        return added, len(removed)
+
+    def terms(self) -> Dict[Tuple[str, str], str]:
+        return dict(self._terms)
+
+    def _build_links(self):
+        """Breadth-first computation of failure and output links"""
+        queue = deque()
+        for child in self.root.children.values():
+            child.fail = self.root
+            child.output_link = None
+            queue.append(child)
+
+        while queue:
+            node = queue.popleft()
+            for ch, child in node.children.items():
+                fail = node.fail
+                while fail is not None and ch not in fail.children:
+                    fail = fail.fail
+                child.fail = fail.children[ch] if fail is not None else self.root
+                child.output_link = child.fail if child.fail.outputs else child.fail.output_link
+                queue.append(child)
+
+        self._dirty = False
+
+    def find_all(self, text: str) -> List[Match]:
+        """All whole-word matches, overlapping ones included"""
+        if self._dirty:
+            self._build_links()
+
+        matches: List[Match] = []
+        node = self.root
+        length = len(text)
+        for i, ch in enumerate(text):
+            while node is not self.root and ch not in node.children:
+                node = node.fail
+            node = node.children.get(ch, self.root)
+
+            hit = node if node.outputs else node.output_link
+            while hit is not None:
+                end = i + 1
+                start = end - hit.depth
+                if (start == 0 or not _is_word_char(text[start - 1])) and \
+                        (end == length or not _is_word_char(text[end])):
+                    for kind, value in hit.outputs.items():
+                        matches.append((start, end, kind, value))
+                hit = hit.output_link
+        return matches
+
+    def find(self, text: str) -> List[Match]:
+        """Longest non-overlapping matches, in text order"""
+        chosen: List[Match] = []
+        taken: List[Tuple[int, int]] = []
+        for match in sorted(self.find_all(text), key=lambda m: (m[0] - m[1], m[0])):
+            start, end = match[0], match[1]
+            if any(start < t_end and t_start < end for t_start, t_end in taken):
+                # Same span, different kind (e.g. a name that is both make and model)
+                if (start, end) not in taken:
+                    continue
+            else:
+                taken.append((start, end))
+            chosen.append(match)
+        chosen.sort()
+        return chosen
@@ -0,0 +1,20 @@
+# services/json_utils.py
+import json
+from typing import Any
+
+try:
+    import orjson
+except ImportError:  # optional: fall back to the standard library encoder
+    orjson = None
+
+def dumps(obj: Any) -> bytes:
+    """Compact UTF-8 JSON (Persian text is not escaped)"""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+def loads(data):
+    """Parse JSON from str or bytes"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
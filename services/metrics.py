@@ -0,0 +1,323 @@
+# services/metrics.py - In-process latency histograms and counters, exported on /metrics
+#
+# Prometheus text format without the client library. Every worker process keeps its
+# own registry; with SHARED_STATE_DIR set, each worker also writes a snapshot to
+# <dir>/metrics/<pid>.json and /metrics on any worker reports all of them merged.
+import os
+import glob
+import json
+import time
+import bisect
+import functools
+import threading
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Sequence, Tuple
+
+# Seconds; spans from a cached SQLite lookup to a slow LLM call
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+def _label_text(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _number(value: float) -> str:
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+def _render_histogram(name: str, help: str, labelnames: Sequence[str], buckets: Sequence[float],
+                      series: Dict[Tuple, List]) -> List[str]:
+    """series: label values -> [per-bucket counts (+Inf last), sum]"""
+    lines = [f"# HELP {name} {help}", f"# TYPE {name} histogram"]
+    bounds = [_number(b) for b in buckets] + ["+Inf"]
+    for key, (counts, total) in sorted(series.items()):
+        running = 0
+        for bound, count in zip(bounds, counts):
+            running += count
+            labels = _label_text(labelnames, key, f'le="{bound}"')
+            lines.append(f"{name}_bucket{labels} {running}")
+        labels = _label_text(labelnames, key)
+        lines.append(f"{name}_sum{labels} {total:.6f}")
+        lines.append(f"{name}_count{labels} {running}")
+    return lines
+
+def _render_values(name: str, help: str, kind: str, labelnames: Sequence[str],
+                   values: Dict[Tuple, float]) -> List[str]:
+    lines = [f"# HELP {name} {help}", f"# TYPE {name} {kind}"]
+    for key, value in sorted(values.items()):
+        lines.append(f"{name}{_label_text(labelnames, key)} {_number(value)}")
+    return lines
+
+class Histogram:
+    """Cumulative-bucket latency histogram per label combination (thread-safe)"""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        # label values -> [per-bucket counts (+Inf last), sum]
+        self._series: Dict[Tuple, List] = {}
+
+    def observe(self, value: float, **labels):
+        key = tuple(labels[name] for name in self.labelnames)
+        slot = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][slot] += 1
+            series[1] += value
+
+    @contextmanager
+    def time(self, **labels) -> Iterator[None]:
+        """Observe how long the block took (also when it raises)"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def timed(self, **labels) -> Callable:
+        """Decorator form of time() for blocking functions"""
+        def decorate(fn):
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return fn(*args, **kwargs)
+                finally:
+                    self.observe(time.perf_counter() - start, **labels)
+            return wrapper
+        return decorate
+
+    def samples(self) -> Dict[Tuple, Dict]:
+        """count, sum and cumulative bucket counts per label combination"""
+        with self._lock:
+            series = {key: (list(counts), total) for key, (counts, total) in self._series.items()}
+        result = {}
+        for key, (counts, total) in series.items():
+            cumulative, running = [], 0
+            for count in counts:
+                running += count
+                cumulative.append(running)
+            result[key] = {"count": running, "sum": total, "buckets": cumulative}
+        return result
+
+    def _raw(self) -> Dict[Tuple, List]:
+        with self._lock:
+            return {key: [list(counts), total] for key, (counts, total) in self._series.items()}
+
+    def render(self) -> List[str]:
+        return _render_histogram(self.name, self.help, self.labelnames, self.buckets, self._raw())
+
+    def export(self) -> Dict:
+        return {"kind": self.kind, "help": self.help, "labelnames": self.labelnames,
+                "buckets": self.buckets, "series": [[key, value] for key, value in self._raw().items()]}
+
+class Counter:
+    """Monotonic counter per label combination (thread-safe)"""
+
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values: Dict[Tuple, float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(labels[name] for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> List[str]:
+        with self._lock:
+            values = dict(self._values)
+        return _render_values(self.name, self.help, self.kind, self.labelnames, values)
+
+    def export(self) -> Dict:
+        with self._lock:
+            series = [[key, value] for key, value in self._values.items()]
+        return {"kind": self.kind, "help": self.help, "labelnames": self.labelnames, "series": series}
+
+class CallbackMetric:
+    """Counter or gauge read at scrape time from stats the services already keep"""
+
+    def __init__(self, name: str, help: str, kind: str, labelnames: Sequence[str],
+                 collect: Callable[[], Dict[Tuple, float]]):
+        self.name = name
+        self.help = help
+        self.kind = kind
+        self.labelnames = tuple(labelnames)
+        self.collect = collect
+
+    def render(self) -> List[str]:
+        return _render_values(self.name, self.help, self.kind, self.labelnames, self.collect())
+
+    def export(self) -> Dict:
+        return {"kind": self.kind, "help": self.help, "labelnames": self.labelnames,
+                "series": [[key, value] for key, value in self.collect().items()]}
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: Dict[str, object] = {}
+
+    def _add(self, metric):
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def histogram(self, name: str, help: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._add(Histogram(name, help, labelnames, buckets))
+
+    def counter(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._add(Counter(name, help, labelnames))
+
+    def callback(self, name: str, help: str, kind: str, labelnames: Sequence[str],
+                 collect: Callable[[], Dict[Tuple, float]]) -> CallbackMetric:
+        """collect() returns {label values: value}; kind is "counter" or "gauge" """
+        return self._add(CallbackMetric(name, help, kind, labelnames, collect))
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._metrics
+
+    def get(self, name: str):
+        return self._metrics[name]
+
+    def render(self) -> str:
+        """Every metric in Prometheus text exposition format"""
+        lines = []
+        for metric in self._metrics.values():
+            try:
+                lines += metric.render()
+            except Exception as e:  # one broken stats source must not hide the rest
+                lines.append(f"# {metric.name} unavailable: {_escape(e)}")
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self) -> Dict:
+        """This process's metrics as JSON-ready data (call on the event loop: callbacks
+        read service state)"""
+        metrics = {}
+        for name, metric in self._metrics.items():
+            try:
+                metrics[name] = metric.export()
+            except Exception:
+                continue  # reported as unavailable by this worker's own render()
+        return {"pid": os.getpid(), "metrics": metrics}
+
+def write_snapshot(directory: str, snapshot: Dict):
+    """Publish a worker's snapshot atomically as <directory>/<pid>.json"""
+    path = os.path.join(directory, f"{snapshot['pid']}.json")
+    with open(f"{path}.tmp", "w") as f:
+        json.dump(snapshot, f)
+    os.replace(f"{path}.tmp", path)
+
+def _alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+def render_shared(directory: str, own: Dict) -> str:
+    """All live workers' snapshots merged: histograms and counters summed, gauges
+    labelled by worker pid. Snapshots of exited workers are deleted, so their counts
+    drop out (Prometheus treats that as a counter reset)."""
+    snapshots = [own]
+    for path in glob.glob(os.path.join(directory, "*.json")):
+        try:
+            pid = int(os.path.basename(path)[:-len(".json")])
+        except ValueError:
+            continue
+        if pid == own["pid"]:
+            continue
+        if not _alive(pid):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            continue
+        try:
+            with open(path) as f:
+                snapshots.append(json.load(f))
+        except (OSError, ValueError):
+            continue  # being replaced right now; next scrape has it
+
+    merged: Dict[str, Dict] = {}
+    for snapshot in snapshots:
+        for name, metric in snapshot["metrics"].items():
+            target = merged.setdefault(name, {**metric, "series": {}})
+            gauge = metric["kind"] == "gauge"
+            if gauge:
+                target["labelnames"] = list(metric["labelnames"]) + ["worker"]
+            for key, value in metric["series"]:
+                key = tuple(key) + ((str(snapshot["pid"]),) if gauge else ())
+                if metric["kind"] == "histogram":
+                    counts, total = target["series"].get(key, [[0] * len(value[0]), 0.0])
+                    target["series"][key] = [[a + b for a, b in zip(counts, value[0])], total + value[1]]
+                else:
+                    target["series"][key] = target["series"].get(key, 0) + value
+
+    lines = []
+    for name, metric in merged.items():
+        if metric["kind"] == "histogram":
+            lines += _render_histogram(name, metric["help"], metric["labelnames"], metric["buckets"],
+                                       metric["series"])
+        else:
+            lines += _render_values(name, metric["help"], metric["kind"], metric["labelnames"],
+                                    metric["series"])
+    return "\n".join(lines) + "\n"
+
+REGISTRY = MetricsRegistry()
+
+# Shared by the modules that record them
+STAGE_SECONDS = REGISTRY.histogram(
+    "chat_stage_seconds", "Time spent in each stage of the chat pipeline", ("stage",))
+HTTP_SECONDS = REGISTRY.histogram(
+    "http_request_seconds", "Request latency by endpoint and status", ("endpoint", "method", "status"))
+DB_QUERY_SECONDS = REGISTRY.histogram(
+    "db_query_seconds", "CarRepository query time (on the calling thread)", ("query",))
+LLM_CALL_SECONDS = REGISTRY.histogram(
+    "llm_call_seconds", "Azure OpenAI call latency, retries included", ("purpose", "outcome"))
+LLM_TOKENS = REGISTRY.counter(
+    "llm_tokens_total", "Tokens reported by the API's usage field", ("purpose", "kind"))
+
+class MetricsMiddleware:
+    """ASGI middleware timing every HTTP request into HTTP_SECONDS.
+    Labels by endpoint function name so path parameters don't explode the series."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        start = time.perf_counter()
+        status = [500]
+
+        async def send_with_status(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            endpoint = scope.get("endpoint")
+            name = getattr(endpoint, "__name__", type(endpoint).__name__) if endpoint is not None else "unmatched"
+            HTTP_SECONDS.observe(time.perf_counter() - start, endpoint=name,
+                                 method=scope["method"], status=str(status[0]))
@@ -0,0 +1,145 @@
+# services/prompt_builder.py
+import os
+from typing import Dict, List, Optional
+
+try:
+    import tiktoken
+    _ENCODING = tiktoken.get_encoding("o200k_base")
+except Exception:  # optional: not installed, or the encoding file can't be fetched
+    _ENCODING = None
+
+# Token budgets for the dynamic part of each prompt
+PROMPT_CAR_TOKEN_BUDGET = int(os.getenv('PROMPT_CAR_TOKEN_BUDGET', '120'))
+PROMPT_MESSAGE_TOKEN_BUDGET = int(os.getenv('PROMPT_MESSAGE_TOKEN_BUDGET', '200'))
+PROMPT_MAX_CARS = int(os.getenv('PROMPT_MAX_CARS', '3'))
+PROMPT_HISTORY_TOKEN_BUDGET = int(os.getenv('PROMPT_HISTORY_TOKEN_BUDGET', '300'))
+
+# Static system prompts: byte-for-byte identical on every call so the
+# provider can reuse the cached prefix; everything per-request goes after them
+INTENT_SYSTEM_PROMPT = """تو دستیار نمایندگی ماشین هستی. از پیام کاربر intent و entities رو استخراج کن و فقط JSON برگردون:
+{"intent":"price_inquiry|search|specs|finance|general","entities":{"make":"","model":"","year":0,"max_price":0,"min_price":0,"body_type":""},"confidence":0.0}
+فقط entityهایی رو بذار که کاربر گفته. confidence بین 0 تا 1.
+مثال‌ها:
+"قیمت کمری چقدره؟" -> {"intent":"price_inquiry","entities":{"make":"Toyota","model":"Camry"},"confidence":0.9}
+"BMW زیر ۵۰ هزار دارین؟" -> {"intent":"search","entities":{"make":"BMW","max_price":50000},"confidence":0.9}
+"ماشین خانوادگی میخوام" -> {"intent":"search","entities":{"body_type":"SUV"},"confidence":0.8}"""
+
+RESPONSE_SYSTEM_PROMPT = """تو مشاور فروش نمایندگی ماشین هستی. یک پاسخ طبیعی و دوستانه به فارسی بنویس که:
+- مفید و مرتبط باشه
+- اگه ماشین پیدا شده، معرفی کن
+- اگه پیدا نشده، گزینه‌های دیگه پیشنهاد بده
+- سوال بعدی بپرس تا بتونی بهتر کمک کنی
+- حداکثر 100 کلمه"""
+
+def estimate_tokens(text: str) -> int:
+    """Token count with tiktoken, or a chars-per-token estimate (Persian packs fewer chars per token)"""
+    if _ENCODING is not None:
+        return len(_ENCODING.encode(text))
+    ascii_chars = sum(1 for ch in text if ch < "\x80")
+    return (ascii_chars + 3) // 4 + (len(text) - ascii_chars + 1) // 2
+
+def trim_to_budget(text: str, budget: int) -> str:
+    """Cut text down to roughly budget tokens"""
+    if estimate_tokens(text) <= budget:
+        return text
+    low, high = 0, len(text)
+    while low < high:
+        mid = (low + high + 1) // 2
+        if estimate_tokens(text[:mid]) <= budget:
+            low = mid
+        else:
+            high = mid - 1
+    return text[:low].rstrip() + "…"
+
+def cars_context(cars: List, budget: int = PROMPT_CAR_TOKEN_BUDGET,
+                 max_cars: int = PROMPT_MAX_CARS) -> str:
+    """One line per car, best match first, stopping at the token budget"""
+    lines, used = [], 0
+    for car in cars[:max_cars]:
+        line = f"- {car.make} {car.model} {car.year}: ${car.price:,}"
+        cost = estimate_tokens(line) + 1
+        if lines and used + cost > budget:
+            break
+        lines.append(line)
+        used += cost
+    return "\n".join(lines)
+
+def intent_messages(user_message: str) -> List[Dict[str, str]]:
+    """Chat messages for intent/entity extraction"""
+    return [
+        {"role": "system", "content": INTENT_SYSTEM_PROMPT},
+        {"role": "user", "content": trim_to_budget(user_message, PROMPT_MESSAGE_TOKEN_BUDGET)}
+    ]
+
+def history_messages(context: Optional[Dict], budget: int = PROMPT_HISTORY_TOKEN_BUDGET) -> List[Dict[str, str]]:
+    """Most recent session turns that fit the budget, oldest first; earlier turns
+    are represented only by the entity summary in the user turn"""
+    if not context:
+        return []
+    messages, used = [], 0
+    for user_text, reply in reversed(context.get("turns", [])):
+        cost = estimate_tokens(user_text) + estimate_tokens(reply) + 8
+        if used + cost > budget:
+            break
+        messages[:0] = [{"role": "user", "content": user_text}, {"role": "assistant", "content": reply}]
+        used += cost
+    return messages
+
+def entity_summary(context: Optional[Dict]) -> str:
+    """Filters gathered over the conversation, e.g. make=Toyota، max_price=50000"""
+    entities = (context or {}).get("entities") or {}
+    return "، ".join(f"{key}={value}" for key, value in entities.items())
+
+def response_messages(intent: str, cars: List, user_message: str,
+                      context: Optional[Dict] = None) -> List[Dict[str, str]]:
+    """Chat messages for the Persian answer about the matched cars"""
+    cars_text = cars_context(cars)
+    user_message = trim_to_budget(user_message, PROMPT_MESSAGE_TOKEN_BUDGET)
+    summary = entity_summary(context)
+    return [
+        {"role": "system", "content": RESPONSE_SYSTEM_PROMPT},
+        *history_messages(context),
+        {"role": "user", "content": (
+            (f"فیلترهای گفتگو تا اینجا: {summary}\n" if summary else "")
+            + f'کاربر پرسید: "{user_message}"\n'
+            f"Intent: {intent}\n"
+            f"ماشین‌های پیدا شده:\n{cars_text if cars_text else 'هیچ ماشینی پیدا نشد'}"
+        )}
+    ]
+
+# Single-call mode: the answer prompt plus a search_cars tool the model may call
+# when the speculatively retrieved cars don't fit the question
+TOOL_SYSTEM_PROMPT = RESPONSE_SYSTEM_PROMPT + """
+ماشین‌های پیدا شده با یک جستجوی اولیه از روی پیام کاربر انتخاب شدن.
+اگه به سوال کاربر نمی‌خورن یا جستجو چیزی پیدا نکرده، ابزار search_cars رو با فیلترهای درست صدا بزن؛ وگرنه مستقیم جواب بده."""
+
+SEARCH_CARS_TOOL = {
+    "type": "function",
+    "function": {
+        "name": "search_cars",
+        "description": "Search the dealership inventory. Only pass filters the user asked for.",
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "make": {"type": "string", "description": "Brand in English, e.g. Toyota"},
+                "model": {"type": "string", "description": "Model in English, e.g. Camry"},
+                "year": {"type": "integer"},
+                "max_price": {"type": "number", "description": "AUD"},
+                "min_price": {"type": "number", "description": "AUD"},
+                "body_type": {"type": "string", "enum": ["Sedan", "SUV", "Hatchback", "Ute"]},
+                "fuel_type": {"type": "string", "enum": ["Petrol", "Diesel", "Hybrid", "Electric"]}
+            }
+        }
+    }
+}
+
+def tool_messages(intent: str, cars: List, user_message: str,
+                  context: Optional[Dict] = None) -> List[Dict[str, str]]:
+    """Chat messages for single-call mode: the answer prompt with the tool instructions"""
+    messages = response_messages(intent, cars, user_message, context)
+    messages[0] = {"role": "system", "content": TOOL_SYSTEM_PROMPT}
+    return messages
+
+def tool_result(cars: List) -> str:
+    """search_cars tool output handed back to the model"""
+    return cars_context(cars) or "هیچ ماشینی پیدا نشد"
@@ -0,0 +1,180 @@
+# services/query_cache.py
+import os
+import copy
+import json
+import time
+import asyncio
+import sqlite3
+import threading
+import logging
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Optional
+from services.shared_state import shared_state_path
+
+log = logging.getLogger(__name__)
+
+class SQLiteCacheBackend:
+    """Persistent second-tier cache shared by every worker using the same file.
+    Expired entries are purged every 200 writes, and the table is capped at
+    max_rows (the entries written longest ago go first)."""
+
+    def __init__(self, db_path: str, table: str = "query_cache", max_rows: int = 100000):
+        self.db_path = db_path
+        self.table = table
+        self.max_rows = max_rows
+        self._lock = threading.Lock()
+        self._writes = 0
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, timeout=5)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(f'''
+            CREATE TABLE IF NOT EXISTS {table} (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                expires_at REAL NOT NULL
+            )
+        ''')
+        self._conn.commit()
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT value, expires_at FROM {self.table} WHERE key = ?", (key,)
+            ).fetchone()
+        if not row or row[1] < time.time():
+            return None
+        return json.loads(row[0])
+
+    def set(self, key: str, value: Any, ttl: float):
+        with self._lock:
+            self._conn.execute(
+                f"INSERT OR REPLACE INTO {self.table} (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, json.dumps(value, ensure_ascii=False), time.time() + ttl)
+            )
+            self._writes += 1
+            if self._writes % 200 == 0:
+                self._purge()
+            self._conn.commit()
+
+    def purge_expired(self):
+        with self._lock:
+            self._purge()
+            self._conn.commit()
+
+    def _purge(self):
+        self._conn.execute(f"DELETE FROM {self.table} WHERE expires_at < ?", (time.time(),))
+        # REPLACE gives a row a new rowid, so low rowids are the oldest writes
+        self._conn.execute(f'''
+            DELETE FROM {self.table} WHERE rowid <= (
+                SELECT rowid FROM {self.table} ORDER BY rowid DESC LIMIT 1 OFFSET ?
+            )
+        ''', (self.max_rows,))
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+class QueryCache:
+    """In-process LRU with TTL, optionally backed by a SQLite table that is read and
+    written on a dedicated thread, off the event loop"""
+
+    def __init__(self, max_size: int = 1000, ttl: float = 3600,
+                 backend: Optional[SQLiteCacheBackend] = None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.backend = backend
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="query-cache") if backend else None
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.backend_hits = 0
+        self.misses = 0
+
+    @classmethod
+    def from_env(cls) -> "QueryCache":
+        """Build the cache from QUERY_CACHE_* environment variables"""
+        backend = None
+        db_path = os.getenv('QUERY_CACHE_DB') or shared_state_path("state.db")
+        if db_path:
+            try:
+                backend = SQLiteCacheBackend(
+                    db_path, max_rows=int(os.getenv('QUERY_CACHE_DB_MAX_ROWS', '100000')))
+            except sqlite3.Error as e:
+                log.warning(f"⚠️  Query cache backend disabled: {e}")
+        return cls(
+            max_size=int(os.getenv('QUERY_CACHE_SIZE', '1000')),
+            ttl=float(os.getenv('QUERY_CACHE_TTL', '3600')),
+            backend=backend
+        )
+
+    async def _run_backend(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+
+    async def get(self, key: str) -> Optional[Dict]:
+        """Return a copy of the cached value, or None"""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at >= now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return copy.deepcopy(value)
+                del self._entries[key]
+
+        if self.backend is not None:
+            try:
+                value = await self._run_backend(self.backend.get, key)
+            except sqlite3.Error as e:
+                log.warning(f"⚠️  Query cache backend read failed: {e}")
+                value = None
+            if value is not None:
+                self._store(key, value)
+                with self._lock:
+                    self.backend_hits += 1
+                return copy.deepcopy(value)
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    async def set(self, key: str, value: Dict):
+        """Cache a value in memory and in the backend"""
+        value = copy.deepcopy(value)
+        self._store(key, value)
+        if self.backend is not None:
+            try:
+                await self._run_backend(self.backend.set, key, value, self.ttl)
+            except sqlite3.Error as e:
+                log.warning(f"⚠️  Query cache backend write failed: {e}")
+
+    def _store(self, key: str, value: Dict):
+        with self._lock:
+            self._entries[key] = (time.time() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def close(self):
+        if self.backend is not None:
+            self._executor.shutdown(wait=True)
+            self.backend.close()
+
+    def stats(self) -> Dict:
+        """Hit/miss counters for monitoring"""
+        with self._lock:
+            lookups = self.hits + self.backend_hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "backend_hits": self.backend_hits,
+                "misses": self.misses,
+                "hit_ratio": round((self.hits + self.backend_hits) / lookups, 3) if lookups else 0.0,
+                "backend": "sqlite" if self.backend is not None else None
+            }
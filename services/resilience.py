@@ -0,0 +1,161 @@
+# services/resilience.py
+import time
+import random
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Awaitable, Callable, Dict, Optional, TypeVar
+
+log = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a dependency the breaker has cut off"""
+
+class SlotTimeoutError(Exception):
+    """No limiter slot freed up in time: local backpressure, not a dependency failure"""
+
+class CircuitBreaker:
+    """closed -> open after consecutive failures; open -> half_open after reset_timeout,
+    where a few probe calls decide between closed and open again"""
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 15.0, half_open_probes: int = 1):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.half_open_probes = half_open_probes
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probes = 0
+        self.rejected = 0
+        self.trips = 0
+
+    def _now(self) -> float:
+        return asyncio.get_running_loop().time()
+
+    def allow(self) -> bool:
+        """Whether a call may go out now (counts a half-open probe when it does)"""
+        now = self._now()
+        if self.state == "open" and now - self.opened_at >= self.reset_timeout:
+            self.state = "half_open"
+            self._probes = 0
+        if self.state == "closed":
+            return True
+        if self.state == "half_open":
+            # A probe that never reported back (cancelled caller) frees its slot after reset_timeout
+            if self._probes >= self.half_open_probes and now - self.opened_at >= 2 * self.reset_timeout:
+                self.opened_at = now - self.reset_timeout
+                self._probes = 0
+            if self._probes < self.half_open_probes:
+                self._probes += 1
+                return True
+        self.rejected += 1
+        return False
+
+    def is_open(self) -> bool:
+        """Rejecting calls right now; `state` only leaves "open" on the next allow()"""
+        return self.state == "open" and self._now() - self.opened_at < self.reset_timeout
+
+    def record_success(self):
+        self.failures = 0
+        if self.state == "half_open":
+            log.info("✅ Circuit breaker closed")
+        self.state = "closed"
+
+    def record_failure(self):
+        self.failures += 1
+        if self.state == "half_open" or self.failures >= self.failure_threshold:
+            if self.state != "open":
+                self.trips += 1
+                log.warning(f"⚠️  Circuit breaker open for {self.reset_timeout:.0f}s after {self.failures} failures")
+            self.state = "open"
+            self.opened_at = self._now()
+
+    def stats(self) -> Dict:
+        return {
+            "state": self.state,
+            "consecutive_failures": self.failures,
+            "trips": self.trips,
+            "rejected": self.rejected
+        }
+
+class AdaptiveLimiter:
+    """Concurrency limit that grows by one per window of fast calls and
+    shrinks multiplicatively when calls get slow or are throttled (AIMD).
+    A burst of slow completions shrinks it once: further decreases wait until
+    calls started under the reduced limit can have finished (target_latency)."""
+
+    def __init__(self, max_limit: int = 64, min_limit: int = 2, target_latency: float = 5.0,
+                 backoff: float = 0.7):
+        self.max_limit = max_limit
+        self.min_limit = min_limit
+        self.target_latency = target_latency
+        self.backoff = backoff
+        self.limit = float(max_limit)
+        self.in_flight = 0
+        self._decreased_at: Optional[float] = None
+        self._cond: Optional[asyncio.Condition] = None
+
+    def _condition(self) -> asyncio.Condition:
+        # Created lazily, inside the running event loop
+        if self._cond is None:
+            self._cond = asyncio.Condition()
+        return self._cond
+
+    @asynccontextmanager
+    async def slot(self, timeout: Optional[float] = None) -> AsyncIterator[None]:
+        """Hold one concurrency slot; SlotTimeoutError if none frees up in time"""
+        cond = self._condition()
+        async with cond:
+            try:
+                await asyncio.wait_for(cond.wait_for(lambda: self.in_flight < int(self.limit)), timeout)
+            except asyncio.TimeoutError:
+                raise SlotTimeoutError(f"No concurrency slot within {timeout:.1f}s "
+                                       f"({self.in_flight} in flight, limit {int(self.limit)})") from None
+            self.in_flight += 1
+        try:
+            yield
+        finally:
+            async with cond:
+                self.in_flight -= 1
+                cond.notify_all()
+
+    def record(self, latency: float, overloaded: bool = False):
+        """Adjust the limit after a call"""
+        if overloaded or latency > self.target_latency:
+            now = time.monotonic()
+            if self._decreased_at is None or now - self._decreased_at >= self.target_latency:
+                self.limit = max(self.min_limit, self.limit * self.backoff)
+                self._decreased_at = now
+        else:
+            self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+
+    def stats(self) -> Dict:
+        return {
+            "limit": int(self.limit),
+            "in_flight": self.in_flight,
+            "target_latency": self.target_latency
+        }
+
+async def retry_within_deadline(call: Callable[[float], Awaitable[T]], deadline: float,
+                                is_retryable: Callable[[Exception], bool],
+                                max_attempts: int = 3, base_delay: float = 0.2) -> T:
+    """call(remaining_seconds) until it succeeds, sleeping with full jitter between
+    retryable failures, but never starting an attempt the deadline can't fit"""
+    loop = asyncio.get_running_loop()
+    attempt = 0
+    while True:
+        attempt += 1
+        remaining = deadline - loop.time()
+        if remaining <= 0:
+            raise asyncio.TimeoutError("Deadline exceeded")
+        try:
+            return await call(remaining)
+        except Exception as e:
+            if attempt >= max_attempts or not is_retryable(e):
+                raise
+            delay = random.uniform(0, base_delay * 2 ** (attempt - 1))
+            if loop.time() + delay >= deadline:
+                raise
+            await asyncio.sleep(delay)
@@ -0,0 +1,203 @@
+# services/response_cache.py
+import os
+import asyncio
+import sqlite3
+import hashlib
+import threading
+import logging
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional
+from services.shared_state import shared_state_path
+
+log = logging.getLogger(__name__)
+
+class CachedResponse:
+    """Serialized JSON body for one inventory version"""
+
+    __slots__ = ("version", "body", "etag")
+
+    def __init__(self, version: int, body: bytes):
+        self.version = version
+        self.body = body
+        self.etag = f'"{version}-{hashlib.blake2b(body, digest_size=8).hexdigest()}"'
+
+    def matches(self, if_none_match: Optional[str]) -> bool:
+        """Whether an If-None-Match header already names this body"""
+        if not if_none_match:
+            return False
+        tags = [tag.strip() for tag in if_none_match.split(",")]
+        return "*" in tags or self.etag in tags or f"W/{self.etag}" in tags
+
+class SQLiteResponseBackend:
+    """Serialized responses in a SQLite table, so one worker's build serves them all.
+    Bounded by max_bytes of bodies; the oldest writes are evicted first."""
+
+    def __init__(self, db_path: str, table: str = "response_cache", max_bytes: int = 256 * 1024 * 1024):
+        self.db_path = db_path
+        self.table = table
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._writes = 0
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, timeout=5)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(f'''
+            CREATE TABLE IF NOT EXISTS {table} (
+                key TEXT PRIMARY KEY,
+                version INTEGER NOT NULL,
+                body BLOB NOT NULL
+            )
+        ''')
+        self._conn.commit()
+
+    def get(self, key: str, version: int) -> Optional[bytes]:
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT body FROM {self.table} WHERE key = ? AND version = ?", (key, version)
+            ).fetchone()
+        return row[0] if row else None
+
+    def set(self, key: str, version: int, body: bytes):
+        with self._lock:
+            self._conn.execute(
+                f"INSERT OR REPLACE INTO {self.table} (key, version, body) VALUES (?, ?, ?)",
+                (key, version, body)
+            )
+            self._writes += 1
+            if self._writes % 200 == 0:
+                # Entries of older inventory versions can never be served again
+                self._conn.execute(f"DELETE FROM {self.table} WHERE version < ?", (version,))
+                # REPLACE gives a row a new rowid, so low rowids are the oldest writes
+                self._conn.execute(f'''
+                    DELETE FROM {self.table} WHERE rowid IN (
+                        SELECT rowid FROM (
+                            SELECT rowid, SUM(LENGTH(body)) OVER (ORDER BY rowid DESC) AS newer_bytes
+                            FROM {self.table}
+                        ) WHERE newer_bytes > ?
+                    )
+                ''', (self.max_bytes,))
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+class ResponseCache:
+    """LRU of serialized responses bounded by total bytes, invalidated by inventory version.
+    Backend reads and writes run on a dedicated thread, off the event loop."""
+
+    def __init__(self, max_bytes: int = 32 * 1024 * 1024, backend: Optional[SQLiteResponseBackend] = None):
+        self.max_bytes = max_bytes
+        self.backend = backend
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="response-cache") if backend else None
+        self._entries: "OrderedDict[str, CachedResponse]" = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.backend_hits = 0
+        self.misses = 0
+        self.not_modified = 0
+
+    @classmethod
+    def from_env(cls) -> "ResponseCache":
+        """Build the cache from RESPONSE_CACHE_* environment variables"""
+        backend = None
+        db_path = os.getenv('RESPONSE_CACHE_DB') or shared_state_path("state.db")
+        if db_path:
+            try:
+                backend = SQLiteResponseBackend(
+                    db_path, max_bytes=int(os.getenv('RESPONSE_CACHE_DB_MAX_BYTES', str(256 * 1024 * 1024))))
+            except sqlite3.Error as e:
+                log.warning(f"⚠️  Response cache backend disabled: {e}")
+        return cls(
+            max_bytes=int(os.getenv('RESPONSE_CACHE_MAX_BYTES', str(32 * 1024 * 1024))),
+            backend=backend
+        )
+
+    async def _run_backend(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+
+    async def get(self, key: str, version: int) -> Optional[CachedResponse]:
+        """Cached body for this inventory version, or None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.version == version:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry
+            if entry is not None:
+                # Stale: the inventory moved on since this was built
+                self._remove(key)
+
+        if self.backend is not None:
+            try:
+                body = await self._run_backend(self.backend.get, key, version)
+            except sqlite3.Error as e:
+                log.warning(f"⚠️  Response cache backend read failed: {e}")
+                body = None
+            if body is not None:
+                with self._lock:
+                    self.backend_hits += 1
+                return self._store(key, version, body)
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    async def set(self, key: str, version: int, body: bytes) -> CachedResponse:
+        """Cache a serialized body in memory and in the backend"""
+        if self.backend is not None:
+            try:
+                await self._run_backend(self.backend.set, key, version, body)
+            except sqlite3.Error as e:
+                log.warning(f"⚠️  Response cache backend write failed: {e}")
+        return self._store(key, version, body)
+
+    def _store(self, key: str, version: int, body: bytes) -> CachedResponse:
+        # Bodies larger than the whole cache are not kept in memory
+        entry = CachedResponse(version, body)
+        if len(body) > self.max_bytes:
+            return entry
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = entry
+            self._size += len(body)
+            while self._size > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+        return entry
+
+    def record_not_modified(self):
+        with self._lock:
+            self.not_modified += 1
+
+    def _remove(self, key: str):
+        entry = self._entries.pop(key)
+        self._size -= len(entry.body)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    def stats(self) -> Dict:
+        """Hit/miss counters for monitoring"""
+        with self._lock:
+            lookups = self.hits + self.backend_hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._size,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "backend_hits": self.backend_hits,
+                "misses": self.misses,
+                "not_modified": self.not_modified,
+                "hit_ratio": round((self.hits + self.backend_hits) / lookups, 3) if lookups else 0.0,
+                "backend": "sqlite" if self.backend is not None else None
+            }
+
+    def close(self):
+        if self.backend is not None:
+            self._executor.shutdown(wait=True)
+            self.backend.close()
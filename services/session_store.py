@@ -0,0 +1,235 @@
+# services/session_store.py
+import os
+import re
+import json
+import time
+import uuid
+import asyncio
+import sqlite3
+import threading
+import logging
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+from services.text_utils import normalize_text
+from services.entity_extractor import SEARCH_INTENTS
+from services.shared_state import shared_state_path
+
+log = logging.getLogger(__name__)
+
+# Follow-ups that move the price relative to the cars shown last
+_CHEAPER = re.compile(r"ارز(?:و|ا)ن ?تر|cheaper|less expensive")
+_PRICIER = re.compile(r"گر(?:و|ا)ن ?تر|more expensive|pricier")
+
+class Session:
+    """One conversation: recent turns plus the entity filters gathered so far.
+    Turns that fall out of the window survive only as those filters."""
+
+    def __init__(self, session_id: str, max_turns: int = 6, data: Optional[Dict] = None):
+        data = data or {}
+        self.id = session_id
+        self.max_turns = max_turns
+        self.entities: Dict = data.get("entities", {})
+        self.turns: List[List[str]] = data.get("turns", [])
+        self.compressed_turns: int = data.get("compressed_turns", 0)
+        self.last_prices: List[float] = data.get("last_prices", [])
+
+    def to_dict(self) -> Dict:
+        return {
+            "entities": self.entities,
+            "turns": self.turns,
+            "compressed_turns": self.compressed_turns,
+            "last_prices": self.last_prices
+        }
+
+    def resolve(self, intent: str, entities: Dict, user_message: str) -> Tuple[str, Dict]:
+        """Fill a follow-up's intent and entities from the conversation so far"""
+        text = normalize_text(user_message)
+        entities = dict(entities)
+        relative = False
+        if self.last_prices:
+            if _CHEAPER.search(text) and "max_price" not in entities:
+                entities["max_price"] = min(self.last_prices) - 1
+                relative = True
+            elif _PRICIER.search(text) and "min_price" not in entities:
+                entities["min_price"] = max(self.last_prices) + 1
+                relative = True
+
+        if intent not in SEARCH_INTENTS and not relative:
+            return intent, entities
+
+        merged = dict(self.entities)
+        if entities.get("make") and entities["make"] != merged.get("make"):
+            merged.pop("model", None)  # a new brand makes the old model meaningless
+        if relative:
+            merged.pop("min_price" if "max_price" in entities else "max_price", None)
+        merged.update(entities)
+        self.entities = merged
+        return (intent if intent in SEARCH_INTENTS else "search"), merged
+
+    def record(self, user_message: str, reply: str, cars: List):
+        """Append a turn, folding the oldest ones away beyond max_turns"""
+        self.turns.append([user_message, reply])
+        if len(self.turns) > self.max_turns:
+            self.compressed_turns += len(self.turns) - self.max_turns
+            self.turns = self.turns[-self.max_turns:]
+        if cars:
+            self.last_prices = [car.price for car in cars[:5]]
+
+    def context(self) -> Dict:
+        """What the answer prompt gets: the entity summary and the recent turns"""
+        return {"entities": self.entities, "turns": self.turns}
+
+class InMemorySessionBackend:
+    """LRU of serialized sessions bounded by count and bytes, with idle expiry"""
+
+    def __init__(self, max_sessions: int = 10000, max_bytes: int = 64 * 1024 * 1024, ttl: float = 1800):
+        self.max_sessions = max_sessions
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get(self, session_id: str) -> Optional[Dict]:
+        with self._lock:
+            entry = self._entries.get(session_id)
+            if entry is None:
+                return None
+            if entry[0] + self.ttl < time.time():
+                self._remove(session_id)
+                return None
+            self._entries.move_to_end(session_id)
+            return json.loads(entry[1])
+
+    def set(self, session_id: str, data: Dict):
+        value = json.dumps(data, ensure_ascii=False)
+        with self._lock:
+            if session_id in self._entries:
+                self._remove(session_id)
+            self._entries[session_id] = (time.time(), value)
+            self._size += len(value)
+            while len(self._entries) > self.max_sessions or self._size > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+
+    def _remove(self, session_id: str):
+        _, value = self._entries.pop(session_id)
+        self._size -= len(value)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {"backend": "memory", "sessions": len(self._entries), "bytes": self._size,
+                    "max_sessions": self.max_sessions, "max_bytes": self.max_bytes}
+
+    def close(self):
+        pass
+
+class SQLiteSessionBackend:
+    """Sessions in a SQLite table, shared by every worker using the same file"""
+
+    def __init__(self, db_path: str, ttl: float = 1800, table: str = "chat_sessions"):
+        self.db_path = db_path
+        self.ttl = ttl
+        self.table = table
+        self._lock = threading.Lock()
+        self._writes = 0
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, timeout=5)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(f'''
+            CREATE TABLE IF NOT EXISTS {table} (
+                id TEXT PRIMARY KEY,
+                data TEXT NOT NULL,
+                updated_at REAL NOT NULL
+            )
+        ''')
+        self._conn.commit()
+
+    def get(self, session_id: str) -> Optional[Dict]:
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT data, updated_at FROM {self.table} WHERE id = ?", (session_id,)
+            ).fetchone()
+        if not row or row[1] + self.ttl < time.time():
+            return None
+        return json.loads(row[0])
+
+    def set(self, session_id: str, data: Dict):
+        with self._lock:
+            self._conn.execute(
+                f"INSERT OR REPLACE INTO {self.table} (id, data, updated_at) VALUES (?, ?, ?)",
+                (session_id, json.dumps(data, ensure_ascii=False), time.time())
+            )
+            self._writes += 1
+            if self._writes % 500 == 0:
+                self._conn.execute(f"DELETE FROM {self.table} WHERE updated_at < ?", (time.time() - self.ttl,))
+            self._conn.commit()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            count = self._conn.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+        return {"backend": "sqlite", "sessions": count}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+class SessionStore:
+    """Loads and saves conversation sessions through a pluggable backend.
+    SQLite reads and writes run on a dedicated thread, off the event loop."""
+
+    def __init__(self, backend, max_turns: int = 6):
+        self.backend = backend
+        self.max_turns = max_turns
+        self._executor = (ThreadPoolExecutor(max_workers=1, thread_name_prefix="sessions")
+                          if isinstance(backend, SQLiteSessionBackend) else None)
+
+    @classmethod
+    def from_env(cls) -> "SessionStore":
+        """Build the store from SESSION_* environment variables"""
+        ttl = float(os.getenv('SESSION_TTL', '1800'))
+        backend = None
+        # Shared by all workers, so a follow-up may land on any of them
+        db_path = os.getenv('SESSION_DB') or shared_state_path("state.db")
+        if db_path:
+            try:
+                backend = SQLiteSessionBackend(db_path, ttl=ttl)
+            except sqlite3.Error as e:
+                log.warning(f"⚠️  SQLite session backend disabled: {e}")
+        if backend is None:
+            backend = InMemorySessionBackend(
+                max_sessions=int(os.getenv('SESSION_MAX_SESSIONS', '10000')),
+                max_bytes=int(os.getenv('SESSION_MAX_BYTES', str(64 * 1024 * 1024))),
+                ttl=ttl
+            )
+        return cls(backend, max_turns=int(os.getenv('SESSION_MAX_TURNS', '6')))
+
+    async def _run_backend(self, fn, *args):
+        if self._executor is None:
+            return fn(*args)  # in-memory backend: no I/O to wait for
+        return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+
+    async def load(self, session_id: Optional[str]) -> Session:
+        """The stored session, or a fresh one (new id) when missing or expired"""
+        data = None
+        if session_id:
+            try:
+                data = await self._run_backend(self.backend.get, session_id)
+            except sqlite3.Error as e:
+                log.warning(f"⚠️  Session read failed: {e}")
+        if data is None:
+            session_id = uuid.uuid4().hex
+        return Session(session_id, self.max_turns, data)
+
+    async def save(self, session: Session):
+        try:
+            await self._run_backend(self.backend.set, session.id, session.to_dict())
+        except sqlite3.Error as e:
+            log.warning(f"⚠️  Session write failed: {e}")
+
+    def stats(self) -> Dict:
+        return self.backend.stats()
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+        self.backend.close()
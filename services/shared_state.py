@@ -0,0 +1,12 @@
+# services/shared_state.py
+import os
+from typing import Optional
+
+def shared_state_path(name: str) -> Optional[str]:
+    """Path of a file under SHARED_STATE_DIR, where every worker process keeps the
+    state they share (caches, sessions, inventory snapshots); None when unset"""
+    directory = os.getenv('SHARED_STATE_DIR')
+    if not directory:
+        return None
+    os.makedirs(directory, exist_ok=True)
+    return os.path.join(directory, name)
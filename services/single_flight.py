@@ -0,0 +1,41 @@
+# services/single_flight.py
+import copy
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+class SingleFlight:
+    """Concurrent calls with the same key share one in-flight execution"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+        self.calls = 0
+        self.coalesced = 0
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """Await fn() or, if an identical call is already running, its result.
+        Followers get a deep copy so callers never share mutable results."""
+        task = self._inflight.get(key)
+        if task is None:
+            self.calls += 1
+            # Its own task, so a cancelled caller doesn't cancel the other waiters
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda done: self._forget(key, done))
+            return await asyncio.shield(task)
+
+        self.coalesced += 1
+        return copy.deepcopy(await asyncio.shield(task))
+
+    def _forget(self, key: Hashable, task: asyncio.Future):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+
+    def stats(self) -> Dict:
+        total = self.calls + self.coalesced
+        return {
+            "in_flight": len(self._inflight),
+            "executions": self.calls,
+            "coalesced": self.coalesced,
+            "coalesced_ratio": round(self.coalesced / total, 3) if total else 0.0
+        }
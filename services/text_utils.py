@@ -0,0 +1,35 @@
+# services/text_utils.py
+import re
+
+# Arabic letter variants that Persian keyboards and users mix freely
+_CHAR_MAP = str.maketrans({
+    "ي": "ی",
+    "ى": "ی",
+    "ك": "ک",
+    "ة": "ه",
+    "ۀ": "ه",
+    "أ": "ا",
+    "إ": "ا",
+    "\u200c": " ",  # ZWNJ (نیم‌فاصله)
+    "\u200f": None,  # RTL mark
+    "\u0640": None,  # tatweel
+})
+
+# Persian (۰-۹) and Arabic-Indic (٠-٩) digits to ASCII
+_DIGIT_MAP = str.maketrans("۰۱۲۳۴۵۶۷۸۹٠١٢٣٤٥٦٧٨٩", "01234567890123456789")
+
+_PUNCTUATION = re.compile(r"[؟?!.,،؛;:\"'«»()\[\]]+")
+_WHITESPACE = re.compile(r"\s+")
+
+def normalize_digits(text: str) -> str:
+    """Convert Persian/Arabic digits to ASCII"""
+    return text.translate(_DIGIT_MAP)
+
+def normalize_text(text: str) -> str:
+    """Lowercase, unify Persian letter variants and digits, collapse whitespace"""
+    text = text.lower().translate(_CHAR_MAP).translate(_DIGIT_MAP)
+    return _WHITESPACE.sub(" ", text).strip()
+
+def normalize_message(text: str) -> str:
+    """Normalize a user message into a cache key (also drops punctuation)"""
+    return _WHITESPACE.sub(" ", _PUNCTUATION.sub(" ", normalize_text(text))).strip()
@@ -0,0 +1,16 @@
+# tests/conftest.py - Every test runs against a throwaway copy of the sample database
+import os
+import shutil
+import tempfile
+
+_workdir = tempfile.mkdtemp(prefix="car_tests_")
+# Set before any app module is imported: database.connection reads DB_PATH at import
+os.environ["DB_PATH"] = os.path.join(_workdir, "cars.db")
+shutil.copy(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "cars.db"),
+            os.environ["DB_PATH"])
+
+from database.migrations import migrate  # noqa: E402  (after DB_PATH is set)
+migrate(os.environ["DB_PATH"])
+
+def pytest_sessionfinish(session, exitstatus):
+    shutil.rmtree(_workdir, ignore_errors=True)
@@ -0,0 +1,52 @@
+# tests/test_ai_service.py - AIService against the fake Azure OpenAI server, in process
+import asyncio
+import httpx
+import pytest
+from openai import AsyncAzureOpenAI
+
+from bench import fake_openai_server
+from services.ai_service import AIService
+
+@pytest.fixture
+def ai_service(monkeypatch):
+    monkeypatch.setattr(fake_openai_server, "LATENCY", 0.0)
+    monkeypatch.setattr(fake_openai_server, "ERROR_RATE", 0.0)
+    service = AIService()
+    service._http_client = httpx.AsyncClient(transport=httpx.ASGITransport(app=fake_openai_server.app))
+    service._client = AsyncAzureOpenAI(
+        api_key="test", api_version="2024-12-01-preview", azure_endpoint="http://fake-openai",
+        http_client=service._http_client, max_retries=0
+    )
+    return service
+
+def test_stream_with_usage_records_tokens(ai_service):
+    ai_service.stream_usage = True
+
+    async def stream():
+        tokens = [token async for token in ai_service.stream_response("general", [], "سلام")]
+        await ai_service.aclose()
+        return "".join(tokens)
+
+    reply = asyncio.run(stream())
+    assert reply == fake_openai_server.TEXT_REPLY
+    assert ai_service.breaker.stats()["consecutive_failures"] == 0
+    usage = ai_service.token_usage()["stream"]
+    assert usage["calls"] == 1
+    assert usage["prompt_tokens"] > 0 and usage["completion_tokens"] > 0
+
+def test_breaker_rejections_are_not_llm_calls(ai_service, caplog):
+    async def run():
+        for _ in range(ai_service.breaker.failure_threshold):
+            ai_service.breaker.record_failure()
+        result = await ai_service.process_query("what would you pick for a weekend trip?")
+        reply = await ai_service.generate_response(result["intent"], [], "what would you pick?")
+        await ai_service.aclose()
+        return result, reply
+
+    with caplog.at_level("DEBUG", logger="services.ai_service"):
+        result, reply = asyncio.run(run())
+    assert result["intent"]
+    assert reply
+    stats = ai_service.intent_stats()
+    assert stats["llm_calls"] == 0 and stats["without_llm_ratio"] == 1.0
+    assert not [r for r in caplog.records if r.levelname == "ERROR"]
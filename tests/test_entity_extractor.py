@@ -0,0 +1,47 @@
+# tests/test_entity_extractor.py - Rule-based parsing of prices, years and catalog terms
+import asyncio
+
+import pytest
+
+from services.entity_extractor import EntityExtractor
+
+@pytest.fixture(scope="module")
+def extractor():
+    extractor = EntityExtractor()
+    extractor.refresh()
+    return extractor
+
+@pytest.mark.parametrize("message, expected", [
+    # A word starting with "m" or "k" after the number is not a unit
+    ("show me cars under 40000 made in 2020", {"max_price": 40000.0, "year": 2020}),
+    ("toyota under 40000 mazda", {"max_price": 40000.0}),
+    ("cars 40000 kept well", {}),
+    ("under 30k", {"max_price": 30000.0}),
+    ("30k", {"max_price": 30000.0}),
+    ("between 20k and 35k", {"min_price": 20000.0, "max_price": 35000.0}),
+    ("above 1.5m", {"min_price": 1500000.0}),
+    ("زیر ۴۰ هزار دلار", {"max_price": 40000.0}),
+    ("2024 made", {"year": 2024}),
+])
+def test_prices(extractor, message, expected):
+    entities = extractor.extract(message)["entities"]
+    prices = {key: entities[key] for key in ("min_price", "max_price", "year") if key in entities}
+    assert prices == expected
+
+def test_refresh_swaps_in_the_synced_standby():
+    extractor = EntityExtractor()
+    extractor.refresh()
+    first = extractor.matcher
+    extractor.refresh()
+    second = extractor.matcher
+    # Each refresh syncs the matcher that was swapped out, not a fresh one
+    assert second is not first and extractor._standby is first
+    assert second.terms() == first.terms()
+    extractor.refresh()
+    assert extractor.matcher is first
+
+def test_ensure_current_publishes_on_the_loop():
+    extractor = EntityExtractor()
+    asyncio.run(extractor.ensure_current())
+    assert len(extractor.matcher) > 0
+    assert extractor.extract("toyota corolla")["entities"].get("make") == "Toyota"
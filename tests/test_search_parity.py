@@ -0,0 +1,67 @@
+# tests/test_search_parity.py - The optimized search paths return what the paths they replaced did
+import json
+import random
+import sqlite3
+
+import pytest
+
+from bench.bench_car_rows import compact_fetch, compact_serialize, legacy_fetch, legacy_serialize
+from bench.bench_inventory_index import random_filters
+from bench.bench_search_fallback import query_mix, three_stage_search
+from bench.bench_text_search import text_queries
+from bench.synthetic_inventory import build_database
+from repositories.car_repository import CarRepository
+from services.car_service import CarService
+
+CARS = 3000
+
+@pytest.fixture(scope="module")
+def db_path(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp("parity") / "cars.db")
+    build_database(path, CARS)
+    return path
+
+@pytest.fixture(scope="module", params=["sql", "memory"])
+def repo(request, db_path):
+    repo = CarRepository(db_path, engine=request.param)
+    yield repo
+    repo.close()
+
+def test_ranked_search_matches_three_stage_fallback(repo):
+    service = CarService(repo)
+    for entities in query_mix(random.Random(3), 200, miss_ratio=0.8):
+        old, _ = three_stage_search(service, entities)
+        new = service.search_cars(entities)
+        assert [car.id for car in new] == [car.id for car in old], entities
+
+def test_memory_index_matches_sql(db_path):
+    sql_repo = CarRepository(db_path, engine="sql")
+    mem_repo = CarRepository(db_path, engine="memory")
+    try:
+        rnd = random.Random(7)
+        for _ in range(300):
+            filters = random_filters(rnd)
+            expected = [car.id for car in sql_repo.search_cars(filters)]
+            assert [car.id for car in mem_repo.search_cars(filters)] == expected, filters
+            assert mem_repo.index.search(filters) == expected, filters
+    finally:
+        sql_repo.close()
+        mem_repo.close()
+
+def test_full_text_search_finds_what_like_finds(db_path):
+    repo = CarRepository(db_path, engine="sql")
+    try:
+        for text in text_queries(random.Random(5), 100):
+            if repo._search_by_like(text, 10):
+                assert repo.search_by_text(text), text
+    finally:
+        repo.close()
+
+def test_compact_rows_serialize_like_legacy_rows(db_path):
+    conn = sqlite3.connect(db_path)
+    try:
+        legacy = json.loads(legacy_serialize(legacy_fetch(conn)))
+        compact = json.loads(compact_serialize(compact_fetch(conn)))
+    finally:
+        conn.close()
+    assert compact == legacy